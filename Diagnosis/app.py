@@ -1,4 +1,5 @@
 import gradio as gr
+import os
 from pathlib import Path
 
 # 导入我们的专家系统模块
@@ -7,11 +8,17 @@ from pests.pest_expert import create_pest_expert_interface
 from stem.stem_expert import create_stem_expert_interface
 from root.root_expert import create_root_expert_interface
 from seedling.seedling_expert import create_seedling_expert_interface
+from batch_diagnosis import diagnose_upload
 from utils.knowledge_loader import load_knowledge_base
+from utils.model_registry import registry
+from utils import gallery_service
 
 # 在应用启动时加载知识库，确保所有模块都能访问到
 load_knowledge_base()
 
+# 图像模型加载方式：lazy（首次诊断时加载）、background（启动后台线程预热）、eager（启动前同步加载）
+MODEL_LOADING = os.environ.get("DIAGNOSIS_MODEL_LOADING", "background")
+
 # 现代化CSS样式 - 包含全面的前端优化
 custom_css = """
 /* 全局背景优化 - 修复动画显示，中性蓝灰色系 */
@@ -869,6 +876,19 @@ with gr.Blocks(css=custom_css, title="玉米病虫害诊断智能体", theme=gr.
             
         with gr.TabItem("🌿 苗期病害"):
             create_seedling_expert_interface()
+
+    # 批量诊断接口（仅供 API 调用，界面中隐藏）：上传图片 zip 包，返回 JSONL 结果文件
+    with gr.Row(visible=False):
+        batch_archive = gr.File(file_types=[".zip"])
+        batch_expert = gr.Radio(["leaf", "pest"], value="leaf")
+        batch_result = gr.File()
+        batch_btn = gr.Button()
+    batch_btn.click(
+        fn=diagnose_upload,
+        inputs=[batch_archive, batch_expert],
+        outputs=batch_result,
+        api_name="batch_diagnosis"
+    )
     
     # 添加现代化页脚
     gr.HTML("""
@@ -1077,6 +1097,14 @@ with gr.Blocks(css=custom_css, title="玉米病虫害诊断智能体", theme=gr.
 )
 
 if __name__ == "__main__":
+    # 允许多个诊断请求并发进入专家函数，由微批调度器合并成批次推理
+    demo.queue(default_concurrency_limit=16)
+    if MODEL_LOADING == "eager":
+        registry.warmup()
+    elif MODEL_LOADING == "background":
+        registry.warmup(background=True)
+    # 在后台建立参考图片缩略图索引，文字专家的首个请求不再等待扫描目录
+    gallery_service.warmup(background=True)
     # 启动应用
     demo.launch(
         debug=True,
@@ -0,0 +1,203 @@
+"""
+批量诊断：把整个文件夹或 zip 压缩包中的田间照片送入叶片或害虫模型，
+结果（各类别概率、判定标签、知识库键名）写入 JSONL 或 CSV。
+
+用法（在 Diagnosis 目录下）：
+    python -m batch_diagnosis <图片目录或zip> --expert leaf --output results.jsonl
+"""
+import argparse
+import contextlib
+import csv
+import json
+import os
+import sys
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import gradio as gr
+import torch
+
+from leaf.leaf_expert import CLASS_NAMES as LEAF_CLASS_NAMES, DISEASE_NAME_MAP
+from pests.pest_expert import CLASS_NAMES as PEST_CLASS_NAMES, PEST_KNOWLEDGE_MAP
+from utils import multihead
+from utils.image_utils import preprocess_batch
+from utils.inference_utils import apply_disease_logic_constraints
+from utils.model_registry import registry
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+BATCH_SIZE = 16
+NUM_WORKERS = 4
+
+
+def iter_image_sources(source, archive=None):
+    """遍历目录（递归）或已打开的 zip 包 archive 中的图片，产出 (名称, 返回图片路径或字节的函数)。"""
+    if archive is not None:
+        for name in sorted(archive.namelist()):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                yield name, lambda name=name: archive.read(name)
+        return
+
+    for root, _, files in os.walk(source):
+        for file_name in sorted(files):
+            if file_name.lower().endswith(IMAGE_EXTENSIONS):
+                path = os.path.join(root, file_name)
+                yield os.path.relpath(path, source), lambda path=path: path
+
+
+def _load_tensor(opener):
+    """
+    在线程池中解码并预处理一张图片，失败时返回错误信息。
+    JPEG 使用 draft 模式在解码阶段缩小，结果与交互诊断的完整解码非常接近但不逐像素相同。
+    """
+    try:
+        return preprocess_batch([opener()], num_workers=1), None
+    except Exception as e:
+        return None, str(e)
+
+
+def _get_infer_fn(expert):
+    if multihead.ENABLED:
+        model = registry.get("multihead")
+        return lambda inputs: model(inputs, heads=[expert])[expert]
+    return registry.get(expert)
+
+
+def _leaf_results(outputs):
+    probabilities = torch.sigmoid(outputs).numpy()
+    # 记录的概率与判定标签都使用约束后的值，与交互诊断报告一致
+    for probs in apply_disease_logic_constraints(probabilities):
+        diseases = sorted(
+            (i for i, name in enumerate(LEAF_CLASS_NAMES) if name != '健康' and probs[i] > 0.5),
+            key=lambda i: probs[i], reverse=True)
+        if diseases:
+            labels = [LEAF_CLASS_NAMES[i] for i in diseases]
+            kb_key = DISEASE_NAME_MAP.get(labels[0], labels[0])
+        else:
+            labels, kb_key = ['健康'], None
+        yield {
+            "probabilities": {name: round(float(p), 4) for name, p in zip(LEAF_CLASS_NAMES, probs)},
+            "label": "+".join(labels),
+            "kb_key": kb_key,
+        }
+
+
+def _pest_results(outputs):
+    probabilities = torch.softmax(outputs, dim=1).numpy()
+    for probs in probabilities:
+        label = PEST_CLASS_NAMES[int(probs.argmax())]
+        yield {
+            "probabilities": {name: round(float(p), 4) for name, p in zip(PEST_CLASS_NAMES, probs)},
+            "label": label,
+            "kb_key": PEST_KNOWLEDGE_MAP.get(label, label),
+        }
+
+
+def diagnose_batch(source, expert='leaf', batch_size=BATCH_SIZE, num_workers=NUM_WORKERS):
+    """
+    批量诊断接口：逐批产出每张图片的结果字典。
+    解码在有界线程池中进行，并预取下一批，模型推理与图片解码重叠执行。
+    """
+    infer_fn = _get_infer_fn(expert)
+    to_results = _leaf_results if expert == 'leaf' else _pest_results
+
+    def chunks(archive):
+        chunk = []
+        for item in iter_image_sources(source, archive):
+            chunk.append(item)
+            if len(chunk) == batch_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    # zip 包在线程池退出（预取的图片都已读完）之后才关闭
+    archive_context = zipfile.ZipFile(source) if zipfile.is_zipfile(source) else contextlib.nullcontext()
+    with archive_context as archive, ThreadPoolExecutor(max_workers=num_workers) as pool:
+        pending = None
+        for chunk in chunks(archive):
+            submitted = (chunk, [pool.submit(_load_tensor, opener) for _, opener in chunk])
+            if pending is not None:
+                yield from _run_chunk(*pending, infer_fn, to_results, expert)
+            pending = submitted
+        if pending is not None:
+            yield from _run_chunk(*pending, infer_fn, to_results, expert)
+
+
+def _run_chunk(chunk, futures, infer_fn, to_results, expert):
+    loaded = [future.result() for future in futures]
+    valid = [i for i, (tensor, _) in enumerate(loaded) if tensor is not None]
+    results = {}
+    if valid:
+        with torch.no_grad():
+            outputs = infer_fn(torch.cat([loaded[i][0] for i in valid], dim=0))
+        results = dict(zip(valid, to_results(outputs)))
+
+    for i, (name, _) in enumerate(chunk):
+        record = {"file": name, "expert": expert}
+        if i in results:
+            record.update(results[i])
+        else:
+            record.update({"probabilities": None, "label": None, "kb_key": None, "error": loaded[i][1]})
+        yield record
+
+
+def write_results(records, output_path, expert='leaf'):
+    """按扩展名写出 JSONL（默认）或 CSV，返回写出的记录数。"""
+    count = 0
+    with open(output_path, 'w', encoding='utf-8', newline='') as f:
+        if output_path.lower().endswith('.csv'):
+            class_names = LEAF_CLASS_NAMES if expert == 'leaf' else PEST_CLASS_NAMES
+            fieldnames = ["file", "expert", "label", "kb_key"] + [f"p_{name}" for name in class_names] + ["error"]
+            writer = csv.DictWriter(f, fieldnames=fieldnames)
+            writer.writeheader()
+            for record in records:
+                row = {k: v for k, v in record.items() if k != 'probabilities'}
+                for class_name, p in (record["probabilities"] or {}).items():
+                    row[f"p_{class_name}"] = p
+                writer.writerow(row)
+                count += 1
+        else:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+                count += 1
+    return count
+
+
+def diagnose_upload(archive_path, expert='leaf'):
+    """Gradio 批量诊断接口：接收上传的 zip 包，返回 JSONL 结果文件路径。"""
+    if not archive_path or not zipfile.is_zipfile(archive_path):
+        raise gr.Error("请上传包含田间照片的 zip 压缩包。")
+    output = os.path.join(tempfile.mkdtemp(prefix="batch_diagnosis_"), f"{expert}_results.jsonl")
+    start = time.perf_counter()
+    count = write_results(diagnose_batch(archive_path, expert), output, expert)
+    elapsed = time.perf_counter() - start
+    print(f"批量诊断 {count} 张图片，耗时 {elapsed:.1f}s ({count / max(elapsed, 1e-9):.1f} img/s)")
+    return output
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量诊断文件夹或 zip 中的田间照片")
+    parser.add_argument("source", help="图片目录或 zip 压缩包")
+    parser.add_argument("--expert", choices=['leaf', 'pest'], default='leaf')
+    parser.add_argument("--output", default=None, help="结果文件（.jsonl 或 .csv），默认 <expert>_results.jsonl")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=NUM_WORKERS, help="图片解码线程数")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.source):
+        print(f"错误：路径 {args.source} 不存在")
+        sys.exit(1)
+    output = args.output or f"{args.expert}_results.jsonl"
+
+    registry.warmup(["multihead" if multihead.ENABLED else args.expert])
+    start = time.perf_counter()
+    records = diagnose_batch(args.source, args.expert, args.batch_size, args.workers)
+    count = write_results(records, output, args.expert)
+    elapsed = time.perf_counter() - start
+    print(f"已诊断 {count} 张图片，结果写入 {output}，耗时 {elapsed:.1f}s ({count / elapsed:.1f} img/s)")
+
+
+if __name__ == "__main__":
+    main()
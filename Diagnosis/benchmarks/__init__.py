@@ -0,0 +1 @@
+# 性能基准测试脚本，在 Diagnosis 目录下通过 python -m benchmarks.<脚本名> 运行。
@@ -0,0 +1,87 @@
+"""
+黑角检测基准测试：对已解码的图片，对比逐像素 getpixel 双重循环与 numpy 向量化的三角形黑角检测，
+并校验两者的判定完全一致。
+
+用法（在 Diagnosis 目录下）：
+    python -m benchmarks.bench_corner_detector --images 200 --size 1024 768
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "leaf", "data_clean"))
+from corner_stage import corner_triangle_flags  # noqa: E402
+
+
+def is_pixel_dark(pixel, threshold):
+    if isinstance(pixel, int):
+        return pixel <= threshold
+    elif isinstance(pixel, (tuple, list)):
+        return all(p <= threshold for p in pixel[:3])
+    return False
+
+
+def loop_triangle_flags(img, check_size, threshold, min_ratio=0.7):
+    """原先清洗脚本中的逐像素实现（四个角）。"""
+    width, height = img.size
+    flags = []
+    for flip_x, flip_y in [(False, False), (True, False), (False, True), (True, True)]:
+        black_count = total_count = 0
+        for dx in range(min(check_size, width)):
+            for dy in range(min(check_size, height)):
+                if dx + dy < check_size:
+                    x = width - 1 - dx if flip_x else dx
+                    y = height - 1 - dy if flip_y else dy
+                    if is_pixel_dark(img.getpixel((x, y)), threshold):
+                        black_count += 1
+                    total_count += 1
+        flags.append(total_count > 0 and black_count / total_count >= min_ratio)
+    return flags
+
+
+def make_image(rng, width, height, check_size):
+    img = Image.fromarray(rng.integers(0, 255, (height, width, 3), dtype=np.uint8))
+    draw = ImageDraw.Draw(img)
+    size = int(rng.integers(check_size // 2, check_size * 2))
+    for cx, cy, sx, sy in [(0, 0, 1, 1), (width - 1, 0, -1, 1), (0, height - 1, 1, -1), (width - 1, height - 1, -1, -1)]:
+        if rng.random() < 0.8:
+            draw.polygon([(cx, cy), (cx + sx * size, cy), (cx, cy + sy * size)], fill=(0, 0, 0))
+    return img
+
+
+def main():
+    parser = argparse.ArgumentParser(description="黑角检测基准测试")
+    parser.add_argument("--images", type=int, default=200)
+    parser.add_argument("--size", type=int, nargs=2, default=[1024, 768], metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--check-size", type=int, default=20)
+    parser.add_argument("--threshold", type=int, default=15)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    images = [make_image(rng, *args.size, args.check_size) for _ in range(args.images)]
+
+    loop_ms, vector_ms = [], []
+    for img in images:
+        start = time.perf_counter()
+        expected = loop_triangle_flags(img, args.check_size, args.threshold)
+        loop_ms.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        flags = corner_triangle_flags(img, args.check_size, args.threshold)
+        vector_ms.append((time.perf_counter() - start) * 1000)
+
+        if flags != expected:
+            raise SystemExit("向量化检测结果与逐像素实现不一致")
+
+    print(f"{args.images} 张 {args.size[0]}x{args.size[1]} 图片，check_size={args.check_size}，判定一致")
+    print(f"逐像素 getpixel: p50 {np.percentile(loop_ms, 50):7.3f} ms/张")
+    print(f"numpy 向量化:    p50 {np.percentile(vector_ms, 50):7.3f} ms/张")
+
+
+if __name__ == "__main__":
+    main()
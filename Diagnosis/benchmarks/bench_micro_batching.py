@@ -0,0 +1,79 @@
+"""
+微批推理调度器基准测试：对比逐请求前向推理与 MicroBatchScheduler 的吞吐量和 p99 延迟。
+
+用法（在 Diagnosis 目录下）：
+    python -m benchmarks.bench_micro_batching --clients 16 --requests 128
+"""
+import argparse
+import threading
+import time
+
+import numpy as np
+import torch
+
+from utils.batch_scheduler import MicroBatchScheduler
+from utils.model_definitions import RTX3060OptimizedModel
+
+
+def run_clients(call, num_clients, num_requests):
+    """启动 num_clients 个线程共发出 num_requests 次请求，返回 (总耗时, 每次请求延迟列表)。"""
+    latencies = []
+    lock = threading.Lock()
+    per_client = num_requests // num_clients
+
+    def client():
+        image_tensor = torch.randn(1, 3, 224, 224)
+        for _ in range(per_client):
+            start = time.perf_counter()
+            call(image_tensor)
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+
+    threads = [threading.Thread(target=client) for _ in range(num_clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - start, latencies
+
+
+def report(label, total_time, latencies):
+    latencies_ms = np.array(latencies) * 1000
+    print(f"{label:<12} 吞吐: {len(latencies) / total_time:7.2f} img/s   "
+          f"p50: {np.percentile(latencies_ms, 50):8.1f} ms   "
+          f"p99: {np.percentile(latencies_ms, 99):8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="微批推理基准测试")
+    parser.add_argument("--model-name", default="convnext_base_in22k")
+    parser.add_argument("--clients", type=int, default=16, help="并发客户端数量")
+    parser.add_argument("--requests", type=int, default=128, help="总请求数")
+    parser.add_argument("--max-batch-size", type=int, default=16)
+    parser.add_argument("--max-wait-ms", type=float, default=20)
+    args = parser.parse_args()
+
+    # 权重不影响耗时，这里使用随机初始化的同结构模型
+    model = RTX3060OptimizedModel(args.model_name, num_classes=4, pretrained=False)
+    model.eval()
+
+    def per_call(image_tensor):
+        with torch.no_grad():
+            return model(image_tensor)
+
+    per_call(torch.randn(1, 3, 224, 224))  # 预热
+
+    total, latencies = run_clients(per_call, args.clients, args.requests)
+    report("逐请求推理", total, latencies)
+
+    scheduler = MicroBatchScheduler(model, max_batch_size=args.max_batch_size,
+                                    max_wait_ms=args.max_wait_ms, name="bench")
+    total, latencies = run_clients(scheduler.predict, args.clients, args.requests)
+    scheduler.close()
+    report("微批推理", total, latencies)
+
+
+if __name__ == "__main__":
+    main()
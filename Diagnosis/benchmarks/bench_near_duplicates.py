@@ -0,0 +1,92 @@
+"""
+数据集近重复检测基准测试：在 N 张图片（每张 8 个二面体变换哈希）中，
+找出主哈希与其他图片任一变换哈希距离不超过阈值的全部配对。
+对比分段索引 radius_pairs 与两两比较；两两比较只在较小规模上实测，更大规模按 N^2 外推。
+
+用法（在 Diagnosis 目录下）：
+    python -m benchmarks.bench_near_duplicates --sizes 10000 100000 1000000 --threshold 5
+"""
+import argparse
+import time
+
+import numpy as np
+
+from utils.hamming_index import bitwise_popcount, radius_pairs
+
+NUM_VARIANTS = 8
+
+
+def make_hashes(num_images, duplicate_ratio, threshold, rng):
+    """随机生成哈希矩阵，并植入一部分与随机图片某个变换哈希相差不超过 threshold 位的近重复图片。"""
+    hashes = rng.integers(0, 2 ** 63, size=(num_images, NUM_VARIANTS), dtype=np.uint64) << np.uint64(1)
+    hashes ^= rng.integers(0, 2, size=hashes.shape, dtype=np.uint64)
+    num_duplicates = int(num_images * duplicate_ratio)
+    targets = rng.integers(0, num_images, size=num_duplicates)
+    sources = rng.integers(0, num_images, size=num_duplicates)
+    variants = rng.integers(0, NUM_VARIANTS, size=num_duplicates)
+    for target, source, variant in zip(targets, sources, variants):
+        value = int(hashes[source, variant])
+        for bit in rng.choice(64, size=rng.integers(0, threshold + 1), replace=False):
+            value ^= 1 << int(bit)
+        hashes[target, 0] = np.uint64(value)
+    return hashes
+
+
+def index_pairs(hashes, threshold):
+    """与 hash_stage.later_similar_images 相同：返回去重后的 (i, j) 配对，j > i。"""
+    num_images = len(hashes)
+    query_idx, value_idx, _ = radius_pairs(hashes[:, 0], hashes.ravel(), threshold)
+    image_idx = value_idx // NUM_VARIANTS
+    later = image_idx > query_idx
+    return np.unique(query_idx[later] * num_images + image_idx[later])
+
+
+def brute_force_pairs(hashes, threshold, block=256):
+    """逐块计算主哈希与所有变换哈希的距离（向量化的两两比较）。"""
+    num_images = len(hashes)
+    keys = []
+    for start in range(0, num_images, block):
+        primary = hashes[start:start + block, 0]
+        distances = bitwise_popcount(primary[:, None, None] ^ hashes[None, :, :]).min(axis=2)
+        i, j = np.nonzero(distances <= threshold)
+        i += start
+        later = j > i
+        keys.append(i[later] * num_images + j[later])
+    return np.unique(np.concatenate(keys))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="数据集近重复检测基准测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--threshold", type=int, default=5)
+    parser.add_argument("--duplicate-ratio", type=float, default=0.05)
+    parser.add_argument("--brute-force-limit", type=int, default=10000,
+                        help="不超过该规模时实测两两比较并校验结果")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    brute_force_rate = None
+    for size in args.sizes:
+        hashes = make_hashes(size, args.duplicate_ratio, args.threshold, rng)
+
+        start = time.perf_counter()
+        pairs = index_pairs(hashes, args.threshold)
+        index_seconds = time.perf_counter() - start
+        line = f"N={size:>8}: 分段索引 {index_seconds:8.2f} s，{len(pairs)} 对近重复"
+
+        if size <= args.brute_force_limit:
+            start = time.perf_counter()
+            expected = brute_force_pairs(hashes, args.threshold)
+            brute_seconds = time.perf_counter() - start
+            brute_force_rate = brute_seconds / size ** 2
+            if not np.array_equal(pairs, expected):
+                raise SystemExit("分段索引结果与两两比较不一致")
+            line += f"；两两比较 {brute_seconds:8.2f} s（结果一致）"
+        elif brute_force_rate is not None:
+            line += f"；两两比较约 {brute_force_rate * size ** 2:8.0f} s（按 N^2 外推）"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
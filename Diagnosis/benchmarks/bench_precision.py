@@ -0,0 +1,83 @@
+"""
+CPU推理精度模式对比：fp32 / bf16 / int8 以及是否使用 channels_last。
+以 fp32 eager 结果为基准，在 test_photos_leaf / test_photos_pests 上检查判定一致率和最大概率偏差，
+并输出每种模式的单张图片推理延迟。
+
+用法（在 Diagnosis 目录下）：
+    python -m benchmarks.bench_precision --repeats 20
+"""
+import argparse
+import copy
+import os
+import time
+
+import numpy as np
+import torch
+
+from utils.convert_multihead import IMAGE_EXTENSIONS, LEAF_MODEL_PATH, PEST_MODEL_PATH, load_single_model
+from utils.image_utils import preprocess_image
+from utils.model_definitions import PRECISION_MODES, prepare_for_inference
+
+EXPERTS = {
+    # 名称: (检查点, 类别数, 测试图片目录, 是否多标签)
+    'leaf': (LEAF_MODEL_PATH, 4, 'test_photos_leaf', True),
+    'pest': (PEST_MODEL_PATH, 3, 'test_photos_pests', False),
+}
+
+
+def load_test_images(test_dir):
+    files = sorted(f for f in os.listdir(test_dir) if f.lower().endswith(IMAGE_EXTENSIONS))
+    return torch.cat([preprocess_image(os.path.join(test_dir, f)) for f in files], dim=0)
+
+
+def to_probabilities(logits, multilabel):
+    return torch.sigmoid(logits) if multilabel else torch.softmax(logits, dim=1)
+
+
+def to_decisions(probabilities, multilabel):
+    return probabilities > 0.5 if multilabel else probabilities.argmax(dim=1)
+
+
+def measure_latency(model, image_tensor, repeats):
+    with torch.no_grad():
+        model(image_tensor)  # 预热
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            model(image_tensor)
+            timings.append(time.perf_counter() - start)
+    return np.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CPU推理精度模式对比")
+    parser.add_argument("--repeats", type=int, default=20, help="每种模式的计时次数")
+    args = parser.parse_args()
+
+    for name, (path, num_classes, test_dir, multilabel) in EXPERTS.items():
+        base_model = load_single_model(path, num_classes)
+        images = load_test_images(test_dir)
+        with torch.no_grad():
+            reference = to_probabilities(base_model(images), multilabel)
+        reference_decisions = to_decisions(reference, multilabel)
+
+        print(f"\n=== {name} ({len(images)} 张测试图片) ===")
+        print(f"{'模式':<18}{'延迟(ms)':>10}{'判定一致率':>12}{'最大概率偏差':>14}")
+        for precision in PRECISION_MODES:
+            for channels_last in (False, True):
+                model = prepare_for_inference(copy.deepcopy(base_model), precision, channels_last)
+                with torch.no_grad():
+                    probabilities = to_probabilities(model(images), multilabel)
+                decisions = to_decisions(probabilities, multilabel)
+                if multilabel:
+                    agreement = (decisions == reference_decisions).all(dim=1).float().mean().item()
+                else:
+                    agreement = (decisions == reference_decisions).float().mean().item()
+                max_diff = (probabilities - reference).abs().max().item()
+                latency = measure_latency(model, images[:1], args.repeats)
+                label = precision + (" + channels_last" if channels_last else "")
+                print(f"{label:<18}{latency:>10.1f}{agreement:>12.1%}{max_diff:>14.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+图像预处理基准测试：逐张调用 preprocess_image 与 preprocess_batch（线程池解码 + draft 模式 + 融合标准化）的吞吐对比。
+
+用法（在 Diagnosis 目录下）：
+    python -m benchmarks.bench_preprocessing --repeats 20 --workers 4
+"""
+import argparse
+import os
+import time
+
+import torch
+
+from utils.image_utils import preprocess_batch, preprocess_image
+
+TEST_DIRS = ['test_photos_leaf', 'test_photos_pests']
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+
+
+def collect_images():
+    return [os.path.join(d, f) for d in TEST_DIRS for f in sorted(os.listdir(d))
+            if f.lower().endswith(IMAGE_EXTENSIONS)]
+
+
+def throughput(fn, paths, repeats):
+    fn(paths)  # 预热
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn(paths)
+    return len(paths) * repeats / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="图像预处理吞吐基准测试")
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    paths = collect_images()
+    print(f"测试图片: {len(paths)} 张，重复 {args.repeats} 次")
+
+    cases = {
+        "preprocess_image 逐张": lambda ps: torch.cat([preprocess_image(p) for p in ps]),
+        "preprocess_batch 单线程": lambda ps: preprocess_batch(ps, num_workers=1, draft=False),
+        "preprocess_batch 多线程": lambda ps: preprocess_batch(ps, num_workers=args.workers, draft=False),
+        "preprocess_batch 多线程+draft": lambda ps: preprocess_batch(ps, num_workers=args.workers, draft=True),
+    }
+    reference = cases["preprocess_image 逐张"](paths)
+    for label, fn in cases.items():
+        max_diff = (fn(paths) - reference).abs().max().item()
+        print(f"{label:<30}{throughput(fn, paths, args.repeats):>10.1f} img/s   与原函数最大差异 {max_diff:.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+相似图片缓存查找延迟：在 N 条缓存（默认 10 万）中查找近重复哈希，
+对比 multi-index hashing 索引与逐条计算汉明距离的线性扫描。
+
+用法（在 Diagnosis 目录下）：
+    python -m benchmarks.bench_similar_cache --entries 100000 --queries 2000
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+
+from utils.hamming_index import popcount
+from utils.similar_cache import SIMILAR_MAX_DISTANCE, SimilarImageCache
+
+
+def flip_bits(value, count, rng):
+    for bit in rng.sample(range(64), count):
+        value ^= 1 << bit
+    return value
+
+
+def timed(fn, queries):
+    latencies = []
+    for q in queries:
+        start = time.perf_counter()
+        fn(q)
+        latencies.append(time.perf_counter() - start)
+    return np.array(latencies) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="相似图片缓存查找延迟基准测试")
+    parser.add_argument("--entries", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--max-distance", type=int, default=SIMILAR_MAX_DISTANCE)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    hashes = [rng.getrandbits(64) for _ in range(args.entries)]
+
+    cache = SimilarImageCache("bench", lambda: "fixed", max_distance=args.max_distance,
+                              max_entries=args.entries)
+    start = time.perf_counter()
+    for h in hashes:
+        cache.add(h, None)
+    print(f"写入 {args.entries} 条: {time.perf_counter() - start:.2f}s")
+
+    # 一半查询是已有哈希的近重复（随机翻转不超过阈值的位），一半是随机哈希（通常未命中）
+    near = [flip_bits(rng.choice(hashes), rng.randint(0, args.max_distance), rng)
+            for _ in range(args.queries // 2)]
+    far = [rng.getrandbits(64) for _ in range(args.queries - len(near))]
+
+    def linear_scan(q):
+        return min((popcount(h ^ q), i) for i, h in enumerate(hashes))
+
+    for label, queries in (("近重复查询", near), ("随机查询", far)):
+        index_us = timed(cache.lookup, queries)
+        scan_us = timed(linear_scan, queries[:50])
+        print(f"{label}: 索引 p50 {np.percentile(index_us, 50):8.1f} µs  p99 {np.percentile(index_us, 99):8.1f} µs"
+              f"   | 线性扫描 p50 {np.percentile(scan_us, 50):10.1f} µs")
+    print(cache.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+启动基准测试：分别以 lazy / background / eager 三种模型加载方式导入 app，
+测量界面可用前的启动耗时、常驻内存，以及模型全部就绪所需时间。
+
+每种方式在独立子进程中运行，避免模块缓存互相影响。
+用法（在 Diagnosis 目录下）：
+    python -m benchmarks.bench_startup
+"""
+import json
+import os
+import subprocess
+import sys
+
+# 在子进程中执行：导入 app（构建全部 Gradio 界面，但不启动服务），按指定方式预热模型
+CHILD_SCRIPT = r"""
+import json, os, resource, time
+
+def rss_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 ** 2
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+start = time.perf_counter()
+import app
+mode = app.MODEL_LOADING
+if mode == 'eager':
+    app.registry.warmup()
+elif mode == 'background':
+    warmup_thread = app.registry.warmup(background=True)
+startup = time.perf_counter() - start
+startup_rss = rss_mb()
+
+if mode == 'background':
+    warmup_thread.join()
+elif mode == 'lazy':
+    app.registry.warmup()
+ready = time.perf_counter() - start
+
+print(json.dumps({'startup_s': startup, 'startup_rss_mb': startup_rss,
+                  'ready_s': ready, 'ready_rss_mb': rss_mb(),
+                  'status': app.registry.status()}))
+"""
+
+
+def measure(mode):
+    env = dict(os.environ, DIAGNOSIS_MODEL_LOADING=mode)
+    result = subprocess.run([sys.executable, "-c", CHILD_SCRIPT], env=env,
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    print(f"{'模式':<12}{'启动耗时(s)':>12}{'启动内存(MB)':>14}{'就绪耗时(s)':>12}{'就绪内存(MB)':>14}")
+    for mode in ("lazy", "background", "eager"):
+        r = measure(mode)
+        print(f"{mode:<12}{r['startup_s']:>12.2f}{r['startup_rss_mb']:>14.1f}"
+              f"{r['ready_s']:>12.2f}{r['ready_rss_mb']:>14.1f}")
+        for name, info in r["status"].items():
+            if info["state"] != "ready":
+                print(f"    {name}: {info['state']} {info['error'] or ''}")
+
+
+if __name__ == "__main__":
+    main()
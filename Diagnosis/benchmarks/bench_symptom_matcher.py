@@ -0,0 +1,70 @@
+"""
+症状关键词匹配基准测试：在数千个关键词、长篇自由文本描述上，
+对比逐个关键词做子串查找与 Aho-Corasick 自动机一次扫描的耗时，并校验两者结果一致。
+
+用法（在 Diagnosis 目录下）：
+    python -m benchmarks.bench_symptom_matcher --keywords 5000 --text-length 2000
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+
+from utils.symptom_matcher import SymptomMatcher
+
+# 症状描述常用字，随机组合生成关键词和文本，使命中率接近真实描述
+SYMPTOM_CHARS = ("黑粉色果穗花丝瘤灰包肿胀异常变形病坏烂死枯萎根系青黄褐种芽苗茎基部"
+                 "低温湿雨冷叶状样大厚凸鼓斑点白红紫软硬干水渍腐败霉层株心须")
+
+
+def random_word(rng, min_len=1, max_len=4):
+    return "".join(rng.choice(SYMPTOM_CHARS) for _ in range(rng.randint(min_len, max_len)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="症状关键词匹配基准测试")
+    parser.add_argument("--keywords", type=int, default=5000)
+    parser.add_argument("--categories", type=int, default=50)
+    parser.add_argument("--text-length", type=int, default=2000)
+    parser.add_argument("--texts", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    tables = {f"类别{i}": [] for i in range(args.categories)}
+    for _ in range(args.keywords):
+        tables[rng.choice(list(tables))].append(random_word(rng, 2, 4))
+    texts = ["".join(rng.choice(SYMPTOM_CHARS) for _ in range(args.text_length)) for _ in range(args.texts)]
+
+    matcher = SymptomMatcher()
+    for category, keywords in tables.items():
+        matcher.add_keywords("bench", category, keywords)
+    start = time.perf_counter()
+    matcher.compile()
+    print(f"编译 {args.keywords} 个关键词: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    def substring_scan(text):
+        return [keyword for keywords in tables.values() for keyword in keywords if keyword in text]
+
+    scan_ms, automaton_ms, hit_counts = [], [], []
+    for text in texts:
+        start = time.perf_counter()
+        expected = substring_scan(text)
+        scan_ms.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        result = matcher.match(text)
+        automaton_ms.append((time.perf_counter() - start) * 1000)
+
+        if result.keywords() != expected:
+            raise SystemExit("自动机结果与逐个子串查找不一致")
+        hit_counts.append(len(expected))
+
+    print(f"文本长度 {args.text_length}，平均命中 {np.mean(hit_counts):.0f} 个关键词，结果一致")
+    print(f"逐个子串查找: p50 {np.percentile(scan_ms, 50):7.2f} ms")
+    print(f"Aho-Corasick: p50 {np.percentile(automaton_ms, 50):7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
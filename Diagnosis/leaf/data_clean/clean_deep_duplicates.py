@@ -1,19 +1,8 @@
 import os
-from PIL import Image
-import imagehash
 from tqdm import tqdm
 from collections import defaultdict
-import sys
-from itertools import combinations
-
-# 检查依赖项
-try:
-    from PIL import Image
-    import imagehash
-except ImportError:
-    print("此脚本需要 'Pillow' 和 'imagehash' 库")
-    print("请使用以下命令安装: pip install Pillow imagehash")
-    sys.exit(1)
+from hash_catalog import get_catalog
+from hash_stage import later_similar_images
 
 def get_category_from_path(file_path):
     """从文件路径中提取类别信息"""
@@ -33,24 +22,6 @@ def get_category_from_path(file_path):
     else:
         return 'Unknown'
 
-def get_hash_variants(image, hash_size):
-    """为一张图片计算其所有8种对称变换的哈希值"""
-    hashes = set()
-    # expand=True 确保旋转后的图片尺寸正确，不会被裁剪
-    rotations = [
-        image,
-        image.rotate(90, expand=True),
-        image.rotate(180),
-        image.rotate(270, expand=True)
-    ]
-    
-    for img in rotations:
-        # 添加原图和水平翻转图的哈希
-        hashes.add(imagehash.phash(img, hash_size=hash_size))
-        hashes.add(imagehash.phash(img.transpose(Image.FLIP_LEFT_RIGHT), hash_size=hash_size))
-        
-    return list(hashes)
-
 def find_and_remove_deep_duplicates(root_folder, hash_size=8, threshold=5):
     """
     通过模糊匹配感知哈希（汉明距离）来查找并删除视觉上高度相似的图片
@@ -107,16 +78,14 @@ def find_and_remove_deep_duplicates(root_folder, hash_size=8, threshold=5):
         print("   深度去重将特别保护锈病样本")
 
     # 2. 为每张图片计算其所有变换的哈希值
+    # 多进程并行计算 4 种旋转 × 水平翻转共 8 种变换的哈希，第 0 列为原图哈希
     print(f"\n🔍 Step 2: 计算图片所有变换的哈希值 (hash_size={hash_size})...")
-    for filepath in tqdm(files_to_scan, desc="计算哈希"):
-        try:
-            with Image.open(filepath) as img:
-                # 转换为灰度图可以提高哈希的稳定性
-                hash_variants = get_hash_variants(img.convert("L"), hash_size)
-                category = get_category_from_path(filepath)
-                image_data.append({'path': filepath, 'variants': hash_variants, 'category': category})
-        except Exception as e:
-            print(f"\n❌ 无法处理文件 {filepath}: {e}")
+    hashed_paths, hash_matrix, failures = get_catalog().hashes(files_to_scan, mode='dihedral', hash_size=hash_size, desc="计算哈希")
+    for filepath, error in failures:
+        print(f"\n❌ 无法处理文件 {filepath}: {error}")
+    for filepath, hash_variants in zip(hashed_paths, hash_matrix.tolist()):
+        category = get_category_from_path(filepath)
+        image_data.append({'path': filepath, 'variants': hash_variants, 'category': category})
 
     # 3. 使用汉明距离查找相似图片组
     print(f"\n🔍 Step 3: 查找相似图片 (汉明距离 <= {threshold})...")
@@ -125,56 +94,49 @@ def find_and_remove_deep_duplicates(root_folder, hash_size=8, threshold=5):
     category_duplicates = defaultdict(int)
     rust_protected = 0
     
-    # O(n^2 * k) 的比较，其中 k 是哈希变体的数量
+    # 用分段汉明索引一次找出所有相似对，代替 O(n^2 * k) 的两两比较
+    similar_images = later_similar_images(hash_matrix, threshold)
+    
     for i in tqdm(range(len(image_data)), desc="比较图片"):
         path_i = image_data[i]['path']
         category_i = image_data[i]['category']
         
         if path_i in duplicates_to_remove:
             continue
-            
-        variants_i = image_data[i]['variants']
-        # 只取 j 的主哈希进行比较，可以极大地加速，且结果基本一致
-        primary_hash_i = variants_i[0]
         
-        for j in range(i + 1, len(image_data)):
+        # i 的主哈希与这些 j 的某个变体相似，按原顺序依次处理
+        for j in similar_images[i]:
             path_j = image_data[j]['path']
             category_j = image_data[j]['category']
             
             if path_j in duplicates_to_remove:
                 continue
             
-            variants_j = image_data[j]['variants']
+            # 找到了相似项，决定删除哪个
             
-            # 检查 i 的主哈希是否与 j 的任何变体相似
-            for hash_j in variants_j:
-                if (primary_hash_i - hash_j) <= threshold:
-                    # 找到了相似项，决定删除哪个
-                    
-                    # 特殊保护锈病样本
-                    if rust_count < 500:
-                        if category_i == 'Common_Rust' and category_j != 'Common_Rust':
-                            # 保留锈病样本i，删除j
-                            duplicates_to_remove.add(path_j)
-                            category_duplicates[category_j] += 1
-                            rust_protected += 1
-                            break
-                        elif category_j == 'Common_Rust' and category_i != 'Common_Rust':
-                            # 保留锈病样本j，删除i
-                            duplicates_to_remove.add(path_i)
-                            category_duplicates[category_i] += 1
-                            rust_protected += 1
-                            break
-                        elif category_i == 'Common_Rust' and category_j == 'Common_Rust':
-                            # 两个都是锈病样本，只删除j（保留较早的）
-                            duplicates_to_remove.add(path_j)
-                            category_duplicates[category_j] += 1
-                            break
-                    
-                    # 常规处理：将 j 标记为待删除，然后停止比较 j
+            # 特殊保护锈病样本
+            if rust_count < 500:
+                if category_i == 'Common_Rust' and category_j != 'Common_Rust':
+                    # 保留锈病样本i，删除j
                     duplicates_to_remove.add(path_j)
                     category_duplicates[category_j] += 1
-                    break
+                    rust_protected += 1
+                    continue
+                elif category_j == 'Common_Rust' and category_i != 'Common_Rust':
+                    # 保留锈病样本j，删除i
+                    duplicates_to_remove.add(path_i)
+                    category_duplicates[category_i] += 1
+                    rust_protected += 1
+                    continue
+                elif category_i == 'Common_Rust' and category_j == 'Common_Rust':
+                    # 两个都是锈病样本，只删除j（保留较早的）
+                    duplicates_to_remove.add(path_j)
+                    category_duplicates[category_j] += 1
+                    continue
+            
+            # 常规处理：将 j 标记为待删除
+            duplicates_to_remove.add(path_j)
+            category_duplicates[category_j] += 1
     
     # 4. 删除被标记为重复的文件
     print(f"\n🗑️  Step 4: 发现 {len(duplicates_to_remove)} 张高度相似图片 (包括变换) 待删除...")
@@ -1,19 +1,7 @@
 import os
-import hashlib
 from tqdm import tqdm
 from collections import defaultdict
-
-def calculate_md5(file_path, chunk_size=8192):
-    """计算文件的MD5哈希值"""
-    hash_md5 = hashlib.md5()
-    try:
-        with open(file_path, "rb") as f:
-            for chunk in iter(lambda: f.read(chunk_size), b""):
-                hash_md5.update(chunk)
-    except IOError as e:
-        print(f"Could not read file {file_path}: {e}")
-        return None
-    return hash_md5.hexdigest()
+from hash_catalog import get_catalog
 
 def get_category_from_path(file_path):
     """从文件路径中提取类别信息"""
@@ -88,10 +76,12 @@ def find_and_remove_duplicates(root_folder):
 
     # 2. 计算哈希值并找出重复项
     print(f"\n🔍 Step 2: 计算哈希值并识别重复项...")
-    for filepath in tqdm(files_to_scan, desc="处理图片"):
-        file_hash = calculate_md5(filepath)
+    # 只计算哈希目录中没有的新增或已修改文件
+    for filepath, file_hash in zip(files_to_scan, get_catalog().md5s(files_to_scan, desc="处理图片")):
         if file_hash:
             hashes[file_hash].append(filepath)
+        else:
+            print(f"Could not read file {filepath}")
             
     # 3. 分析重复情况
     print(f"\n🧹 Step 3: 分析重复情况...")
@@ -6,9 +6,8 @@
 """
 
 import os
-import sys
-import subprocess
 from collections import defaultdict
+from clean_pipeline import DEFAULT_STAGES, STAGES, run_pipeline
 
 def get_category_from_path(file_path):
     """从文件路径中提取类别信息"""
@@ -86,20 +85,15 @@ def scan_dataset_stats(dataset_dir):
     
     return category_stats, total_files
 
-def run_cleaning_script(script_name):
-    """运行清洗脚本"""
-    script_path = os.path.join('data_clean', script_name)
-    if not os.path.exists(script_path):
-        print(f"❌ 脚本不存在: {script_path}")
-        return False
-    
+def run_cleaning_stages(stage_names, dataset_dir='datasets'):
+    """在同一进程中用单遍清洗流水线执行指定阶段（只扫描、读取一次数据集）"""
+    descriptions = " → ".join(STAGES[name].description for name in stage_names)
+    print(f"\n🚀 执行: {descriptions}")
     try:
-        print(f"\n🚀 运行脚本: {script_name}")
-        result = subprocess.run([sys.executable, script_path], check=True)
-        print(f"✅ 脚本 {script_name} 执行完成")
+        run_pipeline(dataset_dir, stage_names)
         return True
-    except subprocess.CalledProcessError as e:
-        print(f"❌ 脚本执行失败: {e}")
+    except Exception as e:
+        print(f"❌ 清洗失败: {e}")
         return False
 
 def display_menu():
@@ -141,30 +135,15 @@ def show_script_descriptions():
     print("• 建议按顺序执行: 基础去重 → 视觉去重 → 旋转清理")
 
 def run_complete_cleaning():
-    """运行完整的清洗流程"""
+    """运行完整的清洗流程：各步骤合并为一次扫描、一份报告和一份删除计划"""
     print("\n🚀 开始完整清洗流程...")
     
-    scripts = [
-        ("clean_duplicates.py", "基础去重"),
-        ("clean_visual_duplicates.py", "视觉去重"),
-        ("clean_rotated_images.py", "旋转图片清理"),
-        ("clean_visual_duplicates_advanced.py", "高级视觉去重")
-    ]
+    if not run_cleaning_stages(DEFAULT_STAGES):
+        print("❌ 完整清洗流程执行失败")
+        return False
     
-    for script, description in scripts:
-        print(f"\n" + "-"*50)
-        print(f"执行: {description}")
-        print("-"*50)
-        
-        if not run_cleaning_script(script):
-            print(f"❌ {description} 执行失败，停止流程")
-            return False
-        
-        # 每步之后显示统计
-        print(f"\n📊 {description} 完成后的统计:")
-        scan_dataset_stats('datasets')
-        
-        input(f"\n按 Enter 继续下一步...")
+    print(f"\n📊 清洗完成后的统计:")
+    scan_dataset_stats('datasets')
     
     print(f"\n🎉 完整清洗流程执行完成!")
     return True
@@ -198,19 +177,19 @@ def main():
                 scan_dataset_stats(dataset_dir)
                 
             elif choice == '1':
-                run_cleaning_script('clean_duplicates.py')
+                run_cleaning_stages(['md5'], dataset_dir)
                 
             elif choice == '2':
-                run_cleaning_script('clean_visual_duplicates.py')
+                run_cleaning_stages(['phash'], dataset_dir)
                 
             elif choice == '3':
-                run_cleaning_script('clean_visual_duplicates_advanced.py')
+                run_cleaning_stages(['flip'], dataset_dir)
                 
             elif choice == '4':
-                run_cleaning_script('clean_deep_duplicates.py')
+                run_cleaning_stages(['deep'], dataset_dir)
                 
             elif choice == '5':
-                run_cleaning_script('clean_rotated_images.py')
+                run_cleaning_stages(['corners'], dataset_dir)
                 
             elif choice == '6':
                 run_complete_cleaning()
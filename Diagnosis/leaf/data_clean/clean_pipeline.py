@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+"""
+单遍数据集清洗流水线
+只遍历一次数据集、每张图片只读取一次，依次计算 MD5、8 种变换的感知哈希和黑角检测结果（并写入哈希目录），
+然后把内存中的结果依次交给各清洗阶段，最后汇总为一份报告和一份删除计划，确认后统一删除。
+
+各阶段的判定规则与对应的独立脚本相同，按顺序执行时后面的阶段看不到前面阶段已计划删除的图片，
+效果等同于依次运行这些脚本，但不再重复扫描目录、重复读取和解码图片：
+    md5      基础去重 (clean_duplicates.py)
+    phash    视觉去重 (clean_visual_duplicates.py)
+    corners  旋转图片清理 (clean_rotated_images.py)
+    flip     高级视觉去重 (clean_visual_duplicates_advanced.py)
+    deep     深度去重 (clean_deep_duplicates.py)
+
+用法（在 leaf 目录下）：
+    python data_clean/clean_pipeline.py [datasets] [--stages md5,phash,corners,flip] [--yes]
+    python data_clean/clean_pipeline.py datasets --dry-run --plan-out plan.json   # 只生成删除计划
+"""
+
+import argparse
+import hashlib
+import io
+import os
+import sys
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+from tqdm import tqdm
+
+from hash_catalog import get_catalog
+from hash_stage import hash_variants, later_similar_images, load_gray, reduce_gray
+from corner_stage import dark_corner_points
+from clean_rotated_images import BLACK_CORNER_FLAG, detect_rotated_images, get_category_from_path
+from file_ops import FilePlan, apply_plan
+
+VALID_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+RUST_CATEGORY = 'Common_Rust'
+# 锈病样本少于该数量时，去重阶段优先保留锈病样本
+RUST_MIN_SAMPLES = 500
+# 一次计算 8 种变换的哈希：第 0 列为原图（phash 阶段），第 1 列为水平翻转（flip 阶段）
+HASH_MODE = 'dihedral'
+
+
+class ImageRecord:
+    """一张图片在内存中的分析结果"""
+
+    __slots__ = ('path', 'category', 'md5', 'hashes', 'black_corners')
+
+    def __init__(self, path, category, md5=None, hashes=None, black_corners=False):
+        self.path = path
+        self.category = category
+        self.md5 = md5
+        self.hashes = hashes
+        self.black_corners = black_corners
+
+
+class DeletionPlan:
+    """各阶段计划删除的图片，按加入顺序记录 (记录, 阶段名, 原因)"""
+
+    def __init__(self):
+        self.entries = []
+        self._paths = set()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, record):
+        return record.path in self._paths
+
+    def add(self, record, stage, reason):
+        if record.path not in self._paths:
+            self._paths.add(record.path)
+            self.entries.append((record, stage, reason))
+
+    def count_by(self, key):
+        return Counter(key(record, stage) for record, stage, _ in self.entries)
+
+
+class CleaningContext:
+    """各阶段共享的状态：全部图片记录、删除计划和各阶段的附加统计"""
+
+    def __init__(self, records, stages=()):
+        self.records = records
+        self.stages = list(stages)
+        self.plan = DeletionPlan()
+        self.notes = defaultdict(list)
+
+    def alive(self):
+        """尚未被计划删除的图片（保持扫描顺序）"""
+        return [record for record in self.records if record not in self.plan]
+
+    def rust_count(self):
+        return sum(1 for record in self.alive() if record.category == RUST_CATEGORY)
+
+    def protect_rust(self):
+        """锈病样本不足时各去重阶段需要特别保护锈病样本（按阶段开始时剩余的数量判断）"""
+        return self.rust_count() < RUST_MIN_SAMPLES
+
+
+class Md5DedupeStage:
+    name = 'md5'
+    description = "基础去重 (MD5哈希)"
+
+    def run(self, context):
+        groups = defaultdict(list)
+        for record in context.alive():
+            if record.md5:
+                groups[record.md5].append(record)
+        for records in groups.values():
+            for duplicate in records[1:]:
+                context.plan.add(duplicate, self.name, f"与 {records[0].path} 完全相同")
+
+
+class PhashDedupeStage:
+    name = 'phash'
+    description = "视觉去重 (感知哈希)"
+
+    def run(self, context):
+        protect_rust = context.protect_rust()
+        groups = defaultdict(list)
+        for record in context.alive():
+            if record.hashes is not None:
+                groups[record.hashes[0]].append(record)
+        for records in groups.values():
+            if len(records) < 2:
+                continue
+            rust_records = [r for r in records if r.category == RUST_CATEGORY]
+            if rust_records and protect_rust:
+                # 锈病样本不足时，优先保留锈病样本
+                keep = rust_records[0]
+                context.notes[self.name].append(f"优先保留锈病样本: {keep.path}")
+            else:
+                keep = records[0]
+            for duplicate in records[1:]:
+                if duplicate is not keep:
+                    context.plan.add(duplicate, self.name, f"与 {keep.path} 视觉相似")
+
+
+class BlackCornerStage:
+    name = 'corners'
+    description = "旋转图片清理 (黑角检测)"
+
+    def run(self, context):
+        protect_rust = context.protect_rust()
+        rust_rotated = 0
+        for record in context.alive():
+            if record.black_corners:
+                context.plan.add(record, self.name, "四个角都有旋转产生的黑色填充")
+                rust_rotated += record.category == RUST_CATEGORY
+        if rust_rotated and protect_rust:
+            context.notes[self.name].append(f"发现 {rust_rotated} 张锈病样本有黑角，而锈病样本总数较少，建议仔细检查")
+
+
+class FlipDedupeStage:
+    name = 'flip'
+    description = "高级视觉去重 (包含镜像)"
+
+    def run(self, context):
+        protect_rust = context.protect_rust()
+        seen_hashes = set()
+        for record in context.alive():
+            if record.hashes is None:
+                continue
+            original_hash, flipped_hash = record.hashes[0], record.hashes[1]
+            if original_hash in seen_hashes:
+                if record.category == RUST_CATEGORY and protect_rust:
+                    context.notes[self.name].append(f"保护锈病样本: 跳过删除 {record.path}")
+                    continue
+                context.plan.add(record, self.name, "与已保留图片的原图或镜像哈希相同")
+            else:
+                seen_hashes.add(original_hash)
+                seen_hashes.add(flipped_hash)
+
+
+class DeepDedupeStage:
+    name = 'deep'
+    description = "深度去重 (所有变换)"
+
+    def __init__(self, threshold=5):
+        self.threshold = threshold
+
+    def run(self, context):
+        protect_rust = context.protect_rust()
+        records = [record for record in context.alive() if record.hashes is not None]
+        if not records:
+            return
+        hash_matrix = np.array([record.hashes for record in records], dtype=np.uint64)
+        similar_images = later_similar_images(hash_matrix, self.threshold)
+        removed = set()
+        reason = f"与 {{}} 在某种旋转/翻转下相似 (汉明距离 <= {self.threshold})"
+
+        for i, record_i in enumerate(records):
+            if i in removed:
+                continue
+            for j in similar_images[i]:
+                if j in removed:
+                    continue
+                record_j = records[j]
+                rust_i = record_i.category == RUST_CATEGORY
+                rust_j = record_j.category == RUST_CATEGORY
+                if protect_rust and rust_j and not rust_i:
+                    # 保留锈病样本 j，删除 i
+                    removed.add(i)
+                    context.plan.add(record_i, self.name, reason.format(record_j.path))
+                    context.notes[self.name].append(f"优先保留锈病样本: {record_j.path}")
+                    continue
+                if protect_rust and rust_i and not rust_j:
+                    context.notes[self.name].append(f"优先保留锈病样本: {record_i.path}")
+                removed.add(j)
+                context.plan.add(record_j, self.name, reason.format(record_i.path))
+
+
+STAGES = {
+    'md5': Md5DedupeStage,
+    'phash': PhashDedupeStage,
+    'corners': BlackCornerStage,
+    'flip': FlipDedupeStage,
+    'deep': DeepDedupeStage,
+}
+# 与 clean_master 原完整清洗流程的顺序一致
+DEFAULT_STAGES = ['md5', 'phash', 'corners', 'flip']
+
+
+def scan_images(root_folder):
+    """遍历一次数据集，返回所有图片路径（os.walk 顺序）"""
+    paths = []
+    for subdir, _, files in os.walk(root_folder):
+        for file in files:
+            if os.path.splitext(file)[1].lower() in VALID_EXTENSIONS:
+                paths.append(os.path.join(subdir, file))
+    return paths
+
+
+def _analyze_file(filepath):
+    """
+    读取一次文件、完整解码一次，在内存中计算 MD5、8 种变换的哈希和黑角检测结果。
+    黑角检测使用完整解码的图片，哈希用的灰度缩略图也从这张图片缩小得到；
+    只有 JPEG 另做一次 DCT 缩放解码（draft，开销远小于完整解码），
+    使哈希与独立脚本写入哈希目录的结果完全一致。
+    """
+    try:
+        with open(filepath, 'rb') as f:
+            data = f.read()
+    except OSError as e:
+        return None, None, None, str(e)
+    md5 = hashlib.md5(data).hexdigest()
+    # 与 clean_rotated_images 相同，无法处理的图片判定为否
+    black_corners = False
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            try:
+                black_corners = dark_corner_points(img)
+            except Exception:
+                pass
+            gray = load_gray(io.BytesIO(data)) if img.format == 'JPEG' else reduce_gray(img)
+        hashes, error = hash_variants(gray, HASH_MODE), None
+    except Exception as e:
+        hashes, error = None, str(e)
+    return md5, hashes, black_corners, error
+
+
+def analyze_images(paths, max_workers=None, chunksize=16):
+    """
+    计算所有图片的分析结果。哈希目录中已有的文件直接读取，
+    其余文件在进程池中各读取一次，结果写回哈希目录。
+    """
+    catalog = get_catalog()
+    todo = catalog.missing(paths, HASH_MODE, BLACK_CORNER_FLAG)
+    if todo:
+        max_workers = max_workers or os.cpu_count() or 1
+        if max_workers == 1 or len(todo) < 2 * chunksize:
+            results = [_analyze_file(path) for path in tqdm(todo, desc="分析图片")]
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers) as pool:
+                results = list(tqdm(pool.map(_analyze_file, todo, chunksize=chunksize), total=len(todo),
+                                    desc="分析图片"))
+        catalog.record([(path, md5, hashes, black_corners)
+                        for path, (md5, hashes, black_corners, _) in zip(todo, results)],
+                       HASH_MODE, BLACK_CORNER_FLAG)
+        for path, (_, _, _, error) in zip(todo, results):
+            if error:
+                print(f"  ❌ 无法处理文件 {path}: {error}")
+
+    # 以下均从哈希目录读取（无法处理的文件会再尝试一次）
+    md5s = catalog.md5s(paths)
+    hashed_paths, hash_matrix, _ = catalog.hashes(paths, mode=HASH_MODE)
+    hashes = dict(zip(hashed_paths, map(tuple, hash_matrix.tolist())))
+    black_corners = catalog.flags(paths, BLACK_CORNER_FLAG, detect_rotated_images)
+    return [ImageRecord(path, get_category_from_path(path), md5, hashes.get(path), bool(flag))
+            for path, md5, flag in zip(paths, md5s, black_corners)]
+
+
+def build_stages(names, threshold=5):
+    stages = []
+    for name in names:
+        if name not in STAGES:
+            raise ValueError(f"未知的清洗阶段 {name}，可选: {', '.join(STAGES)}")
+        stages.append(STAGES[name](threshold) if name == 'deep' else STAGES[name]())
+    return stages
+
+
+def plan_cleaning(root_folder, stage_names=DEFAULT_STAGES, threshold=5):
+    """扫描、分析并依次运行各阶段，返回 CleaningContext（只生成删除计划，不删除文件）"""
+    stages = build_stages(stage_names, threshold)
+    print(f"📂 扫描数据集: {root_folder}")
+    paths = scan_images(root_folder)
+    print(f"  总图片数: {len(paths)}")
+    context = CleaningContext(analyze_images(paths), stages)
+    for stage in stages:
+        before = len(context.plan)
+        stage.run(context)
+        print(f"  {stage.description}: 计划删除 {len(context.plan) - before} 张")
+    return context
+
+
+def print_report(context):
+    """打印一份汇总报告"""
+    print("\n" + "=" * 60)
+    print("📋 清洗计划")
+    print("=" * 60)
+    initial = Counter(record.category for record in context.records)
+    deleted = context.plan.count_by(lambda record, stage: record.category)
+    by_stage = context.plan.count_by(lambda record, stage: stage)
+
+    print(f"总图片数: {len(context.records)}，计划删除: {len(context.plan)}")
+    print("\n📊 各阶段删除统计:")
+    for stage in context.stages:
+        print(f"  {stage.description}: {by_stage.get(stage.name, 0)} 张")
+        notes = context.notes.get(stage.name, [])
+        if notes:
+            print(f"    🔥 锈病样本保护/提醒: {len(notes)} 项")
+
+    print("\n📈 各类别清洗前后数量:")
+    for category, count in sorted(initial.items()):
+        print(f"  {category}: {count} → {count - deleted.get(category, 0)} (删除: {deleted.get(category, 0)})")
+
+    rust_remaining = initial.get(RUST_CATEGORY, 0) - deleted.get(RUST_CATEGORY, 0)
+    if rust_remaining < RUST_MIN_SAMPLES:
+        print(f"\n⚠️  注意: 清洗后锈病样本只有 {rust_remaining} 张，建议补充到{RUST_MIN_SAMPLES}+张")
+    print("=" * 60)
+
+
+def build_file_plan(plan, root_folder, backup_dir=None):
+    """把删除计划转换为文件操作计划；指定 backup_dir 时先把待删除的图片按相对路径备份（优先硬链接）"""
+    file_plan = FilePlan()
+    for record, stage, reason in plan.entries:
+        if backup_dir:
+            file_plan.backup(record.path, os.path.join(backup_dir, os.path.relpath(record.path, root_folder)), stage)
+        file_plan.delete(record.path, f"{stage}: {reason}")
+    return file_plan
+
+
+def run_pipeline(root_folder, stage_names=DEFAULT_STAGES, threshold=5, assume_yes=False, dry_run=False,
+                 plan_out=None, backup_dir=None):
+    """生成删除计划、打印报告，确认后执行删除（dry_run 时只输出计划）"""
+    context = plan_cleaning(root_folder, stage_names, threshold)
+    print_report(context)
+    if not context.plan:
+        print("✅ 没有需要删除的图片。您的数据集很干净!")
+        return context
+
+    file_plan = build_file_plan(context.plan, root_folder, backup_dir)
+    if plan_out:
+        file_plan.save(plan_out)
+        print(f"💾 删除计划已保存到 {plan_out}，可用 python data_clean/file_ops.py {plan_out} 执行")
+    if dry_run:
+        apply_plan(file_plan, dry_run=True)
+        return context
+
+    if not assume_yes:
+        user_confirmation = input(f"\n🚨 将永久删除 {len(context.plan)} 张图片，确定要继续吗? (yes/no): ")
+        if user_confirmation.lower() != 'yes':
+            print("\n❌ 用户取消操作")
+            return context
+    done, failures, backup_methods = apply_plan(file_plan, desc="清洗")
+    for op, error in failures:
+        print(f"    ❌ {op.action} 失败: {op.src}: {error}")
+    if backup_methods:
+        print(f"📦 备份方式: {dict(backup_methods)}")
+    removed = file_plan.counts()['delete'] - sum(1 for op, _ in failures if op.action == 'delete')
+    print(f"\n🎉 清洗完成，删除了 {removed} 张图片")
+    return context
+
+
+def main():
+    parser = argparse.ArgumentParser(description="单遍数据集清洗流水线")
+    parser.add_argument("dataset_dir", nargs="?", default="datasets")
+    parser.add_argument("--stages", default=",".join(DEFAULT_STAGES),
+                        help=f"逗号分隔的清洗阶段，可选: {', '.join(STAGES)}")
+    parser.add_argument("--threshold", type=int, default=5, help="深度去重的汉明距离阈值")
+    parser.add_argument("--yes", action="store_true", help="不询问确认，直接删除")
+    parser.add_argument("--dry-run", action="store_true", help="只生成并打印删除计划，不修改文件")
+    parser.add_argument("--plan-out", help="把删除计划保存为 JSON")
+    parser.add_argument("--backup-dir", help="删除前把图片备份（优先硬链接）到该目录")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.dataset_dir):
+        print(f"❌ 错误: 未找到 '{args.dataset_dir}' 目录")
+        sys.exit(1)
+    run_pipeline(args.dataset_dir, [name.strip() for name in args.stages.split(",") if name.strip()],
+                 args.threshold, args.yes, args.dry_run, args.plan_out, args.backup_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,8 @@
 import os
-import sys
-from PIL import Image
 from tqdm import tqdm
 from collections import defaultdict
-
-# 检查依赖项
-try:
-    from PIL import Image
-except ImportError:
-    print("此脚本需要 'Pillow' 库")
-    print("请使用以下命令安装: pip install Pillow")
-    sys.exit(1)
+from hash_catalog import get_catalog
+from corner_stage import detect_black_corners
 
 def get_category_from_path(file_path):
     """从文件路径中提取类别信息"""
@@ -30,47 +22,17 @@ def get_category_from_path(file_path):
     else:
         return 'Unknown'
 
-def is_pixel_dark(pixel, threshold=10):
-    """检查一个像素是否足够黑"""
-    if isinstance(pixel, int):  # Grayscale
-        return pixel <= threshold
-    elif isinstance(pixel, (tuple, list)):  # RGB or RGBA
-        return all(p <= threshold for p in pixel[:3])
-    return False
+# 哈希目录中黑角检测结果的记录名，检测参数变化时需要修改
+BLACK_CORNER_FLAG = "rotated_black_corners:dark=10:offset=5"
 
-def is_rotated_with_black_corners(image_path, threshold=10, corner_offset=5):
+def detect_rotated_images(image_paths, threshold=10, corner_offset=5):
     """
-    检查一张图片的四个角是否都有黑色填充。
-    corner_offset 用于检查离绝对角落稍偏一点的位置，以增加鲁棒性。
+    批量检查图片的四个角是否都有黑色填充，返回对应的布尔列表。
+    corner_offset 用于检查离绝对角落稍偏一点的位置，以增加鲁棒性；无法打开或处理的图片判定为否。
     """
-    try:
-        with Image.open(image_path) as img:
-            width, height = img.size
-            
-            # 如果图片太小，可能不适用此逻辑，直接跳过
-            if width < corner_offset * 4 or height < corner_offset * 4:
-                return False
-
-            # 定义四个角的坐标
-            corners = [
-                (corner_offset, corner_offset),                              # Top-left
-                (width - 1 - corner_offset, corner_offset),                  # Top-right
-                (corner_offset, height - 1 - corner_offset),                 # Bottom-left
-                (width - 1 - corner_offset, height - 1 - corner_offset),     # Bottom-right
-            ]
-            
-            # 检查是否所有角的像素都是黑色的
-            for x, y in corners:
-                pixel = img.getpixel((x, y))
-                if not is_pixel_dark(pixel, threshold):
-                    # 只要有一个角不是黑的，就认为不是目标图片
-                    return False
-            
-            # 如果所有角都是黑的，则判定为是
-            return True
-    except Exception:
-        # 无法打开或处理的图片，直接跳过
-        return False
+    flags, _ = detect_black_corners(image_paths, 'points', desc="分析图片",
+                                    threshold=threshold, corner_offset=corner_offset)
+    return flags
 
 def find_and_remove_rotated_images(root_folder):
     """
@@ -129,8 +91,10 @@ def find_and_remove_rotated_images(root_folder):
     print(f"\n🔍 Step 2: 检查旋转产生的黑角...")
     category_rotated = defaultdict(int)
     
-    for filepath in tqdm(files_to_scan, desc="分析图片"):
-        if is_rotated_with_black_corners(filepath):
+    # 检测结果记录在哈希目录中
+    black_corner_flags = get_catalog().flags(files_to_scan, BLACK_CORNER_FLAG, detect_rotated_images)
+    for filepath, has_black_corners in zip(files_to_scan, black_corner_flags):
+        if has_black_corners:
             files_to_remove.append(filepath)
             category = get_category_from_path(filepath)
             category_rotated[category] += 1
@@ -7,28 +7,21 @@
 
 import os
 import sys
-import hashlib
-import shutil
-from PIL import Image
-import imagehash
-from tqdm import tqdm
 from collections import defaultdict
-
-# 检查依赖项
-try:
-    from PIL import Image
-    import imagehash
-except ImportError:
-    print("❌ 缺少必要的库")
-    print("请安装: pip install Pillow imagehash")
-    sys.exit(1)
+from hash_catalog import get_catalog
+from corner_stage import detect_black_corners
+from file_ops import FilePlan, apply_plan
 
 class RustDatasetCleaner:
     """锈病数据集清洗器"""
     
-    def __init__(self, rust_dir="data/rust"):
+    def __init__(self, rust_dir="data/rust", dry_run=False):
         self.rust_dir = rust_dir
         self.backup_dir = os.path.join(rust_dir, "backup_original")
+        # dry-run 时各步骤只把操作记入 file_plan，后续步骤当作这些文件已被删除
+        self.dry_run = dry_run
+        self.file_plan = FilePlan()
+        self._planned_deletions = set()
         self.stats = {
             'original_count': 0,
             'md5_duplicates': 0,
@@ -39,66 +32,69 @@ class RustDatasetCleaner:
         }
         
         # 创建备份目录
-        if not os.path.exists(self.backup_dir):
+        if not os.path.exists(self.backup_dir) and not dry_run:
             os.makedirs(self.backup_dir)
+    
+    def list_images(self):
+        """列出rust目录中的图片（dry-run 时不含已计划删除的文件）"""
+        valid_extensions = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+        return [os.path.join(self.rust_dir, file) for file in os.listdir(self.rust_dir)
+                if os.path.splitext(file)[1].lower() in valid_extensions
+                and os.path.join(self.rust_dir, file) not in self._planned_deletions]
+    
+    def apply_file_plan(self, plan, desc):
+        """并行执行文件操作计划（dry-run 时只记录），返回 (成功或计划删除的文件数, 失败的操作)"""
+        if self.dry_run:
+            self.file_plan.operations.extend(plan)
+            self._planned_deletions.update(op.src for op in plan if op.action == 'delete')
+            return plan.counts()['delete'], []
+        
+        _, failures, backup_methods = apply_plan(plan, desc=desc)
+        for op, error in failures:
+            print(f"    ❌ {op.action} 失败 {os.path.basename(op.src)}: {error}")
+        if backup_methods:
+            print(f"  📦 备份方式: {dict(backup_methods)}")
+        return plan.counts()['delete'] - sum(1 for op, _ in failures if op.action == 'delete'), failures
             
     def backup_original_files(self):
-        """备份原始文件"""
+        """备份原始文件（优先硬链接，几乎不占用额外空间和时间），有文件备份失败时返回 False"""
         print("📦 Step 1: 备份原始文件...")
         
-        if os.listdir(self.backup_dir):
+        if os.path.isdir(self.backup_dir) and os.listdir(self.backup_dir):
             print("  ✅ 备份已存在，跳过备份步骤")
-            return
+            return True
         
-        files_to_backup = []
-        valid_extensions = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
-        
-        for file in os.listdir(self.rust_dir):
-            if os.path.splitext(file)[1].lower() in valid_extensions:
-                files_to_backup.append(file)
+        files_to_backup = self.list_images()
         
         self.stats['original_count'] = len(files_to_backup)
         print(f"  🔢 发现 {len(files_to_backup)} 张原始图片")
         
-        for file in tqdm(files_to_backup, desc="备份文件"):
-            src = os.path.join(self.rust_dir, file)
-            dst = os.path.join(self.backup_dir, file)
-            shutil.copy2(src, dst)
+        plan = FilePlan()
+        for src in files_to_backup:
+            plan.backup(src, os.path.join(self.backup_dir, os.path.basename(src)))
+        _, failures = self.apply_file_plan(plan, desc="备份文件")
+        if failures:
+            print(f"  ❌ {len(failures)} 个文件备份失败，清洗已中止（未删除任何文件）")
+            print(f"  备份不完整，请检查并清空 {self.backup_dir} 后重新运行")
+            return False
         
         print(f"  ✅ 备份完成，原始文件保存在: {self.backup_dir}")
-    
-    def calculate_md5(self, file_path, chunk_size=8192):
-        """计算文件的MD5哈希值"""
-        hash_md5 = hashlib.md5()
-        try:
-            with open(file_path, "rb") as f:
-                for chunk in iter(lambda: f.read(chunk_size), b""):
-                    hash_md5.update(chunk)
-        except IOError:
-            return None
-        return hash_md5.hexdigest()
+        return True
     
     def remove_md5_duplicates(self):
         """删除MD5重复的文件"""
         print("\n🔍 Step 2: MD5基础去重...")
         
         hashes = defaultdict(list)
-        files_to_scan = []
-        valid_extensions = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+        files_to_scan = self.list_images()
         
-        for file in os.listdir(self.rust_dir):
-            if os.path.splitext(file)[1].lower() in valid_extensions:
-                file_path = os.path.join(self.rust_dir, file)
-                files_to_scan.append(file_path)
-        
-        # 计算哈希值
-        for filepath in tqdm(files_to_scan, desc="计算MD5"):
-            file_hash = self.calculate_md5(filepath)
+        # 计算哈希值（只计算哈希目录中没有的新增或已修改文件）
+        for filepath, file_hash in zip(files_to_scan, get_catalog().md5s(files_to_scan, desc="计算MD5")):
             if file_hash:
                 hashes[file_hash].append(filepath)
         
         # 删除重复文件
-        duplicates_removed = 0
+        plan = FilePlan()
         for file_hash, file_paths in hashes.items():
             if len(file_paths) > 1:
                 # 保留第一个文件，删除其余的
@@ -107,11 +103,8 @@ class RustDatasetCleaner:
                 
                 for duplicate_path in file_paths[1:]:
                     print(f"    🗑️  删除: {os.path.basename(duplicate_path)}")
-                    try:
-                        os.remove(duplicate_path)
-                        duplicates_removed += 1
-                    except OSError as e:
-                        print(f"    ❌ 删除失败: {e}")
+                    plan.delete(duplicate_path, reason="md5")
+        duplicates_removed, _ = self.apply_file_plan(plan, desc="删除MD5重复")
         
         self.stats['md5_duplicates'] = duplicates_removed
         print(f"  ✅ MD5去重完成，删除了 {duplicates_removed} 个重复文件")
@@ -121,25 +114,17 @@ class RustDatasetCleaner:
         print("\n👁️  Step 3: 视觉去重...")
         
         hashes = defaultdict(list)
-        files_to_scan = []
-        valid_extensions = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+        files_to_scan = self.list_images()
         
-        for file in os.listdir(self.rust_dir):
-            if os.path.splitext(file)[1].lower() in valid_extensions:
-                file_path = os.path.join(self.rust_dir, file)
-                files_to_scan.append(file_path)
-        
-        # 计算感知哈希值
-        for filepath in tqdm(files_to_scan, desc="计算感知哈希"):
-            try:
-                with Image.open(filepath) as img:
-                    file_hash = imagehash.phash(img, hash_size=hash_size)
-                    hashes[file_hash].append(filepath)
-            except Exception as e:
-                print(f"  ❌ 无法处理 {filepath}: {e}")
+        # 计算感知哈希值（多进程并行）
+        hashed_paths, hash_matrix, failures = get_catalog().hashes(files_to_scan, mode='phash', hash_size=hash_size, desc="计算感知哈希")
+        for filepath, error in failures:
+            print(f"  ❌ 无法处理 {filepath}: {error}")
+        for filepath, file_hash in zip(hashed_paths, hash_matrix[:, 0].tolist()):
+            hashes[file_hash].append(filepath)
         
         # 删除重复文件
-        duplicates_removed = 0
+        plan = FilePlan()
         for file_hash, file_paths in hashes.items():
             if len(file_paths) > 1:
                 files_to_keep = file_paths[0]
@@ -147,130 +132,43 @@ class RustDatasetCleaner:
                 
                 for duplicate_path in file_paths[1:]:
                     print(f"    🗑️  删除: {os.path.basename(duplicate_path)}")
-                    try:
-                        os.remove(duplicate_path)
-                        duplicates_removed += 1
-                    except OSError as e:
-                        print(f"    ❌ 删除失败: {e}")
+                    plan.delete(duplicate_path, reason="phash")
+        duplicates_removed, _ = self.apply_file_plan(plan, desc="删除视觉重复")
         
         self.stats['visual_duplicates'] = duplicates_removed
         print(f"  ✅ 视觉去重完成，删除了 {duplicates_removed} 个重复文件")
     
-    def is_pixel_dark(self, pixel, threshold=15):
-        """检查像素是否为黑色（降低阈值提高敏感度）"""
-        if isinstance(pixel, int):
-            return pixel <= threshold
-        elif isinstance(pixel, (tuple, list)):
-            return all(p <= threshold for p in pixel[:3])
-        return False
-    
-    def check_corner_black_triangle(self, img, corner_x, corner_y, width, height, check_size=20):
-        """检查指定角落是否有黑色三角形区域"""
-        black_count = 0
-        total_count = 0
-        
-        # 根据角落位置确定检查区域
-        if corner_x == 0 and corner_y == 0:
-            # 左上角
-            for x in range(min(check_size, width)):
-                for y in range(min(check_size, height)):
-                    if x + y < check_size:  # 三角形区域
-                        pixel = img.getpixel((x, y))
-                        if self.is_pixel_dark(pixel):
-                            black_count += 1
-                        total_count += 1
-        elif corner_x == width-1 and corner_y == 0:
-            # 右上角
-            for x in range(max(0, width-check_size), width):
-                for y in range(min(check_size, height)):
-                    if (width-1-x) + y < check_size:  # 三角形区域
-                        pixel = img.getpixel((x, y))
-                        if self.is_pixel_dark(pixel):
-                            black_count += 1
-                        total_count += 1
-        elif corner_x == 0 and corner_y == height-1:
-            # 左下角
-            for x in range(min(check_size, width)):
-                for y in range(max(0, height-check_size), height):
-                    if x + (height-1-y) < check_size:  # 三角形区域
-                        pixel = img.getpixel((x, y))
-                        if self.is_pixel_dark(pixel):
-                            black_count += 1
-                        total_count += 1
-        elif corner_x == width-1 and corner_y == height-1:
-            # 右下角
-            for x in range(max(0, width-check_size), width):
-                for y in range(max(0, height-check_size), height):
-                    if (width-1-x) + (height-1-y) < check_size:  # 三角形区域
-                        pixel = img.getpixel((x, y))
-                        if self.is_pixel_dark(pixel):
-                            black_count += 1
-                        total_count += 1
-        
-        # 如果黑色像素占比超过70%，认为是黑色三角形
-        if total_count > 0:
-            black_ratio = black_count / total_count
-            return black_ratio >= 0.7
-        return False
-    
-    def is_rotated_with_black_corners(self, image_path, check_size=20):
-        """检查图片四个角是否都有黑色三角形（改进版）"""
-        try:
-            with Image.open(image_path) as img:
-                width, height = img.size
-                
-                # 图片太小则跳过
-                if width < check_size * 2 or height < check_size * 2:
-                    return False
-                
-                # 检查四个角落
-                corners = [
-                    (0, 0),                    # 左上角
-                    (width-1, 0),              # 右上角
-                    (0, height-1),             # 左下角
-                    (width-1, height-1),       # 右下角
-                ]
-                
-                black_corners = 0
-                for corner_x, corner_y in corners:
-                    if self.check_corner_black_triangle(img, corner_x, corner_y, width, height, check_size):
-                        black_corners += 1
-                
-                # 如果四个角都有黑色三角形，则认为是旋转图片
-                return black_corners == 4
-                
-        except Exception as e:
-            print(f"  ❌ 检查图片失败 {image_path}: {e}")
-            return False
+    def detect_black_corners(self, image_paths, check_size=20, threshold=15):
+        """批量检查图片四个角是否都有黑色三角形（黑色像素占比不低于70%），返回对应的布尔列表"""
+        flags, failures = detect_black_corners(image_paths, 'triangle', desc="检查黑角",
+                                               check_size=check_size, threshold=threshold)
+        for image_path, error in failures:
+            print(f"  ❌ 检查图片失败 {image_path}: {error}")
+        return flags
     
     def remove_rotated_images(self):
         """删除有黑角的旋转图片"""
         print("\n🔲 Step 4: 清理旋转图片...")
         
-        files_to_scan = []
+        files_to_scan = self.list_images()
         files_to_remove = []
-        valid_extensions = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
         
-        for file in os.listdir(self.rust_dir):
-            if os.path.splitext(file)[1].lower() in valid_extensions:
-                file_path = os.path.join(self.rust_dir, file)
-                files_to_scan.append(file_path)
-        
-        # 检查黑角
-        for filepath in tqdm(files_to_scan, desc="检查黑角"):
-            if self.is_rotated_with_black_corners(filepath):
+        # 检查黑角（检测结果记录在哈希目录中，参数变化时需要修改记录名）
+        black_corner_flags = get_catalog().flags(files_to_scan, "rust_dataset_black_corners:size=20:dark=15",
+                                                 self.detect_black_corners)
+        for filepath, has_black_corners in zip(files_to_scan, black_corner_flags):
+            if has_black_corners:
                 files_to_remove.append(filepath)
         
         # 删除有黑角的文件
+        plan = FilePlan()
         for filepath in files_to_remove:
             print(f"  🗑️  删除黑角图片: {os.path.basename(filepath)}")
-            try:
-                os.remove(filepath)
-            except OSError as e:
-                print(f"    ❌ 删除失败: {e}")
+            plan.delete(filepath, reason="black_corners")
+        removed, _ = self.apply_file_plan(plan, desc="删除黑角图片")
         
-        self.stats['rotated_images'] = len(files_to_remove)
-        print(f"  ✅ 旋转图片清理完成，删除了 {len(files_to_remove)} 个黑角图片")
+        self.stats['rotated_images'] = removed
+        print(f"  ✅ 旋转图片清理完成，删除了 {removed} 个黑角图片")
     
     def remove_advanced_duplicates(self, hash_size=8):
         """删除高级重复（包括镜像）"""
@@ -278,49 +176,32 @@ class RustDatasetCleaner:
         
         seen_hashes = set()
         files_to_delete = []
-        files_to_scan = []
-        valid_extensions = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
-        
-        for file in os.listdir(self.rust_dir):
-            if os.path.splitext(file)[1].lower() in valid_extensions:
-                file_path = os.path.join(self.rust_dir, file)
-                files_to_scan.append(file_path)
-        
-        # 检测镜像重复
-        for filepath in tqdm(files_to_scan, desc="检测镜像重复"):
-            try:
-                with Image.open(filepath) as img:
-                    original_hash = imagehash.phash(img, hash_size=hash_size)
-                    
-                    if original_hash in seen_hashes:
-                        files_to_delete.append(filepath)
-                    else:
-                        flipped_img = img.transpose(Image.FLIP_LEFT_RIGHT)
-                        flipped_hash = imagehash.phash(flipped_img, hash_size=hash_size)
-                        seen_hashes.add(original_hash)
-                        seen_hashes.add(flipped_hash)
-            except Exception as e:
-                print(f"  ❌ 无法处理 {filepath}: {e}")
+        files_to_scan = self.list_images()
+        
+        # 检测镜像重复（先并行计算原图和翻转图哈希，再按原顺序判断）
+        hashed_paths, hash_matrix, failures = get_catalog().hashes(files_to_scan, mode='flip', hash_size=hash_size, desc="检测镜像重复")
+        for filepath, error in failures:
+            print(f"  ❌ 无法处理 {filepath}: {error}")
+        for filepath, (original_hash, flipped_hash) in zip(hashed_paths, hash_matrix.tolist()):
+            if original_hash in seen_hashes:
+                files_to_delete.append(filepath)
+            else:
+                seen_hashes.add(original_hash)
+                seen_hashes.add(flipped_hash)
         
         # 删除重复文件
+        plan = FilePlan()
         for filepath in files_to_delete:
             print(f"  🗑️  删除镜像重复: {os.path.basename(filepath)}")
-            try:
-                os.remove(filepath)
-            except OSError as e:
-                print(f"    ❌ 删除失败: {e}")
+            plan.delete(filepath, reason="flip")
+        removed, _ = self.apply_file_plan(plan, desc="删除镜像重复")
         
-        self.stats['advanced_duplicates'] = len(files_to_delete)
-        print(f"  ✅ 高级去重完成，删除了 {len(files_to_delete)} 个镜像重复文件")
+        self.stats['advanced_duplicates'] = removed
+        print(f"  ✅ 高级去重完成，删除了 {removed} 个镜像重复文件")
     
     def get_final_count(self):
         """获取最终文件数量"""
-        count = 0
-        valid_extensions = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
-        
-        for file in os.listdir(self.rust_dir):
-            if os.path.splitext(file)[1].lower() in valid_extensions:
-                count += 1
+        count = len(self.list_images())
         
         self.stats['final_count'] = count
         return count
@@ -358,8 +239,8 @@ class RustDatasetCleaner:
         print("  3. 对 Common_Rust 再次进行自动清洗")
         print("="*60)
     
-    def run_complete_cleaning(self):
-        """运行完整的清洗流程"""
+    def run_complete_cleaning(self, plan_out=None):
+        """运行完整的清洗流程；dry-run 时只打印（并可保存到 plan_out）文件操作计划"""
         print("🚀 开始锈病数据集自动清洗...")
         print(f"📂 目标目录: {self.rust_dir}")
         
@@ -369,7 +250,8 @@ class RustDatasetCleaner:
             return False
         
         # 执行清洗步骤
-        self.backup_original_files()
+        if not self.backup_original_files():
+            return False
         self.remove_md5_duplicates()
         self.remove_visual_duplicates()
         self.remove_rotated_images()
@@ -381,6 +263,13 @@ class RustDatasetCleaner:
         # 打印报告
         self.print_final_report()
         
+        if self.dry_run:
+            self.file_plan.show()
+            if plan_out:
+                self.file_plan.save(plan_out)
+                print(f"💾 计划已保存到 {plan_out}，确认后可运行: python data_clean/file_ops.py {plan_out}")
+            print("🔍 dry-run: 未修改任何文件")
+        
         return True
 
 def main():
@@ -388,6 +277,10 @@ def main():
     print("🎯 锈病数据集专用清洗脚本")
     print("="*50)
     
+    # python data_clean/clean_rust_dataset.py [--dry-run] [--plan-out 计划.json]
+    dry_run = "--dry-run" in sys.argv[1:]
+    plan_out = sys.argv[sys.argv.index("--plan-out") + 1] if "--plan-out" in sys.argv[1:-1] else None
+    
     # 检查rust目录
     rust_dir = "data/rust"
     if not os.path.exists(rust_dir):
@@ -413,6 +306,11 @@ def main():
     print("  • 清洗过程不可逆，请确保重要数据已备份")
     print("  • 清洗完成后请手动检查剩余图片质量")
     
+    if dry_run:
+        print("\n🔍 dry-run 模式: 只生成文件操作计划，不修改任何文件")
+        RustDatasetCleaner(rust_dir, dry_run=True).run_complete_cleaning(plan_out)
+        return
+    
     user_confirmation = input("\n确定要开始自动清洗吗? (yes/no): ")
     
     if user_confirmation.lower() == 'yes':
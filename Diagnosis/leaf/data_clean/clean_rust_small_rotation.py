@@ -5,17 +5,8 @@
 """
 
 import os
-import sys
-from PIL import Image
-from tqdm import tqdm
-
-# 检查依赖项
-try:
-    from PIL import Image
-except ImportError:
-    print("❌ 缺少必要的库")
-    print("请安装: pip install Pillow")
-    sys.exit(1)
+from hash_catalog import get_catalog
+from corner_stage import detect_black_corners
 
 class SmallRotationCleaner:
     """小角度旋转图片清洗器"""
@@ -28,96 +19,13 @@ class SmallRotationCleaner:
             'final_count': 0
         }
     
-    def is_pixel_dark(self, pixel, threshold=5):
-        """检查像素是否为纯黑色（严格阈值）"""
-        if isinstance(pixel, int):
-            return pixel <= threshold
-        elif isinstance(pixel, (tuple, list)):
-            return all(p <= threshold for p in pixel[:3])
-        return False
-    
-    def check_corner_black_triangle(self, img, corner_x, corner_y, width, height, check_size=25):
-        """检查指定角落是否有纯黑色三角形区域"""
-        black_count = 0
-        total_count = 0
-        
-        # 根据角落位置确定检查区域
-        if corner_x == 0 and corner_y == 0:
-            # 左上角 - 检查三角形区域
-            for x in range(min(check_size, width)):
-                for y in range(min(check_size, height)):
-                    if x + y < check_size:  # 三角形区域
-                        pixel = img.getpixel((x, y))
-                        if self.is_pixel_dark(pixel):
-                            black_count += 1
-                        total_count += 1
-        elif corner_x == width - 1 and corner_y == 0:
-            # 右上角
-            for x in range(max(0, width - check_size), width):
-                for y in range(min(check_size, height)):
-                    if (width - 1 - x) + y < check_size:  # 三角形区域
-                        pixel = img.getpixel((x, y))
-                        if self.is_pixel_dark(pixel):
-                            black_count += 1
-                        total_count += 1
-        elif corner_x == 0 and corner_y == height - 1:
-            # 左下角
-            for x in range(min(check_size, width)):
-                for y in range(max(0, height - check_size), height):
-                    if x + (height - 1 - y) < check_size:  # 三角形区域
-                        pixel = img.getpixel((x, y))
-                        if self.is_pixel_dark(pixel):
-                            black_count += 1
-                        total_count += 1
-        elif corner_x == width - 1 and corner_y == height - 1:
-            # 右下角
-            for x in range(max(0, width - check_size), width):
-                for y in range(max(0, height - check_size), height):
-                    if (width - 1 - x) + (height - 1 - y) < check_size:  # 三角形区域
-                        pixel = img.getpixel((x, y))
-                        if self.is_pixel_dark(pixel):
-                            black_count += 1
-                        total_count += 1
-        
-        # 如果三角形区域中超过60%的像素是纯黑色，则认为是黑角
-        if total_count > 0:
-            black_ratio = black_count / total_count
-            return black_ratio > 0.6
-        return False
-    
-    def has_all_black_corners(self, image_path, check_size=20):
-        """检查图片四个角是否都有黑色三角形"""
-        try:
-            with Image.open(image_path) as img:
-                width, height = img.size
-                
-                # 图片太小则跳过
-                if width < check_size * 2 or height < check_size * 2:
-                    return False, []
-                
-                # 检查四个角落
-                corners = [
-                    (0, 0),                    # 左上角
-                    (width-1, 0),              # 右上角
-                    (0, height-1),             # 左下角
-                    (width-1, height-1),       # 右下角
-                ]
-                
-                black_corners = 0
-                corner_details = []
-                
-                for corner_x, corner_y in corners:
-                    has_black = self.check_corner_black_triangle(img, corner_x, corner_y, width, height, check_size)
-                    if has_black:
-                        black_corners += 1
-                    corner_details.append(has_black)
-                
-                # 如果四个角都有黑色三角形，则认为是旋转图片
-                return black_corners == 4, corner_details
-                
-        except Exception as e:
-            print(f"  ❌ 检查图片失败 {image_path}: {e}")
-            return False, []
+    def detect_black_corners(self, image_paths, check_size=20, threshold=5):
+        """批量检查图片四个角是否都有纯黑色三角形（严格阈值，黑色像素超过60%），返回对应的布尔列表"""
+        flags, failures = detect_black_corners(image_paths, 'triangle', desc="检测黑角", check_size=check_size,
+                                               threshold=threshold, min_ratio=0.6, inclusive=False)
+        for image_path, error in failures:
+            print(f"  ❌ 检查图片失败 {image_path}: {error}")
+        return flags
     
     def clean_small_rotations(self):
         """清理小角度旋转的图片"""
@@ -136,9 +44,10 @@ class SmallRotationCleaner:
         
         files_to_remove = []
         
-        # 检查每张图片的四个角
-        for filepath in tqdm(files_to_scan, desc="检测黑角"):
-            has_all_black, corner_details = self.has_all_black_corners(filepath)
+        # 检查每张图片的四个角（检测结果记录在哈希目录中，参数变化时需要修改记录名）
+        black_corner_flags = get_catalog().flags(files_to_scan, "small_rotation_black_corners:size=20:dark=5",
+                                                 self.detect_black_corners)
+        for filepath, has_all_black in zip(files_to_scan, black_corner_flags):
             if has_all_black:
                 files_to_remove.append(filepath)
                 filename = os.path.basename(filepath)
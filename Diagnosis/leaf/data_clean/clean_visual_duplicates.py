@@ -1,18 +1,7 @@
 import os
-from PIL import Image
-import imagehash
 from tqdm import tqdm
 from collections import defaultdict
-import sys
-
-# 检查依赖项
-try:
-    from PIL import Image
-    import imagehash
-except ImportError:
-    print("此脚本需要 'Pillow' 和 'imagehash' 库")
-    print("请使用以下命令安装: pip install Pillow imagehash")
-    sys.exit(1)
+from hash_catalog import get_catalog
 
 def get_category_from_path(file_path):
     """从文件路径中提取类别信息"""
@@ -88,14 +77,12 @@ def find_and_remove_visual_duplicates(root_folder, hash_size=8):
 
     # 2. 计算感知哈希值并找出重复项
     print(f"\n🔍 Step 2: 计算感知哈希值 (hash_size={hash_size})...")
-    for filepath in tqdm(files_to_scan, desc="处理图片"):
-        try:
-            with Image.open(filepath) as img:
-                # 使用pHash (Perceptual Hash)
-                file_hash = imagehash.phash(img, hash_size=hash_size)
-                hashes[file_hash].append(filepath)
-        except Exception as e:
-            print(f"\n❌ 无法处理文件 {filepath}: {e}")
+    # 使用pHash (Perceptual Hash)，多进程并行计算
+    hashed_paths, hash_matrix, failures = get_catalog().hashes(files_to_scan, mode='phash', hash_size=hash_size, desc="处理图片")
+    for filepath, error in failures:
+        print(f"\n❌ 无法处理文件 {filepath}: {error}")
+    for filepath, file_hash in zip(hashed_paths, hash_matrix[:, 0].tolist()):
+        hashes[file_hash].append(filepath)
             
     # 3. 删除视觉上重复的文件
     print(f"\n🧹 Step 3: 删除视觉重复文件...")
@@ -1,18 +1,7 @@
 import os
-from PIL import Image
-import imagehash
 from tqdm import tqdm
 from collections import defaultdict
-import sys
-
-# 检查依赖项
-try:
-    from PIL import Image
-    import imagehash
-except ImportError:
-    print("此脚本需要 'Pillow' 和 'imagehash' 库")
-    print("请使用以下命令安装: pip install Pillow imagehash")
-    sys.exit(1)
+from hash_catalog import get_catalog
 
 def get_category_from_path(file_path):
     """从文件路径中提取类别信息"""
@@ -92,32 +81,28 @@ def find_and_remove_advanced_duplicates(root_folder, hash_size=8):
     category_deleted = defaultdict(int)
     rust_preserved = 0
     
-    for filepath in tqdm(files_to_scan, desc="处理图片"):
-        try:
-            with Image.open(filepath) as img:
-                # 计算原图和水平翻转图的哈希值
-                original_hash = imagehash.phash(img, hash_size=hash_size)
-                
-                # 检查原图哈希或翻转图哈希是否已存在
-                if original_hash in seen_hashes:
-                    category = get_category_from_path(filepath)
-                    
-                    # 特殊处理锈病样本
-                    if category == 'Common_Rust' and rust_count < 500:
-                        print(f"\n  🔥 保护锈病样本: 跳过删除 {filepath}")
-                        rust_preserved += 1
-                        continue
-                    
-                    files_to_delete.append(filepath)
-                    category_deleted[category] += 1
-                else:
-                    # 如果都不存在，这是一个新图片，将其哈希加入库中
-                    flipped_img = img.transpose(Image.FLIP_LEFT_RIGHT)
-                    flipped_hash = imagehash.phash(flipped_img, hash_size=hash_size)
-                    seen_hashes.add(original_hash)
-                    seen_hashes.add(flipped_hash) # 把翻转后的哈希也加入，这样后续无论是遇到原图还是翻转图都能识别
-        except Exception as e:
-            print(f"\n❌ 无法处理文件 {filepath}: {e}")
+    # 先多进程并行计算所有图片原图和水平翻转图的哈希，再按原顺序逐张判断
+    hashed_paths, hash_matrix, failures = get_catalog().hashes(files_to_scan, mode='flip', hash_size=hash_size, desc="计算哈希")
+    for filepath, error in failures:
+        print(f"\n❌ 无法处理文件 {filepath}: {error}")
+    
+    for filepath, (original_hash, flipped_hash) in zip(hashed_paths, hash_matrix.tolist()):
+        # 检查原图哈希或翻转图哈希是否已存在
+        if original_hash in seen_hashes:
+            category = get_category_from_path(filepath)
+            
+            # 特殊处理锈病样本
+            if category == 'Common_Rust' and rust_count < 500:
+                print(f"\n  🔥 保护锈病样本: 跳过删除 {filepath}")
+                rust_preserved += 1
+                continue
+            
+            files_to_delete.append(filepath)
+            category_deleted[category] += 1
+        else:
+            # 如果都不存在，这是一个新图片，将其哈希加入库中
+            seen_hashes.add(original_hash)
+            seen_hashes.add(flipped_hash) # 把翻转后的哈希也加入，这样后续无论是遇到原图还是翻转图都能识别
             
     # 3. 删除被标记为重复的文件
     print(f"\n🗑️  Step 3: 发现 {len(files_to_delete)} 个视觉重复文件待删除...")
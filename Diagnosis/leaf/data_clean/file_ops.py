@@ -0,0 +1,184 @@
+"""
+数据清洗脚本共用的文件操作计划与执行器。
+
+清洗步骤先生成可序列化的操作计划（删除、移动、备份），可以只打印或保存为 JSON（dry-run），
+确认后再由执行器用线程池并行执行：网络文件系统上单个文件操作的延迟很高，并行后总耗时大幅下降。
+备份优先使用硬链接（同一文件系统内几乎零开销，删除原文件后备份仍然完整），
+不支持时尝试 reflink（写时复制，Btrfs/XFS 等），最后才退回完整复制。
+
+同一计划内按 备份 → 移动 → 删除 的顺序分阶段执行，每个阶段内部并行；
+某个文件备份失败时，同一文件的移动和删除操作不再执行，计为失败。
+"""
+import errno
+import json
+import os
+import shutil
+import time
+from collections import Counter, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from tqdm import tqdm
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+ACTIONS = ('backup', 'move', 'delete')
+# 每个线程同时处理一个文件；网络文件系统上可适当调大
+FILE_OPS_WORKERS = int(os.environ.get("DIAGNOSIS_FILE_OPS_WORKERS", "8"))
+# Linux FICLONE ioctl，整个文件的 reflink
+_FICLONE = 0x40049409
+
+FileOperation = namedtuple('FileOperation', ['action', 'src', 'dst', 'reason'])
+
+
+def _reflink(src, dst):
+    with open(src, 'rb') as source, open(dst, 'wb') as target:
+        fcntl.ioctl(target.fileno(), _FICLONE, source.fileno())
+    shutil.copystat(src, dst)
+
+
+def link_or_copy(src, dst):
+    """
+    以最省的方式备份 src 到 dst：硬链接 → reflink → 完整复制。
+    :return: 实际使用的方式 'hardlink' / 'reflink' / 'copy'
+    """
+    try:
+        os.link(src, dst)
+        return 'hardlink'
+    except OSError as e:
+        if e.errno == errno.EEXIST:
+            raise
+    if fcntl is not None:
+        try:
+            _reflink(src, dst)
+            return 'reflink'
+        except OSError:
+            if os.path.exists(dst):
+                os.remove(dst)
+    shutil.copy2(src, dst)
+    return 'copy'
+
+
+class FilePlan:
+    """按加入顺序记录的文件操作计划"""
+
+    def __init__(self, operations=None):
+        self.operations = list(operations or [])
+
+    def __len__(self):
+        return len(self.operations)
+
+    def __iter__(self):
+        return iter(self.operations)
+
+    def add(self, action, src, dst=None, reason=""):
+        if action not in ACTIONS:
+            raise ValueError(f"未知的文件操作 {action}，可选: {ACTIONS}")
+        self.operations.append(FileOperation(action, src, dst, reason))
+
+    def delete(self, path, reason=""):
+        self.add('delete', path, reason=reason)
+
+    def move(self, src, dst, reason=""):
+        self.add('move', src, dst, reason)
+
+    def backup(self, src, dst, reason=""):
+        self.add('backup', src, dst, reason)
+
+    def counts(self):
+        return Counter(op.action for op in self.operations)
+
+    def summary(self):
+        counts = self.counts()
+        names = {'backup': "备份", 'move': "移动", 'delete': "删除"}
+        return "，".join(f"{names[action]} {counts[action]} 个文件" for action in ACTIONS if counts[action]) or "无操作"
+
+    def save(self, path):
+        """保存为 JSON，便于检查或之后用 apply_plan 执行"""
+        data = {
+            'created': time.strftime("%Y-%m-%d %H:%M:%S"),
+            'operations': [op._asdict() for op in self.operations],
+        }
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(FileOperation(**op) for op in data['operations'])
+
+    def show(self, limit=20):
+        print(f"📋 文件操作计划: {self.summary()}")
+        for op in self.operations[:limit]:
+            target = f" -> {op.dst}" if op.dst else ""
+            reason = f" ({op.reason})" if op.reason else ""
+            print(f"  [{op.action}] {op.src}{target}{reason}")
+        if len(self.operations) > limit:
+            print(f"  ... 共 {len(self.operations)} 项")
+
+
+def _apply(op):
+    try:
+        if op.action == 'delete':
+            os.remove(op.src)
+            return None, None
+        os.makedirs(os.path.dirname(op.dst) or '.', exist_ok=True)
+        if op.action == 'move':
+            shutil.move(op.src, op.dst)
+            return None, None
+        return link_or_copy(op.src, op.dst), None
+    except Exception as e:
+        return None, str(e)
+
+
+def apply_plan(plan, max_workers=FILE_OPS_WORKERS, dry_run=False, desc="执行文件操作"):
+    """
+    执行文件操作计划；dry_run=True 时只打印计划。
+    :return: (成功执行的操作数, [(操作, 错误信息)], 备份方式统计)
+    """
+    if dry_run:
+        plan.show()
+        print("🔍 dry-run: 未修改任何文件")
+        return 0, [], Counter()
+
+    done, failures, backup_methods = 0, [], Counter()
+    # 备份失败的源文件：不能再移动或删除，否则会丢失唯一的副本
+    unprotected = set()
+    for action in ACTIONS:
+        operations = [op for op in plan if op.action == action]
+        if action != 'backup' and unprotected:
+            failures.extend((op, "备份失败，已跳过") for op in operations if op.src in unprotected)
+            operations = [op for op in operations if op.src not in unprotected]
+        if not operations:
+            continue
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+            results = list(tqdm(pool.map(_apply, operations), total=len(operations), desc=f"{desc} ({action})"))
+        for op, (method, error) in zip(operations, results):
+            if error is None:
+                done += 1
+                if method:
+                    backup_methods[method] += 1
+            else:
+                failures.append((op, error))
+                if action == 'backup':
+                    unprotected.add(op.src)
+    return done, failures, backup_methods
+
+
+if __name__ == "__main__":
+    # 执行保存的计划：python data_clean/file_ops.py 计划.json [--dry-run]
+    import sys
+
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    if not args:
+        print("用法: python data_clean/file_ops.py 计划.json [--dry-run]")
+        sys.exit(1)
+    saved_plan = FilePlan.load(args[0])
+    done, failures, methods = apply_plan(saved_plan, dry_run="--dry-run" in sys.argv[1:])
+    for op, error in failures:
+        print(f"  ❌ {op.action} 失败 {op.src}: {error}")
+    if "--dry-run" not in sys.argv[1:]:
+        print(f"✅ 完成 {done} 项操作，失败 {len(failures)} 项")
@@ -0,0 +1,256 @@
+"""
+数据清洗脚本共用的持久化哈希目录（SQLite）。
+
+以文件绝对路径为键，记录文件大小和 mtime，以及已经算过的 MD5、各模式的感知哈希和黑角检测结果。
+再次运行清洗脚本时只有新增或被修改（大小或 mtime 变化）的文件需要重新计算，
+其余直接从目录读取，补充少量新图片后重新清洗只需几秒。
+
+目录文件默认为本目录下的 .hash_catalog.sqlite，可用环境变量 DIAGNOSIS_HASH_CATALOG 指定其他路径，
+设为 off 则只在内存中缓存（每次运行都从头计算，与未使用目录时相同）。
+
+    python data_clean/hash_catalog.py           # 查看目录统计
+    python data_clean/hash_catalog.py --prune   # 清理已不存在的文件记录
+"""
+import hashlib
+import os
+import sqlite3
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from tqdm import tqdm
+
+from hash_stage import HASH_MODES, HASH_SIZE, compute_hashes
+
+_catalog_setting = os.environ.get("DIAGNOSIS_HASH_CATALOG", "")
+if _catalog_setting.lower() in ("off", "none", "0"):
+    CATALOG_PATH = ":memory:"
+else:
+    CATALOG_PATH = _catalog_setting or os.path.join(os.path.dirname(os.path.abspath(__file__)), ".hash_catalog.sqlite")
+
+# 单条 SQL 中 IN (...) 的参数个数上限（旧版 SQLite 为 999）
+_SQL_BATCH = 900
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    md5 TEXT
+);
+CREATE TABLE IF NOT EXISTS hashes (
+    path TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    draft INTEGER NOT NULL,
+    value BLOB NOT NULL,
+    PRIMARY KEY (path, mode, draft)
+);
+CREATE TABLE IF NOT EXISTS flags (
+    path TEXT NOT NULL,
+    name TEXT NOT NULL,
+    value INTEGER NOT NULL,
+    PRIMARY KEY (path, name)
+);
+"""
+
+
+def calculate_md5(file_path, chunk_size=1 << 20):
+    """计算文件的MD5哈希值，无法读取时返回 None"""
+    hash_md5 = hashlib.md5()
+    try:
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                hash_md5.update(chunk)
+    except IOError:
+        return None
+    return hash_md5.hexdigest()
+
+
+def _batches(items, size=_SQL_BATCH):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class HashCatalog:
+    """文件哈希目录。各查询方法的返回值都与传入的路径顺序一一对应。"""
+
+    def __init__(self, db_path=CATALOG_PATH):
+        self.db_path = db_path
+        self._conn = sqlite3.connect(db_path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _select(self, sql, keys, params=()):
+        """对 keys 分批执行 sql（其中的 {} 会替换为 IN 的占位符），返回 {path: 其余列}。"""
+        rows = {}
+        for batch in _batches(list(dict.fromkeys(keys))):
+            placeholders = ",".join("?" * len(batch))
+            for row in self._conn.execute(sql.format(placeholders), (*params, *batch)):
+                rows[row[0]] = row[1:]
+        return rows
+
+    def _sync(self, paths):
+        """
+        stat 所有文件并与目录中的记录比较，大小或 mtime 变化的文件清除旧的哈希和标记。
+        :return: 与 paths 对应的目录键（绝对路径），文件不存在时为 None
+        """
+        keys, signatures = [], {}
+        for path in paths:
+            key = os.path.abspath(path)
+            try:
+                stat = os.stat(key)
+            except OSError:
+                keys.append(None)
+                continue
+            keys.append(key)
+            signatures[key] = (stat.st_size, stat.st_mtime_ns)
+
+        known = self._select("SELECT path, size, mtime_ns FROM files WHERE path IN ({})", list(signatures))
+        changed = [(key,) for key, signature in signatures.items() if known.get(key) != signature]
+        if changed:
+            with self._conn:
+                self._conn.executemany("DELETE FROM hashes WHERE path = ?", changed)
+                self._conn.executemany("DELETE FROM flags WHERE path = ?", changed)
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO files (path, size, mtime_ns, md5) VALUES (?, ?, ?, NULL)",
+                    [(key, *signatures[key]) for key, in changed])
+        return keys
+
+    def md5s(self, paths, desc="计算MD5", max_workers=None):
+        """返回每个文件的 MD5（无法读取时为 None），只计算目录中没有的文件。"""
+        paths = list(paths)
+        keys = self._sync(paths)
+        cached = self._select("SELECT path, md5 FROM files WHERE md5 IS NOT NULL AND path IN ({})",
+                              [key for key in keys if key])
+        missing = [key for key in dict.fromkeys(keys) if key and key not in cached]
+        if missing:
+            # 读文件和 hashlib 都会释放 GIL，线程池即可并行
+            with ThreadPoolExecutor(max_workers=max_workers or min(8, (os.cpu_count() or 1) * 2)) as pool:
+                digests = list(tqdm(pool.map(calculate_md5, missing), total=len(missing), desc=desc))
+            computed = [(digest, key) for key, digest in zip(missing, digests) if digest]
+            with self._conn:
+                self._conn.executemany("UPDATE files SET md5 = ? WHERE path = ?", computed)
+            cached.update((key, (digest,)) for digest, key in computed)
+        return [cached[key][0] if key in cached else None for key in keys]
+
+    def hashes(self, paths, mode='phash', hash_size=HASH_SIZE, draft=True, desc="计算哈希", **pool_options):
+        """
+        与 hash_stage.compute_hashes 的参数和返回值相同，只对目录中没有的文件调用 compute_hashes。
+        计算失败的文件不会记录，下次运行时重试。
+        """
+        paths = list(paths)
+        keys = self._sync(paths)
+        cached = self._select("SELECT path, value FROM hashes WHERE mode = ? AND draft = ? AND path IN ({})",
+                              [key for key in keys if key], (mode, int(draft)))
+        missing = [key for key in dict.fromkeys(keys) if key and key not in cached]
+        failures = [(path, "文件不存在") for path, key in zip(paths, keys) if key is None]
+        if missing:
+            ok_keys, matrix, new_failures = compute_hashes(missing, mode=mode, hash_size=hash_size, draft=draft,
+                                                           desc=desc, **pool_options)
+            rows = [(key, mode, int(draft), row.tobytes()) for key, row in zip(ok_keys, matrix)]
+            with self._conn:
+                self._conn.executemany("INSERT OR REPLACE INTO hashes (path, mode, draft, value) VALUES (?, ?, ?, ?)",
+                                       rows)
+            cached.update((key, (value,)) for key, _, _, value in rows)
+            failed = {key: error for key, error in new_failures}
+            failures += [(path, failed[key]) for path, key in zip(paths, keys) if key in failed]
+
+        ok_paths = [path for path, key in zip(paths, keys) if key in cached]
+        matrix = np.frombuffer(b"".join(cached[key][0] for key in keys if key in cached), dtype=np.uint64)
+        return ok_paths, matrix.reshape(len(ok_paths), HASH_MODES[mode]).copy(), failures
+
+    def flags(self, paths, name, detector):
+        """
+        返回每个文件的检测结果（整数/布尔），目录中没有的文件一次性交给 detector(路径列表) 批量检测，
+        detector 返回与路径列表对应的结果列表。
+        name 需要包含检测参数（如阈值），参数不同的检测结果分开记录。
+        """
+        paths = list(paths)
+        keys = self._sync(paths)
+        cached = self._select("SELECT path, value FROM flags WHERE name = ? AND path IN ({})",
+                              [key for key in keys if key], (name,))
+        results = {key: value for key, (value,) in cached.items()}
+        source_paths = {key: path for path, key in zip(paths, keys) if key}
+        missing = [key for key in source_paths if key not in results]
+        if missing:
+            values = detector([source_paths[key] for key in missing])
+            rows = [(key, name, int(value)) for key, value in zip(missing, values)]
+            results.update((key, value) for key, _, value in rows)
+            with self._conn:
+                self._conn.executemany("INSERT OR REPLACE INTO flags (path, name, value) VALUES (?, ?, ?)", rows)
+        return [results.get(key, 0) for key in keys]
+
+    def missing(self, paths, mode, flag_name, draft=True):
+        """返回缺少 MD5、mode 模式哈希或 flag_name 检测结果任一项的文件（按原顺序去重）。"""
+        paths = list(paths)
+        keys = self._sync(paths)
+        present = [key for key in keys if key]
+        have_md5 = self._select("SELECT path, md5 FROM files WHERE md5 IS NOT NULL AND path IN ({})", present)
+        have_hashes = self._select("SELECT path, 1 FROM hashes WHERE mode = ? AND draft = ? AND path IN ({})",
+                                   present, (mode, int(draft)))
+        have_flags = self._select("SELECT path, 1 FROM flags WHERE name = ? AND path IN ({})", present, (flag_name,))
+        source_paths = {key: path for path, key in zip(paths, keys) if key}
+        return [path for key, path in source_paths.items()
+                if key not in have_md5 or key not in have_hashes or key not in have_flags]
+
+    def record(self, entries, mode, flag_name, draft=True):
+        """
+        写入在外部一次性算出的结果（须先经过 missing 登记文件），
+        entries 为 (路径, md5, 哈希列表, 检测结果)，值为 None 的项不写入。
+        """
+        md5_rows, hash_rows, flag_rows = [], [], []
+        for path, md5, hash_values, flag in entries:
+            key = os.path.abspath(path)
+            if md5 is not None:
+                md5_rows.append((md5, key))
+            if hash_values is not None:
+                hash_rows.append((key, mode, int(draft), np.array(hash_values, dtype=np.uint64).tobytes()))
+            if flag is not None:
+                flag_rows.append((key, flag_name, int(flag)))
+        with self._conn:
+            self._conn.executemany("UPDATE files SET md5 = ? WHERE path = ?", md5_rows)
+            self._conn.executemany("INSERT OR REPLACE INTO hashes (path, mode, draft, value) VALUES (?, ?, ?, ?)",
+                                   hash_rows)
+            self._conn.executemany("INSERT OR REPLACE INTO flags (path, name, value) VALUES (?, ?, ?)", flag_rows)
+
+    def prune(self):
+        """删除已不存在的文件的记录，返回删除的条数。"""
+        gone = [(path,) for path, in self._conn.execute("SELECT path FROM files") if not os.path.exists(path)]
+        with self._conn:
+            for table in ("files", "hashes", "flags"):
+                self._conn.executemany(f"DELETE FROM {table} WHERE path = ?", gone)
+        return len(gone)
+
+    def stats(self):
+        return {table: self._conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                for table in ("files", "hashes", "flags")}
+
+
+_catalog = None
+
+
+def get_catalog():
+    """获取全局 HashCatalog（首次调用时打开 CATALOG_PATH）。"""
+    global _catalog
+    if _catalog is None:
+        _catalog = HashCatalog()
+    return _catalog
+
+
+if __name__ == "__main__":
+    catalog = get_catalog()
+    print(f"哈希目录: {catalog.db_path}")
+    if "--prune" in sys.argv[1:]:
+        print(f"清理了 {catalog.prune()} 个已不存在的文件记录")
+    for table, count in catalog.stats().items():
+        print(f"  {table}: {count} 条")
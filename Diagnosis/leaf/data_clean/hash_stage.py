@@ -0,0 +1,135 @@
+"""
+数据清洗脚本共用的感知哈希计算阶段。
+
+用 ProcessPoolExecutor 把图片解码和 pHash 计算分摊到所有 CPU 核心；
+JPEG 以 draft 模式在解码时直接缩小（pHash 本身只用 32x32 灰度图，全分辨率解码纯属浪费），
+结果以紧凑的 numpy uint64 数组返回，每行对应一张图片、每列对应一种变换的哈希。
+
+变换模式：
+    phash    只计算原图哈希（1 列）
+    flip     原图 + 水平翻转（2 列）
+    dihedral 4 种旋转 × 是否水平翻转（8 列，第 0 列为原图）
+"""
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from tqdm import tqdm
+
+# 复用 Diagnosis/utils 中的汉明空间索引
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from utils.hamming_index import radius_pairs
+
+try:
+    from PIL import Image
+    import imagehash
+except ImportError:
+    print("此脚本需要 'Pillow' 和 'imagehash' 库")
+    print("请使用以下命令安装: pip install Pillow imagehash")
+    sys.exit(1)
+
+HASH_MODES = {'phash': 1, 'flip': 2, 'dihedral': 8}
+# 64 位哈希才能放进 uint64
+HASH_SIZE = 8
+# draft 解码后的最长边；pHash 会再缩放到 hash_size * 4 = 32 像素
+DECODE_SIZE = 256
+
+if hasattr(int, 'bit_count'):
+    def hamming_distance(a, b):
+        """两个 64 位哈希（int 或 numpy uint64）之间的汉明距离。"""
+        return (int(a) ^ int(b)).bit_count()
+else:  # Python < 3.10
+    def hamming_distance(a, b):
+        """两个 64 位哈希（int 或 numpy uint64）之间的汉明距离。"""
+        return bin(int(a) ^ int(b)).count('1')
+
+
+def reduce_gray(img):
+    """把已打开的图片转为灰度并缩小到最长边 DECODE_SIZE。"""
+    gray = img.convert("L")
+    gray.thumbnail((DECODE_SIZE, DECODE_SIZE))
+    return gray
+
+
+def load_gray(filepath, draft=True):
+    """读取灰度图；draft=True 时 JPEG 在解码阶段缩小，其他格式解码后缩小到 DECODE_SIZE。"""
+    with Image.open(filepath) as img:
+        if not draft:
+            return img.convert("L")
+        img.draft('L', (DECODE_SIZE, DECODE_SIZE))
+        return reduce_gray(img)
+
+
+def hash_variants(gray, mode='phash', hash_size=HASH_SIZE):
+    """按模式计算一张灰度图各变换的哈希（整数列表），顺序与 HASH_MODES 的说明一致。"""
+    if mode == 'dihedral':
+        # expand=True 确保旋转后的图片尺寸正确，不会被裁剪
+        images = [gray, gray.rotate(90, expand=True), gray.rotate(180), gray.rotate(270, expand=True)]
+    else:
+        images = [gray]
+
+    values = []
+    for img in images:
+        values.append(int(str(imagehash.phash(img, hash_size=hash_size)), 16))
+        if mode != 'phash':
+            values.append(int(str(imagehash.phash(img.transpose(Image.FLIP_LEFT_RIGHT), hash_size=hash_size)), 16))
+    return values
+
+
+def _hash_file(args):
+    filepath, mode, hash_size, draft = args
+    try:
+        return hash_variants(load_gray(filepath, draft), mode, hash_size), None
+    except Exception as e:
+        return None, str(e)
+
+
+def compute_hashes(paths, mode='phash', hash_size=HASH_SIZE, draft=True, max_workers=None, chunksize=32,
+                   desc="计算哈希"):
+    """
+    并行计算图片哈希。
+    :return: (成功的路径列表, uint64 数组 shape=(len(成功路径), HASH_MODES[mode]), [(失败路径, 错误信息)])
+    """
+    if mode not in HASH_MODES:
+        raise ValueError(f"未知的哈希模式 {mode}，可选: {tuple(HASH_MODES)}")
+    if hash_size != HASH_SIZE:
+        raise ValueError(f"uint64 输出只支持 hash_size={HASH_SIZE}")
+    paths = list(paths)
+    tasks = [(path, mode, hash_size, draft) for path in paths]
+    max_workers = max_workers or os.cpu_count() or 1
+
+    if max_workers == 1 or len(paths) < 2 * chunksize:
+        results = [_hash_file(task) for task in tqdm(tasks, desc=desc)]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            results = list(tqdm(pool.map(_hash_file, tasks, chunksize=chunksize), total=len(tasks), desc=desc))
+
+    ok_paths, rows, failures = [], [], []
+    for path, (values, error) in zip(paths, results):
+        if values is None:
+            failures.append((path, error))
+        else:
+            ok_paths.append(path)
+            rows.append(values)
+    hashes = np.array(rows, dtype=np.uint64).reshape(len(rows), HASH_MODES[mode])
+    return ok_paths, hashes, failures
+
+
+def later_similar_images(hash_matrix, threshold):
+    """
+    对每张图片 i，找出主哈希（第 0 列）与其任一变换哈希距离不超过 threshold 的所有图片 j > i。
+    用分段索引代替两两比较，返回每张图片的 j 列表（升序）。
+    """
+    num_images, num_variants = hash_matrix.shape
+    query_idx, value_idx, _ = radius_pairs(hash_matrix[:, 0], hash_matrix.ravel(), threshold)
+    image_idx = value_idx // num_variants
+    later = image_idx > query_idx
+    # 同一对图片可能经由多个变换命中，去重（结果已按 i、j 升序）
+    pair_keys = np.unique(query_idx[later] * num_images + image_idx[later])
+    pair_i, pair_j = pair_keys // num_images, pair_keys % num_images
+
+    matches = [[] for _ in range(num_images)]
+    for i, j in zip(pair_i.tolist(), pair_j.tolist()):
+        matches[i].append(j)
+    return matches
@@ -7,29 +7,24 @@
 
 import os
 import sys
-import shutil
-import hashlib
-from PIL import Image
-import imagehash
-from tqdm import tqdm
+import time
 from collections import defaultdict
-
-# 检查依赖项
-try:
-    from PIL import Image
-    import imagehash
-except ImportError:
-    print("❌ 缺少必要的库")
-    print("请安装: pip install Pillow imagehash")
-    sys.exit(1)
+from hash_catalog import get_catalog
+from file_ops import FilePlan, apply_plan
 
 class RustDataMerger:
     """锈病数据合并器"""
     
-    def __init__(self, rust_dir="data/rust", common_rust_dir="datasets/Common_Rust"):
+    def __init__(self, rust_dir="data/rust", common_rust_dir="datasets/Common_Rust", dry_run=False):
         self.rust_dir = rust_dir
         self.common_rust_dir = common_rust_dir
         self.backup_rust_dir = os.path.join(rust_dir, "moved_to_common")
+        # dry-run 时只记录文件操作计划：计划移动的文件视为已在 Common_Rust 中（从原位置读取），
+        # 计划删除的文件视为已删除
+        self.dry_run = dry_run
+        self.file_plan = FilePlan()
+        self._planned_moves = {}
+        self._planned_deletions = set()
         
         self.stats = {
             'rust_files': 0,
@@ -39,6 +34,9 @@ class RustDataMerger:
             'final_count': 0
         }
         
+        if dry_run:
+            return
+        
         # 确保目标目录存在
         if not os.path.exists(self.common_rust_dir):
             os.makedirs(self.common_rust_dir)
@@ -59,13 +57,44 @@ class RustDataMerger:
                 count += 1
         return count
     
-    def get_unique_filename(self, target_dir, filename):
-        """获取唯一的文件名，避免覆盖"""
+    def list_images(self, directory):
+        """列出目录中的图片路径（dry-run 时按计划加上移入、去掉删除的文件）"""
+        if not os.path.exists(directory):
+            return []
+        valid_extensions = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+        files = [os.path.join(directory, file) for file in os.listdir(directory)
+                 if os.path.splitext(file)[1].lower() in valid_extensions]
+        if directory == self.common_rust_dir:
+            files += list(self._planned_moves)
+        return [path for path in files if path not in self._planned_deletions]
+    
+    def source_paths(self, paths):
+        """dry-run 时计划移动的文件仍在原位置，读取内容时使用原路径"""
+        return [self._planned_moves.get(path, path) for path in paths]
+    
+    def apply_file_plan(self, plan, desc):
+        """并行执行文件操作计划（dry-run 时只记录），返回 (成功执行的操作数, 失败的操作)"""
+        if self.dry_run:
+            self.file_plan.operations.extend(plan)
+            for op in plan:
+                if op.action == 'move':
+                    self._planned_moves[op.dst] = op.src
+                elif op.action == 'delete':
+                    self._planned_deletions.add(op.src)
+            return len(plan), []
+        
+        done, failures, _ = apply_plan(plan, desc=desc)
+        for op, error in failures:
+            print(f"  ❌ {op.action} 失败 {os.path.basename(op.src)}: {error}")
+        return done, failures
+    
+    def get_unique_filename(self, target_dir, filename, reserved=()):
+        """获取唯一的文件名，避免覆盖（reserved 为本次已分配但尚未移入的文件名）"""
         base_name, ext = os.path.splitext(filename)
         counter = 1
         new_filename = filename
         
-        while os.path.exists(os.path.join(target_dir, new_filename)):
+        while os.path.exists(os.path.join(target_dir, new_filename)) or new_filename in reserved:
             new_filename = f"{base_name}_{counter}{ext}"
             counter += 1
         
@@ -86,73 +115,49 @@ class RustDataMerger:
             print("  ⚠️  rust目录为空，无文件需要移动")
             return
         
-        # 移动文件
-        valid_extensions = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
-        files_moved = 0
-        
-        for file in tqdm(os.listdir(self.rust_dir), desc="移动文件"):
-            if os.path.splitext(file)[1].lower() in valid_extensions:
-                src_path = os.path.join(self.rust_dir, file)
-                
-                # 获取唯一文件名
-                unique_filename = self.get_unique_filename(self.common_rust_dir, file)
-                dst_path = os.path.join(self.common_rust_dir, unique_filename)
-                
-                # 移动文件
-                try:
-                    shutil.move(src_path, dst_path)
-                    
-                    # 备份记录
-                    backup_path = os.path.join(self.backup_rust_dir, f"{file} -> {unique_filename}")
-                    with open(backup_path, 'w') as f:
-                        f.write(f"Moved from: {src_path}\nMoved to: {dst_path}\n")
-                    
-                    files_moved += 1
-                    
-                    if unique_filename != file:
-                        print(f"  📝 重命名: {file} -> {unique_filename}")
-                        
-                except Exception as e:
-                    print(f"  ❌ 移动失败 {file}: {e}")
+        # 先为所有文件分配唯一文件名，生成移动计划
+        plan = FilePlan()
+        reserved = set()
+        for src_path in self.list_images(self.rust_dir):
+            file = os.path.basename(src_path)
+            unique_filename = self.get_unique_filename(self.common_rust_dir, file, reserved)
+            reserved.add(unique_filename)
+            plan.move(src_path, os.path.join(self.common_rust_dir, unique_filename), reason="merge")
+            
+            if unique_filename != file:
+                print(f"  📝 重命名: {file} -> {unique_filename}")
+        
+        # 并行移动文件
+        files_moved, failures = self.apply_file_plan(plan, desc="移动文件")
+        
+        # 移动记录：整个计划保存为一个 JSON 文件（失败的操作不记录）
+        if not self.dry_run:
+            failed = {op for op, _ in failures}
+            record_path = os.path.join(self.backup_rust_dir, f"moves_{time.strftime('%Y%m%d_%H%M%S')}.json")
+            FilePlan(op for op in plan if op not in failed).save(record_path)
+            print(f"  📝 移动记录: {record_path}")
         
         self.stats['files_moved'] = files_moved
         print(f"  ✅ 成功移动 {files_moved} 个文件")
     
-    def calculate_md5(self, file_path, chunk_size=8192):
-        """计算文件的MD5哈希值"""
-        hash_md5 = hashlib.md5()
-        try:
-            with open(file_path, "rb") as f:
-                for chunk in iter(lambda: f.read(chunk_size), b""):
-                    hash_md5.update(chunk)
-        except IOError:
-            return None
-        return hash_md5.hexdigest()
-    
     def remove_merge_duplicates(self):
         """删除合并后的重复文件"""
         print("\n🔍 Step 2: 清理合并后的重复文件...")
         
         hashes = defaultdict(list)
-        files_to_scan = []
-        valid_extensions = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
         
         # 收集所有文件
-        for file in os.listdir(self.common_rust_dir):
-            if os.path.splitext(file)[1].lower() in valid_extensions:
-                file_path = os.path.join(self.common_rust_dir, file)
-                files_to_scan.append(file_path)
+        files_to_scan = self.list_images(self.common_rust_dir)
         
         print(f"  📊 检查 {len(files_to_scan)} 个文件的重复情况...")
         
-        # 计算哈希值
-        for filepath in tqdm(files_to_scan, desc="计算哈希"):
-            file_hash = self.calculate_md5(filepath)
+        # 计算哈希值（只计算哈希目录中没有的新增或已修改文件）
+        for filepath, file_hash in zip(files_to_scan, get_catalog().md5s(self.source_paths(files_to_scan), desc="计算哈希")):
             if file_hash:
                 hashes[file_hash].append(filepath)
         
         # 删除重复文件
-        duplicates_removed = 0
+        plan = FilePlan()
         for file_hash, file_paths in hashes.items():
             if len(file_paths) > 1:
                 # 保留第一个文件，删除其余的
@@ -161,11 +166,8 @@ class RustDataMerger:
                 
                 for duplicate_path in file_paths[1:]:
                     print(f"    🗑️  删除重复: {os.path.basename(duplicate_path)}")
-                    try:
-                        os.remove(duplicate_path)
-                        duplicates_removed += 1
-                    except OSError as e:
-                        print(f"    ❌ 删除失败: {e}")
+                    plan.delete(duplicate_path, reason="md5")
+        duplicates_removed, _ = self.apply_file_plan(plan, desc="删除重复文件")
         
         self.stats['merge_duplicates'] = duplicates_removed
         print(f"  ✅ 合并去重完成，删除了 {duplicates_removed} 个重复文件")
@@ -175,28 +177,22 @@ class RustDataMerger:
         print("\n👁️  Step 3: 最终视觉去重...")
         
         hashes = defaultdict(list)
-        files_to_scan = []
-        valid_extensions = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
         
         # 收集所有文件
-        for file in os.listdir(self.common_rust_dir):
-            if os.path.splitext(file)[1].lower() in valid_extensions:
-                file_path = os.path.join(self.common_rust_dir, file)
-                files_to_scan.append(file_path)
+        files_to_scan = self.list_images(self.common_rust_dir)
         
         print(f"  📊 对 {len(files_to_scan)} 个文件进行视觉去重...")
         
-        # 计算感知哈希值
-        for filepath in tqdm(files_to_scan, desc="计算感知哈希"):
-            try:
-                with Image.open(filepath) as img:
-                    file_hash = imagehash.phash(img, hash_size=hash_size)
-                    hashes[file_hash].append(filepath)
-            except Exception as e:
-                print(f"  ❌ 无法处理 {filepath}: {e}")
+        # 计算感知哈希值（多进程并行）
+        scan_paths = dict(zip(self.source_paths(files_to_scan), files_to_scan))
+        hashed_paths, hash_matrix, failures = get_catalog().hashes(list(scan_paths), mode='phash', hash_size=hash_size, desc="计算感知哈希")
+        for filepath, error in failures:
+            print(f"  ❌ 无法处理 {filepath}: {error}")
+        for filepath, file_hash in zip(hashed_paths, hash_matrix[:, 0].tolist()):
+            hashes[file_hash].append(scan_paths[filepath])
         
         # 删除重复文件
-        duplicates_removed = 0
+        plan = FilePlan()
         for file_hash, file_paths in hashes.items():
             if len(file_paths) > 1:
                 files_to_keep = file_paths[0]
@@ -204,17 +200,14 @@ class RustDataMerger:
                 
                 for duplicate_path in file_paths[1:]:
                     print(f"    🗑️  删除视觉重复: {os.path.basename(duplicate_path)}")
-                    try:
-                        os.remove(duplicate_path)
-                        duplicates_removed += 1
-                    except OSError as e:
-                        print(f"    ❌ 删除失败: {e}")
+                    plan.delete(duplicate_path, reason="phash")
+        duplicates_removed, _ = self.apply_file_plan(plan, desc="删除视觉重复")
         
         print(f"  ✅ 视觉去重完成，删除了 {duplicates_removed} 个视觉重复文件")
     
     def get_final_stats(self):
         """获取最终统计"""
-        self.stats['final_count'] = self.count_files(self.common_rust_dir)
+        self.stats['final_count'] = len(self.list_images(self.common_rust_dir))
     
     def print_final_report(self):
         """打印最终报告"""
@@ -256,8 +249,8 @@ class RustDataMerger:
         print("  3. 如需要更多样本，可重复此流程")
         print("="*60)
     
-    def run_complete_merge(self):
-        """运行完整的合并流程"""
+    def run_complete_merge(self, plan_out=None):
+        """运行完整的合并流程；dry-run 时只打印（并可保存到 plan_out）文件操作计划"""
         print("🚀 开始锈病数据合并...")
         print(f"📂 源目录: {self.rust_dir}")
         print(f"📂 目标目录: {self.common_rust_dir}")
@@ -278,6 +271,13 @@ class RustDataMerger:
         # 打印报告
         self.print_final_report()
         
+        if self.dry_run:
+            self.file_plan.show()
+            if plan_out:
+                self.file_plan.save(plan_out)
+                print(f"💾 计划已保存到 {plan_out}，确认后可运行: python data_clean/file_ops.py {plan_out}")
+            print("🔍 dry-run: 未修改任何文件")
+        
         return True
 
 def main():
@@ -285,6 +285,10 @@ def main():
     print("🔄 锈病数据合并脚本")
     print("="*50)
     
+    # python data_clean/merge_rust_to_common.py [--dry-run] [--plan-out 计划.json]
+    dry_run = "--dry-run" in sys.argv[1:]
+    plan_out = sys.argv[sys.argv.index("--plan-out") + 1] if "--plan-out" in sys.argv[1:-1] else None
+    
     # 检查目录
     rust_dir = "data/rust"
     common_rust_dir = "datasets/Common_Rust"
@@ -295,7 +299,7 @@ def main():
         return
     
     # 显示当前状态
-    merger = RustDataMerger(rust_dir, common_rust_dir)
+    merger = RustDataMerger(rust_dir, common_rust_dir, dry_run=dry_run)
     rust_count = merger.count_files(rust_dir)
     common_count = merger.count_files(common_rust_dir)
     
@@ -315,9 +319,14 @@ def main():
     
     print(f"\n🚨 注意事项:")
     print("  • rust目录中的文件将被移动（不是复制）")
-    print("  • 移动记录将保存到 data/rust/moved_to_common/")
+    print("  • 移动记录（JSON 计划）将保存到 data/rust/moved_to_common/")
     print("  • 会对合并后的数据进行最终去重")
     
+    if dry_run:
+        print("\n🔍 dry-run 模式: 只生成文件操作计划，不修改任何文件")
+        merger.run_complete_merge(plan_out)
+        return
+    
     user_confirmation = input("\n确定要开始合并吗? (yes/no): ")
     
     if user_confirmation.lower() == 'yes':
@@ -2,6 +2,9 @@ import gradio as gr
 import torch
 import sys
 import os
+import io
+from pathlib import Path
+from PIL import Image
 
 # 智能路径修复：当直接运行此脚本时，将项目根目录添加到Python路径中
 # 这确保了无论是作为模块导入还是直接运行，都能找到 'utils' 包。
@@ -14,7 +17,13 @@ if __name__ == "__main__" and __package__ is None:
     sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from utils.image_utils import preprocess_image
-from utils.model_definitions import RTX3060OptimizedModel
+from utils.model_definitions import RTX3060OptimizedModel, prepare_for_inference, INFERENCE_PRECISION, CHANNELS_LAST
+from utils.inference_backends import INFERENCE_BACKEND, load_exported_model, served_model_path, serving_variant
+from utils.batch_scheduler import MicroBatchScheduler, BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS
+from utils.model_registry import registry
+from utils import multihead
+from utils.prediction_cache import PredictionCache
+from utils.similar_cache import SIMILAR_CACHE_ENABLED, SIMILAR_CACHE_NOTE, SimilarImageCache, image_phash
 from utils.knowledge_loader import get_knowledge_entry, get_sub_types, load_knowledge_base
 
 # --- 模型和常量定义 ---
@@ -28,22 +37,61 @@ DISEASE_NAME_MAP = {
     '锈病': '锈病'
 }
 
-def load_leaf_model():
-    """加载叶片病害诊断模型"""
+def load_leaf_model(precision=INFERENCE_PRECISION, channels_last=CHANNELS_LAST):
+    """加载叶片病害诊断模型：eager 后端按指定CPU推理精度（fp32 / bf16 / int8）转换，其他后端加载导出模型"""
+    if INFERENCE_BACKEND != 'torch':
+        return load_exported_model(MODEL_PATH, INFERENCE_BACKEND)
     model = RTX3060OptimizedModel(num_classes=NUM_CLASSES, pretrained=False)
     checkpoint = torch.load(MODEL_PATH, map_location=torch.device('cpu'), weights_only=False)
     model.load_state_dict(checkpoint['model_state_dict'])
-    model.eval()
-    return model
+    return prepare_for_inference(model, precision, channels_last)
 
 # --- 全局加载 ---
-# 1. 加载诊断模型
-model = load_leaf_model()
+# 1. 登记诊断模型：权重在首次诊断、后台预热或显式 warmup 时才加载，不拖慢应用启动
+# 启用共享主干多头模型时由 utils.multihead 负责加载，不再单独登记叶片模型
+if not multihead.ENABLED:
+    registry.register("leaf", load_leaf_model)
+scheduler = MicroBatchScheduler(lambda inputs: registry.get("leaf")(inputs),
+                                max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS, name="leaf")
+# 同一张图片重复上传时直接复用概率向量，跳过解码和前向推理
+prediction_cache = PredictionCache("leaf", served_model_path(MODEL_PATH), serving_variant())
+# 可选的二级缓存：感知哈希相近（重复拍摄、被重新压缩）的图片复用之前的结果
+similar_cache = SimilarImageCache("leaf", prediction_cache.fingerprint) if SIMILAR_CACHE_ENABLED else None
 # 2. **决定性修复**: 加载知识库到内存。这是之前所有问题的根源。
 # 必须在程序启动时执行，以确保后续所有查询都有数据可用。
 load_knowledge_base()
 
 
+def predict_leaf_probabilities(image_path: str):
+    """
+    返回 (4类 sigmoid 概率张量, 缓存状态)，优先从预测缓存中读取。
+    缓存状态为 None（模型推理）、'cached'（同一张图片）或 'cached-similar'（感知哈希相近的图片）。
+    """
+    image_bytes = Path(image_path).read_bytes()
+    cached = prediction_cache.get(image_bytes)
+    if cached is not None:
+        return torch.from_numpy(cached), 'cached'
+
+    phash = None
+    if similar_cache is not None:
+        phash = image_phash(image_bytes)
+        match = similar_cache.lookup(phash)
+        if match is not None:
+            cached, _ = match
+            return torch.from_numpy(cached), 'cached-similar'
+
+    image_tensor = preprocess_image(Image.open(io.BytesIO(image_bytes)))
+    if multihead.ENABLED:
+        outputs = multihead.predict(image_tensor, ["leaf"])["leaf"]
+    else:
+        outputs = scheduler.predict(image_tensor)
+    probabilities = torch.sigmoid(outputs).squeeze(0)
+    prediction_cache.put(image_bytes, probabilities.numpy())
+    if similar_cache is not None:
+        similar_cache.add(phash, probabilities.numpy())
+    return probabilities, None
+
+
 def predict_leaf_diseases(image_path: str, history: list):
     """
     接收图片，使用多标签模型进行预测，并生成一份完整的诊断报告。
@@ -57,10 +105,7 @@ def predict_leaf_diseases(image_path: str, history: list):
     history.append({"role": "user", "content": {"path": image_path, "mime_type": "image/jpeg"}})
 
     # 模型推理
-    image_tensor = preprocess_image(image_path)
-    with torch.no_grad():
-        outputs = model(image_tensor)
-        probabilities = torch.sigmoid(outputs).squeeze(0)
+    probabilities, cache_status = predict_leaf_probabilities(image_path)
 
     # 处理诊断结果
     detected_indices = torch.where(probabilities > 0.5)[0]
@@ -166,6 +211,9 @@ def predict_leaf_diseases(image_path: str, history: list):
         else:
             report = report_parts[0]
 
+    if cache_status == 'cached-similar':
+        report += SIMILAR_CACHE_NOTE
+
     history.append({"role": "assistant", "content": report})
     return history, gr.update(), gr.update()
 
@@ -1,10 +1,16 @@
 import os
+import sys
 import hashlib
 from PIL import Image
 import imagehash
+import numpy as np
 from collections import defaultdict
 import shutil
 
+# 复用 Diagnosis/utils 中的汉明空间索引
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from utils.hamming_index import radius_pairs
+
 # --- 配置 ---
 # 数据集根目录
 DATASET_ROOT = os.path.join('pests', 'datasets')
@@ -52,8 +58,9 @@ def find_visual_duplicates(directory, threshold=5):
     在指定目录中查找视觉上相似的图片 (基于感知哈希)
     包括检测原始、旋转90/180/270度和镜像翻转的图像
     """
-    hashes = {}
     duplicates = []
+    hashed_paths = []
+    hash_pairs = []
     
     # 过滤非图片文件
     image_files = []
@@ -75,26 +82,33 @@ def find_visual_duplicates(directory, threshold=5):
                 # 计算多种变换下的哈希值
                 s_hash = imagehash.phash(img)
                 lr_hash = imagehash.phash(img.transpose(Image.FLIP_LEFT_RIGHT))
-
-                is_duplicate = False
-                # 检查与已有哈希值的相似度
-                for path, hash_set in hashes.items():
-                    # 检查正常哈希和镜像哈希
-                    if (s_hash - hash_set['s'] <= threshold or 
-                        lr_hash - hash_set['s'] <= threshold or
-                        s_hash - hash_set['lr'] <= threshold or
-                        lr_hash - hash_set['lr'] <= threshold):
-                        
-                        duplicates.append((img_path, path))
-                        is_duplicate = True
-                        break # 找到一个重复就够了
-                
-                if not is_duplicate:
-                    hashes[img_path] = {'s': s_hash, 'lr': lr_hash}
+                hashed_paths.append(img_path)
+                hash_pairs.append((int(str(s_hash), 16), int(str(lr_hash), 16)))
 
         except Exception as e:
             print(f"⚠️  警告: 无法处理文件 {img_path}: {e}")
     
+    if not hash_pairs:
+        return duplicates
+    
+    # 用分段汉明索引一次找出所有相似对（正常/镜像哈希两两组合），代替对已保留图片的逐一扫描
+    flat_hashes = np.array(hash_pairs, dtype=np.uint64).ravel()
+    query_idx, value_idx, _ = radius_pairs(flat_hashes, flat_hashes, threshold)
+    image_i, image_j = query_idx // 2, value_idx // 2
+    earlier = image_j < image_i
+    similar_earlier = defaultdict(set)
+    for i, j in zip(image_i[earlier].tolist(), image_j[earlier].tolist()):
+        similar_earlier[i].add(j)
+    
+    # 按原顺序处理：与最早保留的相似图片配对，否则保留当前图片
+    kept = set()
+    for i, img_path in enumerate(hashed_paths):
+        kept_matches = [j for j in similar_earlier.get(i, ()) if j in kept]
+        if kept_matches:
+            duplicates.append((img_path, hashed_paths[min(kept_matches)]))
+        else:
+            kept.add(i)
+    
     return duplicates
 
 def move_duplicates(duplicate_map, category_path):
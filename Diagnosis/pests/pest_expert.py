@@ -1,8 +1,16 @@
 import gradio as gr
 from PIL import Image
+import io
+from pathlib import Path
 import torch
 from utils.image_utils import preprocess_image
-from utils.model_definitions import RTX3060OptimizedModel
+from utils.model_definitions import RTX3060OptimizedModel, prepare_for_inference, INFERENCE_PRECISION, CHANNELS_LAST
+from utils.inference_backends import INFERENCE_BACKEND, load_exported_model, served_model_path, serving_variant
+from utils.batch_scheduler import MicroBatchScheduler, BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS
+from utils.model_registry import registry
+from utils import multihead
+from utils.prediction_cache import PredictionCache
+from utils.similar_cache import SIMILAR_CACHE_ENABLED, SIMILAR_CACHE_NOTE, SimilarImageCache, image_phash
 from utils.knowledge_loader import get_knowledge_entry
 
 # --- 模型和常量定义 ---
@@ -17,28 +25,63 @@ PEST_KNOWLEDGE_MAP = {
     '玉米蓟马': '蓟马'
 }
 
-def load_pest_model():
-    """加载害虫识别模型"""
+def load_pest_model(precision=INFERENCE_PRECISION, channels_last=CHANNELS_LAST):
+    """加载害虫识别模型：eager 后端按指定CPU推理精度（fp32 / bf16 / int8）转换，其他后端加载导出模型"""
+    if INFERENCE_BACKEND != 'torch':
+        return load_exported_model(MODEL_PATH, INFERENCE_BACKEND)
     model = RTX3060OptimizedModel(num_classes=NUM_CLASSES, pretrained=False)
+    checkpoint = torch.load(MODEL_PATH, map_location=torch.device('cpu'), weights_only=False)
+    if 'model_state_dict' in checkpoint:
+        state_dict = checkpoint['model_state_dict']
+    else:
+        state_dict = checkpoint
+
+    model.load_state_dict(state_dict)
+    return prepare_for_inference(model, precision, channels_last)
+
+# 登记模型，首次使用时才加载权重
+if not multihead.ENABLED:
+    registry.register("pest", load_pest_model)
+scheduler = MicroBatchScheduler(lambda inputs: registry.get("pest")(inputs),
+                                max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS, name="pest")
+# 同一张图片重复上传时直接复用概率向量，跳过解码和前向推理
+prediction_cache = PredictionCache("pest", served_model_path(MODEL_PATH), serving_variant())
+# 可选的二级缓存：感知哈希相近（重复拍摄、被重新压缩）的图片复用之前的结果
+similar_cache = SimilarImageCache("pest", prediction_cache.fingerprint) if SIMILAR_CACHE_ENABLED else None
+
+
+def predict_pest_probabilities(image_path: str):
+    """
+    返回 (3类 softmax 概率张量, 缓存状态)，优先从预测缓存中读取；图片文件不存在时概率为 None。
+    缓存状态为 None（模型推理）、'cached'（同一张图片）或 'cached-similar'（感知哈希相近的图片）。
+    """
     try:
-        checkpoint = torch.load(MODEL_PATH, map_location=torch.device('cpu'), weights_only=False)
-        if 'model_state_dict' in checkpoint:
-            state_dict = checkpoint['model_state_dict']
-        else:
-            state_dict = checkpoint
-        
-        model.load_state_dict(state_dict)
-        model.eval()
-        return model
+        image_bytes = Path(image_path).read_bytes()
     except FileNotFoundError:
-        print(f"错误：害虫模型文件未找到，路径: {MODEL_PATH}")
-        return "not_found"
-    except Exception as e:
-        print(f"加载害虫模型时发生未知错误: {e}")
-        return "load_error"
+        print(f"Error: The file {image_path} was not found.")
+        return None, None
+    cached = prediction_cache.get(image_bytes)
+    if cached is not None:
+        return torch.from_numpy(cached), 'cached'
 
-# 全局加载模型
-model = load_pest_model()
+    phash = None
+    if similar_cache is not None:
+        phash = image_phash(image_bytes)
+        match = similar_cache.lookup(phash)
+        if match is not None:
+            cached, _ = match
+            return torch.from_numpy(cached), 'cached-similar'
+
+    image_tensor = preprocess_image(Image.open(io.BytesIO(image_bytes)))
+    if multihead.ENABLED:
+        outputs = multihead.predict(image_tensor, ["pest"])["pest"]
+    else:
+        outputs = scheduler.predict(image_tensor)
+    probabilities = torch.nn.functional.softmax(outputs, dim=1).squeeze(0)
+    prediction_cache.put(image_bytes, probabilities.numpy())
+    if similar_cache is not None:
+        similar_cache.add(phash, probabilities.numpy())
+    return probabilities, None
 
 def predict_pest(image_path: str, history: list):
     """
@@ -51,21 +94,22 @@ def predict_pest(image_path: str, history: list):
 
     history.append({"role": "user", "content": {"path": image_path, "mime_type": "image/jpeg"}})
 
-    if isinstance(model, str):
-        error_msg = "抱歉，由于找不到模型文件，诊断功能暂时无法使用。" if model == "not_found" else "抱歉，加载模型时出现内部错误。"
-        history.append({"role": "assistant", "content": error_msg})
-        return history, gr.update(visible=True), gr.update(visible=False)
-
-    image_tensor = preprocess_image(image_path)
-    if image_tensor is None:
-        history.append({"role": "assistant", "content": "无法处理您上传的图片，请检查图片文件是否有效。"})
-        return history, gr.update(visible=True), gr.update(visible=False)
+    # 模型加载失败时注册表记录为 ERROR 状态并抛出原异常
+    if not multihead.ENABLED:
+        try:
+            registry.get("pest")
+        except Exception as e:
+            error_msg = ("抱歉，由于找不到模型文件，诊断功能暂时无法使用。" if isinstance(e, FileNotFoundError)
+                         else "抱歉，加载模型时出现内部错误。")
+            history.append({"role": "assistant", "content": error_msg})
+            return history, gr.update(visible=True), gr.update(visible=False)
 
     try:
-        with torch.no_grad():
-            outputs = model(image_tensor)
-            probabilities = torch.nn.functional.softmax(outputs, dim=1)
-            confidence, predicted_class_idx = torch.max(probabilities, 1)
+        probabilities, cache_status = predict_pest_probabilities(image_path)
+        if probabilities is None:
+            history.append({"role": "assistant", "content": "无法处理您上传的图片，请检查图片文件是否有效。"})
+            return history, gr.update(visible=True), gr.update(visible=False)
+        confidence, predicted_class_idx = torch.max(probabilities, 0)
             
         predicted_class_name = CLASS_NAMES[predicted_class_idx.item()]
         confidence_score = confidence.item()
@@ -98,6 +142,9 @@ def predict_pest(image_path: str, history: list):
             final_report += f"*模型置信度: {confidence_score:.1%}*\n\n"
             final_report += f"**核心症状与危害**:\n{symptoms}\n\n"
             final_report += f"**发生规律参考**:\n{occurrence}"
+
+        if cache_status == 'cached-similar':
+            final_report += SIMILAR_CACHE_NOTE
         
         history.append({"role": "assistant", "content": final_report})
         return history, gr.update(), gr.update()
@@ -1,10 +1,29 @@
 import gradio as gr
-import os
+import asyncio
+from utils.gallery_service import get_gallery
 from utils.knowledge_loader import get_sub_types, get_knowledge_entry
+from utils.report_streaming import stream_report
+from utils.symptom_matcher import symptom_matcher
 
 # 定义该专家系统对应的知识库条目和图片路径
 ROOT_DISEASE_CATEGORY = "根腐病"
 IMAGE_PATH = "root/images"
+# 参考图片缩略图索引（只扫描一次目录，变化时自动刷新）
+reference_gallery = get_gallery(IMAGE_PATH)
+
+# 根腐病关键词表：特征类别 -> 关键词
+ROOT_MATCH_TABLE = "root"
+ROOT_SYMPTOM_KEYWORDS = {
+    '青枯型': ['青枯', '急性', '青灰', '失水', '短时间', '迅速', '开水', '霜打'],
+    '黄枯型': ['黄枯', '慢性', '逐片', '变黄', '缓慢'],
+    '根系症状': ['根系', '根部', '变褐', '腐烂', '次生根', '容易拔起'],
+    '茎基部症状': ['茎基', '茎秆', '黄褐', '疏松', '维管束', '丝状', '中空'],
+    '果穗症状': ['果穗', '苞叶', '干枯', '松散', '下垂', '籽粒', '干瘪'],
+    '发病条件': ['连作', '高温', '多雨', '雨后', '骤晴', '升温', '低洼', '排水不良']
+}
+
+for _category, _keywords in ROOT_SYMPTOM_KEYWORDS.items():
+    symptom_matcher.add_keywords(ROOT_MATCH_TABLE, _category, _keywords)
 
 def get_root_disease_list():
     """获取所有根部病害的亚类列表"""
@@ -12,13 +31,14 @@ def get_root_disease_list():
     # 如果没有亚类，返回主类别
     return subtypes if subtypes else [ROOT_DISEASE_CATEGORY]
 
-def analyze_root_symptoms(symptoms_input: str, history: list):
+async def analyze_root_symptoms(symptoms_input: str, history: list):
     """分析用户输入的根部症状并提供诊断建议"""
     history = history or []
     
     if not symptoms_input or not symptoms_input.strip():
         history.append({"role": "assistant", "content": "请描述您观察到的根部症状，我将根据描述帮您分析可能的病害。"})
-        return history, ""
+        yield history, "", gr.update()
+        return
     
     history.append({"role": "user", "content": symptoms_input})
     
@@ -26,30 +46,14 @@ def analyze_root_symptoms(symptoms_input: str, history: list):
     entry = get_knowledge_entry(ROOT_DISEASE_CATEGORY, ROOT_DISEASE_CATEGORY)
     if not entry:
         history.append({"role": "assistant", "content": "抱歉，无法获取根部病害信息。"})
-        return history, ""
+        yield history, "", gr.update()
+        return
     
     symptoms_lower = symptoms_input.lower().strip()
     
-    # 根腐病关键词匹配
-    keyword_matches = []
-    matched_keywords = []
-    
-    # 关键词分析
-    keywords = {
-        '青枯型': ['青枯', '急性', '青灰', '失水', '短时间', '迅速', '开水', '霜打'],
-        '黄枯型': ['黄枯', '慢性', '逐片', '变黄', '缓慢'],
-        '根系症状': ['根系', '根部', '变褐', '腐烂', '次生根', '容易拔起'],
-        '茎基部症状': ['茎基', '茎秆', '黄褐', '疏松', '维管束', '丝状', '中空'],
-        '果穗症状': ['果穗', '苞叶', '干枯', '松散', '下垂', '籽粒', '干瘪'],
-        '发病条件': ['连作', '高温', '多雨', '雨后', '骤晴', '升温', '低洼', '排水不良']
-    }
-    
-    for category, category_keywords in keywords.items():
-        for keyword in category_keywords:
-            if keyword in symptoms_lower:
-                if category not in keyword_matches:
-                    keyword_matches.append(category)
-                matched_keywords.append(keyword)
+    # 根腐病关键词匹配（一次扫描得到所有命中的关键词）
+    matches = symptom_matcher.match(symptoms_lower, tables=(ROOT_MATCH_TABLE,))
+    matched_keywords = matches.keywords()
     
     # 生成诊断报告
     response = "## 🔍 根部病害症状分析\n\n"
@@ -102,23 +106,21 @@ def analyze_root_symptoms(symptoms_input: str, history: list):
         response += "- **黄枯型**: 叶片逐片变黄，过程相对缓慢\n"
         response += "- **共同特征**: 根系变褐腐烂，茎基部疏松中空\n"
     
-    history.append({"role": "assistant", "content": response})
+    async for partial in stream_report(history, response):
+        yield partial, "", gr.update()
     
     # 如果有症状匹配，也显示图像
     if matched_keywords:
         # 查找参考图片
-        image_files = []
-        if os.path.exists(IMAGE_PATH):
-            for f in os.listdir(IMAGE_PATH):
-                if f.lower().endswith(('.png', '.jpg', '.jpeg', '.webp', '.bmp')):
-                    image_files.append(os.path.join(IMAGE_PATH, f))
+        image_files = await asyncio.to_thread(reference_gallery.images)
         
         if image_files:
-            return history, "", gr.update(visible=True, value=image_files)
+            yield history, "", gr.update(visible=True, value=image_files)
+            return
     
-    return history, "", gr.update()
+    yield history, "", gr.update()
 
-def get_detailed_info(history: list):
+async def get_detailed_info(history: list):
     """获取根腐病的详细信息"""
     history = history or []
     
@@ -128,7 +130,8 @@ def get_detailed_info(history: list):
     if not entry:
         response = "抱歉，无法获取根腐病的详细信息。"
         history.append({"role": "assistant", "content": response})
-        return history, gr.update()
+        yield history, gr.update()
+        return
     
     symptoms = entry.get('核心症状', '无详细症状描述。')
     occurrence = entry.get('发生规律', '无相关发生规律信息。')
@@ -149,19 +152,16 @@ def get_detailed_info(history: list):
     response += "- 及时清除病残体\n\n"
     response += "💡 如果您想分析具体症状，请在上方文本框中描述您观察到的症状。"
     
-    history.append({"role": "assistant", "content": response})
+    async for partial in stream_report(history, response):
+        yield partial, gr.update()
     
     # 查找参考图片 - 显示所有图像文件
-    image_files = []
-    if os.path.exists(IMAGE_PATH):
-        for f in os.listdir(IMAGE_PATH):
-            if f.lower().endswith(('.png', '.jpg', '.jpeg', '.webp', '.bmp')):
-                image_files.append(os.path.join(IMAGE_PATH, f))
+    image_files = await asyncio.to_thread(reference_gallery.images)
     
     if image_files:
-        return history, gr.update(visible=True, value=image_files)
+        yield history, gr.update(visible=True, value=image_files)
     else:
-        return history, gr.update()
+        yield history, gr.update()
 
 def reset_root_conversation():
     """重置对话"""
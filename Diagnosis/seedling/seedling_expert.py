@@ -1,23 +1,56 @@
 import gradio as gr
-import os
+import asyncio
+from utils.gallery_service import get_gallery
 from utils.knowledge_loader import get_sub_types, get_knowledge_entry
+from utils.report_streaming import stream_report
+from utils.symptom_matcher import symptom_matcher
 
 # 定义该专家系统对应的知识库条目和图片路径
 SEEDLING_DISEASE_CATEGORY = "苗枯病"
 IMAGE_PATH = "seedling/images"
+# 参考图片缩略图索引（只扫描一次目录，变化时自动刷新）
+reference_gallery = get_gallery(IMAGE_PATH)
+
+# 苗枯病关键词表：特征类别 -> 关键词
+SEEDLING_MATCH_TABLE = "seedling"
+SEEDLING_SYMPTOM_KEYWORDS = {
+    '烂种': ['烂种', '种子', '腐烂', '不出苗', '缺苗', '断垄', '萌发', '烂籽', '坏种', '种烂', '籽烂', '种子烂', '种腐', '没出苗', '出不了苗', '苗不齐', '苗不全', '缺株', '断行', '发芽', '出芽', '萌芽'],
+    '芽腐': ['芽腐', '幼芽', '出土前', '变褐', '腐烂', '死亡', '芽烂', '芽坏', '芽死', '嫩芽', '小芽', '出土', '露土', '破土', '褐色', '棕色', '暗色', '腐败', '烂掉', '坏死', '死掉'],
+    '苗枯': ['苗枯', '幼苗', '出土后', '心叶', '萎蔫', '干枯', '死亡', '苗死', '苗坏', '苗烂', '小苗', '嫩苗', '出苗', '露苗', '心叶', '中心叶', '萎缩', '枯萎', '干死', '枯死', '死苗', '坏苗'],
+    '根部症状': ['根系', '根部', '褐色', '暗褐色', '腐烂', '根子', '根茎', '根须', '棕色', '暗色', '腐败', '烂根', '坏根', '根烂', '根坏', '根死', '根变'],
+    '茎基部症状': ['茎基部', '水渍状', '淡褐色', '黄褐色', '软化', '坏死', '变细', '茎基', '基部', '茎部', '杆基', '秆基', '水浸', '湿润', '褐色', '棕色', '软烂', '软化', '变软', '细化', '变瘦', '死亡', '坏死'],
+    '地上部症状': ['叶片', '变黄', '干枯', '整株死亡', '容易拔起', '叶子', '叶', '发黄', '黄化', '黄叶', '叶黄', '枯干', '干燥', '枯萎', '萎蔫', '全株', '整个', '整棵', '拔出', '松动', '不牢', '易拔'],
+    '发病条件': ['低温', '高湿', '倒春寒', '地温低', '阴雨', '土壤湿', '通气性差', '播种深', '覆土厚', '温度低', '气温低', '冷', '寒', '湿度大', '潮湿', '水分多', '春寒', '降温', '土温', '地温', '雨天', '下雨', '降雨', '雨季', '土湿', '土壤水分', '透气差', '不透气', '种深', '播深', '埋深', '土厚', '盖土厚']
+}
+
+# 扩展匹配 - 增加容错匹配
+SEEDLING_EXTENDED_KEYWORDS = {
+    '病害通用词汇': ['病', '坏', '烂', '死', '枯', '萎', '变', '问题', '不好', '异常', '发病', '生病', '感染', '病变', '有病', '不对', '奇怪', '怪异', '不正常'],
+    '颜色变化': ['黄', '褐', '棕', '灰', '黑', '暗', '变色', '颜色', '色变', '发黄', '发褐', '发黑', '发灰', '变暗'],
+    '质地变化': ['软', '硬', '烂', '腐', '变质', '软化', '硬化', '腐烂', '腐败', '变软', '变硬', '质变'],
+    '生长状态': ['枯死', '枯萎', '萎蔫', '死亡', '坏死', '腐烂', '腐败', '变质', '干枯', '干燥', '失水', '脱水', '萎缩', '凋谢', '凋萎', '不长', '长不好', '生长差'],
+    '环境因子': ['温度', '湿度', '水分', '土壤', '天气', '气候', '环境', '条件', '冷', '热', '湿', '干', '雨', '晴', '阴', '风']
+}
+
+for _category, _keywords in SEEDLING_SYMPTOM_KEYWORDS.items():
+    symptom_matcher.add_keywords(SEEDLING_MATCH_TABLE, _category, _keywords)
+# 扩展关键词登记在主表之后，命中顺序与逐表检查时一致
+for _category, _keywords in SEEDLING_EXTENDED_KEYWORDS.items():
+    symptom_matcher.add_keywords(SEEDLING_MATCH_TABLE, _category, _keywords)
 
 def get_seedling_disease_list():
     """获取所有苗期病害的亚类列表"""
     subtypes = get_sub_types(SEEDLING_DISEASE_CATEGORY)
     return subtypes if subtypes else [SEEDLING_DISEASE_CATEGORY]
 
-def analyze_seedling_symptoms(symptoms_input: str, history: list):
+async def analyze_seedling_symptoms(symptoms_input: str, history: list):
     """分析用户输入的苗期症状并提供诊断建议"""
     history = history or []
     
     if not symptoms_input or not symptoms_input.strip():
         history.append({"role": "assistant", "content": "请描述您观察到的苗期症状，我将根据描述帮您分析可能的病害。"})
-        return history, ""
+        yield history, "", gr.update()
+        return
     
     history.append({"role": "user", "content": symptoms_input})
     
@@ -25,48 +58,14 @@ def analyze_seedling_symptoms(symptoms_input: str, history: list):
     entry = get_knowledge_entry(SEEDLING_DISEASE_CATEGORY, SEEDLING_DISEASE_CATEGORY)
     if not entry:
         history.append({"role": "assistant", "content": "抱歉，无法获取苗期病害信息。"})
-        return history, ""
+        yield history, "", gr.update()
+        return
     
     symptoms_lower = symptoms_input.lower().strip()
     
-    # 苗枯病关键词匹配
-    keyword_matches = []
-    matched_keywords = []
-    
-    # 关键词分析 - 大幅扩展关键词范围
-    keywords = {
-        '烂种': ['烂种', '种子', '腐烂', '不出苗', '缺苗', '断垄', '萌发', '烂籽', '坏种', '种烂', '籽烂', '种子烂', '种腐', '没出苗', '出不了苗', '苗不齐', '苗不全', '缺株', '断行', '发芽', '出芽', '萌芽'],
-        '芽腐': ['芽腐', '幼芽', '出土前', '变褐', '腐烂', '死亡', '芽烂', '芽坏', '芽死', '嫩芽', '小芽', '出土', '露土', '破土', '褐色', '棕色', '暗色', '腐败', '烂掉', '坏死', '死掉'],
-        '苗枯': ['苗枯', '幼苗', '出土后', '心叶', '萎蔫', '干枯', '死亡', '苗死', '苗坏', '苗烂', '小苗', '嫩苗', '出苗', '露苗', '心叶', '中心叶', '萎缩', '枯萎', '干死', '枯死', '死苗', '坏苗'],
-        '根部症状': ['根系', '根部', '褐色', '暗褐色', '腐烂', '根子', '根茎', '根须', '棕色', '暗色', '腐败', '烂根', '坏根', '根烂', '根坏', '根死', '根变'],
-        '茎基部症状': ['茎基部', '水渍状', '淡褐色', '黄褐色', '软化', '坏死', '变细', '茎基', '基部', '茎部', '杆基', '秆基', '水浸', '湿润', '褐色', '棕色', '软烂', '软化', '变软', '细化', '变瘦', '死亡', '坏死'],
-        '地上部症状': ['叶片', '变黄', '干枯', '整株死亡', '容易拔起', '叶子', '叶', '发黄', '黄化', '黄叶', '叶黄', '枯干', '干燥', '枯萎', '萎蔫', '全株', '整个', '整棵', '拔出', '松动', '不牢', '易拔'],
-        '发病条件': ['低温', '高湿', '倒春寒', '地温低', '阴雨', '土壤湿', '通气性差', '播种深', '覆土厚', '温度低', '气温低', '冷', '寒', '湿度大', '潮湿', '水分多', '春寒', '降温', '土温', '地温', '雨天', '下雨', '降雨', '雨季', '土湿', '土壤水分', '透气差', '不透气', '种深', '播深', '埋深', '土厚', '盖土厚']
-    }
-    
-    # 扩展匹配 - 增加容错匹配
-    extended_keywords = {
-        '病害通用词汇': ['病', '坏', '烂', '死', '枯', '萎', '变', '问题', '不好', '异常', '发病', '生病', '感染', '病变', '有病', '不对', '奇怪', '怪异', '不正常'],
-        '颜色变化': ['黄', '褐', '棕', '灰', '黑', '暗', '变色', '颜色', '色变', '发黄', '发褐', '发黑', '发灰', '变暗'],
-        '质地变化': ['软', '硬', '烂', '腐', '变质', '软化', '硬化', '腐烂', '腐败', '变软', '变硬', '质变'],
-        '生长状态': ['枯死', '枯萎', '萎蔫', '死亡', '坏死', '腐烂', '腐败', '变质', '干枯', '干燥', '失水', '脱水', '萎缩', '凋谢', '凋萎', '不长', '长不好', '生长差'],
-        '环境因子': ['温度', '湿度', '水分', '土壤', '天气', '气候', '环境', '条件', '冷', '热', '湿', '干', '雨', '晴', '阴', '风']
-    }
-    
-    for category, category_keywords in keywords.items():
-        for keyword in category_keywords:
-            if keyword in symptoms_lower:
-                if category not in keyword_matches:
-                    keyword_matches.append(category)
-                matched_keywords.append(keyword)
-    
-    # 检查扩展关键词
-    for category, category_keywords in extended_keywords.items():
-        for keyword in category_keywords:
-            if keyword in symptoms_lower:
-                if category not in keyword_matches:
-                    keyword_matches.append(category)
-                matched_keywords.append(keyword)
+    # 苗枯病关键词匹配（一次扫描得到所有命中的关键词）
+    matches = symptom_matcher.match(symptoms_lower, tables=(SEEDLING_MATCH_TABLE,))
+    matched_keywords = matches.keywords()
     
     # 生成诊断报告
     response = "## 🔍 苗期病害症状分析\n\n"
@@ -137,23 +136,21 @@ def analyze_seedling_symptoms(symptoms_input: str, history: list):
         response += "- **芽腐**: 种子萌发但幼芽出土前腐烂\n"
         response += "- **苗枯**: 幼苗出土后根茎腐烂，叶片萎蔫干枯\n"
     
-    history.append({"role": "assistant", "content": response})
+    async for partial in stream_report(history, response):
+        yield partial, "", gr.update()
     
     # 如果有症状匹配，也显示图像
     if matched_keywords:
         # 查找参考图片
-        image_files = []
-        if os.path.exists(IMAGE_PATH):
-            for f in os.listdir(IMAGE_PATH):
-                if f.lower().endswith(('.png', '.jpg', '.jpeg', '.webp', '.bmp')):
-                    image_files.append(os.path.join(IMAGE_PATH, f))
+        image_files = await asyncio.to_thread(reference_gallery.images)
         
         if image_files:
-            return history, "", gr.update(visible=True, value=image_files)
+            yield history, "", gr.update(visible=True, value=image_files)
+            return
     
-    return history, "", gr.update()
+    yield history, "", gr.update()
 
-def get_seedling_detailed_info(history: list):
+async def get_seedling_detailed_info(history: list):
     """获取苗枯病的详细信息"""
     history = history or []
     
@@ -163,7 +160,8 @@ def get_seedling_detailed_info(history: list):
     if not entry:
         response = "抱歉，无法获取苗枯病的详细信息。"
         history.append({"role": "assistant", "content": response})
-        return history, gr.update()
+        yield history, gr.update()
+        return
     
     symptoms = entry.get('核心症状', '无详细症状描述。')
     occurrence = entry.get('发生规律', '无相关发生规律信息。')
@@ -190,19 +188,16 @@ def get_seedling_detailed_info(history: list):
     response += "- 叶面喷施叶面肥增强抗性\n\n"
     response += "💡 如果您想分析具体症状，请在上方文本框中描述您观察到的症状。"
     
-    history.append({"role": "assistant", "content": response})
+    async for partial in stream_report(history, response):
+        yield partial, gr.update()
     
     # 查找参考图片 - 显示所有图像文件
-    image_files = []
-    if os.path.exists(IMAGE_PATH):
-        for f in os.listdir(IMAGE_PATH):
-            if f.lower().endswith(('.png', '.jpg', '.jpeg', '.webp', '.bmp')):
-                image_files.append(os.path.join(IMAGE_PATH, f))
+    image_files = await asyncio.to_thread(reference_gallery.images)
     
     if image_files:
-        return history, gr.update(visible=True, value=image_files)
+        yield history, gr.update(visible=True, value=image_files)
     else:
-        return history, gr.update()
+        yield history, gr.update()
 
 def reset_seedling_conversation():
     """重置对话"""
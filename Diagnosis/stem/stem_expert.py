@@ -1,27 +1,61 @@
 import gradio as gr
-import os
-import time
 import asyncio
+from utils.gallery_service import get_gallery
 from utils.knowledge_loader import get_sub_types, get_knowledge_entry
+from utils.report_streaming import stream_report
+from utils.symptom_matcher import symptom_matcher
 
 # 定义该专家系统对应的知识库条目和图片路径
 STEM_DISEASE_CATEGORY = "黑粉病"
 IMAGE_PATH = "stem/images"
+# 参考图片缩略图索引（只扫描一次目录，变化时自动刷新）
+reference_gallery = get_gallery(IMAGE_PATH)
+
+# 关键词表：亚类标识 -> [(关键词, 权重)]，按主要(2)/次要(1)/扩展容错(0.5)分组
+STEM_MATCH_TABLE = "stem"
+STEM_SYMPTOM_KEYWORDS = {
+    # 丝黑穗病关键词（更灵活的匹配）
+    '丝黑穗': [
+        (['黑粉', '黑色', '粉末', '果穗', '花丝', '黑包', '黑团', '黑块', '黑灰', '粉状', '粉尘', '包子', '肿包'], 2),
+        (['刺猬', '短粗', '畸形', '系统', '全株', '变形', '异常', '矮化', '侏儒', '短小', '粗短', '变样', '奇形', '怪状', '不正常', '发育不良'], 1),
+        (['枯死', '枯萎', '萎蔫', '死亡', '坏死', '腐烂', '腐败', '变质', '病变', '感染', '发病', '生病'], 0.5),
+    ],
+    # 瘤黑粉病关键词（更灵活的匹配）
+    '瘤黑粉': [
+        (['瘤', '肿瘤', '灰包', '肿胀', '包状', '肿包', '瘤状', '包块', '灰色', '灰白', '鼓包', '凸起', '隆起'], 2),
+        (['白色', '淡绿', '局部', '茎', '叶', '伤口', '膨大', '膨胀', '增厚', '变厚', '肿大', '粗大', '异常', '突出', '凸出'], 1),
+        (['病斑', '斑点', '斑块', '病变', '变色', '发病', '感染', '症状', '异常', '不正常', '有问题'], 0.5),
+    ],
+}
+
+# 没有精确匹配时使用的宽泛描述词
+STEM_FALLBACK_TABLE = "stem_fallback"
+STEM_FALLBACK_KEYWORDS = {
+    '颜色': ['黑', '灰', '褐', '棕', '暗'],
+    '质感': ['粉', '色', '状', '样', '像'],
+    '形状异常': ['变形', '异常', '畸形', '不正常', '奇怪', '怪异', '变样', '不对', '有问题'],
+    '肿胀状况': ['肿', '包', '胀', '大', '厚', '凸', '鼓', '突', '隆'],
+    '病害征象': ['病', '坏', '烂', '死', '枯', '萎', '变', '问题', '不好', '异常'],
+}
+
+for _marker, _groups in STEM_SYMPTOM_KEYWORDS.items():
+    for _keywords, _weight in _groups:
+        symptom_matcher.add_keywords(STEM_MATCH_TABLE, _marker, _keywords, _weight)
+for _category, _keywords in STEM_FALLBACK_KEYWORDS.items():
+    symptom_matcher.add_keywords(STEM_FALLBACK_TABLE, _category, _keywords, 0)
 
 def get_stem_disease_list():
     """获取所有茎/穗部病害的亚类列表"""
     return get_sub_types(STEM_DISEASE_CATEGORY)
 
-def analyze_symptoms(symptoms_input: str, history: list):
+async def analyze_symptoms(symptoms_input: str, history: list):
     """分析用户输入的症状并提供诊断建议"""
     history = history or []
     
     if not symptoms_input or not symptoms_input.strip():
         history.append({"role": "assistant", "content": "请描述您观察到的症状，我将根据描述帮您分析可能的病害。"})
-        return history, "", gr.update(visible=False)
-    
-    # 模拟processing时间，增加用户体验
-    time.sleep(0.8)
+        yield history, "", gr.update(visible=False)
+        return
     
     history.append({"role": "user", "content": symptoms_input})
     
@@ -31,87 +65,27 @@ def analyze_symptoms(symptoms_input: str, history: list):
     # 简单的关键词匹配分析
     symptoms_lower = symptoms_input.lower().strip()
     
-    # 改进的关键词匹配规则
+    # 一次扫描得到所有命中的关键词
+    matches = symptom_matcher.match(symptoms_lower, tables=(STEM_MATCH_TABLE, STEM_FALLBACK_TABLE))
     keyword_matches = []
     
     for subtype in disease_subtypes:
         entry = get_knowledge_entry(STEM_DISEASE_CATEGORY, subtype)
         if entry:
-            match_score = 0
-            matched_keywords = []
-            
-            # 检查症状描述中的关键词
-            core_symptoms = entry.get('核心症状', '').lower()
-            
-            # 丝黑穗病关键词（更灵活的匹配）
-            if '丝黑穗' in subtype:
-                # 主要关键词（权重较高）
-                primary_keywords = ['黑粉', '黑色', '粉末', '果穗', '花丝', '黑包', '黑团', '黑块', '黑灰', '粉状', '粉尘', '包子', '肿包']
-                # 次要关键词（权重较低）
-                secondary_keywords = ['刺猬', '短粗', '畸形', '系统', '全株', '变形', '异常', '矮化', '侏儒', '短小', '粗短', '变样', '奇形', '怪状', '不正常', '发育不良']
-                # 扩展匹配词（容错匹配）
-                fuzzy_keywords = ['枯死', '枯萎', '萎蔫', '死亡', '坏死', '腐烂', '腐败', '变质', '病变', '感染', '发病', '生病']
-                
-                for keyword in primary_keywords:
-                    if keyword in symptoms_lower:
-                        match_score += 2
-                        matched_keywords.append(keyword)
-                
-                for keyword in secondary_keywords:
-                    if keyword in symptoms_lower:
-                        match_score += 1
-                        matched_keywords.append(keyword)
-                
-                for keyword in fuzzy_keywords:
-                    if keyword in symptoms_lower:
-                        match_score += 0.5
-                        matched_keywords.append(keyword)
-            
-            # 瘤黑粉病关键词（更灵活的匹配）
-            elif '瘤黑粉' in subtype:
-                # 主要关键词
-                primary_keywords = ['瘤', '肿瘤', '灰包', '肿胀', '包状', '肿包', '瘤状', '包块', '灰色', '灰白', '鼓包', '凸起', '隆起']
-                # 次要关键词
-                secondary_keywords = ['白色', '淡绿', '局部', '茎', '叶', '伤口', '膨大', '膨胀', '增厚', '变厚', '肿大', '粗大', '异常', '突出', '凸出']
-                # 扩展匹配词
-                fuzzy_keywords = ['病斑', '斑点', '斑块', '病变', '变色', '发病', '感染', '症状', '异常', '不正常', '有问题']
-                
-                for keyword in primary_keywords:
-                    if keyword in symptoms_lower:
-                        match_score += 2
-                        matched_keywords.append(keyword)
-                
-                for keyword in secondary_keywords:
-                    if keyword in symptoms_lower:
-                        match_score += 1
-                        matched_keywords.append(keyword)
-                
-                for keyword in fuzzy_keywords:
-                    if keyword in symptoms_lower:
-                        match_score += 0.5
-                        matched_keywords.append(keyword)
+            marker = next((m for m in STEM_SYMPTOM_KEYWORDS if m in subtype), None)
+            match_score = matches.score(marker) if marker else 0
+            matched_keywords = matches.keywords(marker) if marker else []
             
             # 即使没有精确匹配，也可以通过模糊匹配给予一定分数
             if match_score == 0:
                 # 模糊匹配常见描述
                 fuzzy_matches = []
                 
-                # 更宽泛的颜色匹配
-                if any(color in symptoms_lower for color in ['黑', '灰', '褐', '棕', '暗']):
-                    if any(texture in symptoms_lower for texture in ['粉', '色', '状', '样', '像']):
-                        fuzzy_matches.append('颜色异常')
-                
-                # 更宽泛的形状匹配
-                if any(shape in symptoms_lower for shape in ['变形', '异常', '畸形', '不正常', '奇怪', '怪异', '变样', '不对', '有问题']):
-                    fuzzy_matches.append('形状异常')
-                
-                # 更宽泛的肿胀匹配
-                if any(swelling in symptoms_lower for swelling in ['肿', '包', '胀', '大', '厚', '凸', '鼓', '突', '隆']):
-                    fuzzy_matches.append('肿胀状况')
-                
-                # 通用病害词汇
-                if any(disease in symptoms_lower for disease in ['病', '坏', '烂', '死', '枯', '萎', '变', '问题', '不好', '异常']):
-                    fuzzy_matches.append('病害征象')
+                if matches.has('颜色') and matches.has('质感'):
+                    fuzzy_matches.append('颜色异常')
+                for category in ('形状异常', '肿胀状况', '病害征象'):
+                    if matches.has(category):
+                        fuzzy_matches.append(category)
                 
                 if fuzzy_matches:
                     match_score = 1
@@ -154,11 +128,7 @@ def analyze_symptoms(symptoms_input: str, history: list):
             response += f"**发生规律参考**:\n{occurrence}\n\n"
             
             # 查找对应图片 - 显示所有图像文件
-            image_files = []
-            if os.path.exists(IMAGE_PATH):
-                for f in os.listdir(IMAGE_PATH):
-                    if f.lower().endswith(('.png', '.jpg', '.jpeg', '.webp', '.bmp')):
-                        image_files.append(os.path.join(IMAGE_PATH, f))
+            image_files = await asyncio.to_thread(reference_gallery.images)
             
             if image_files:
                 response += f"**参考图片**: 请查看下方图片库中的 {subtype} 典型症状\n\n"
@@ -196,32 +166,28 @@ def analyze_symptoms(symptoms_input: str, history: list):
                     else:
                         response += f"{symptoms[:50]}...\n"
     
-    history.append({"role": "assistant", "content": response})
+    async for partial in stream_report(history, response):
+        yield partial, "", gr.update()
     
     # 如果有症状匹配，也显示图像
     if high_quality_matches or keyword_matches:
         # 查找参考图片
-        image_files = []
-        if os.path.exists(IMAGE_PATH):
-            for f in os.listdir(IMAGE_PATH):
-                if f.lower().endswith(('.png', '.jpg', '.jpeg', '.webp', '.bmp')):
-                    image_files.append(os.path.join(IMAGE_PATH, f))
+        image_files = await asyncio.to_thread(reference_gallery.images)
         
         if image_files:
-            return history, "", gr.update(visible=True, value=image_files)
+            yield history, "", gr.update(visible=True, value=image_files)
+            return
     
-    return history, "", gr.update()
+    yield history, "", gr.update()
 
-def get_disease_details(choice: str, history: list):
+async def get_disease_details(choice: str, history: list):
     """获取特定病害的详细信息"""
     history = history or []
     
     if not choice:
         history.append({"role": "assistant", "content": "请选择一个病害类型，我将为您详细介绍。"})
-        return history, gr.update()
-    
-    # 模拟processing时间
-    time.sleep(0.5)
+        yield history, gr.update()
+        return
     
     history.append({"role": "user", "content": f"查看{choice}的详细信息"})
     
@@ -230,7 +196,8 @@ def get_disease_details(choice: str, history: list):
     if not entry:
         response = f"抱歉，无法在知识库中找到'{choice}'的详细信息。"
         history.append({"role": "assistant", "content": response})
-        return history, gr.update()
+        yield history, gr.update()
+        return
     
     symptoms = entry.get('核心症状', '无详细症状描述。')
     occurrence = entry.get('发生规律', '无相关发生规律信息。')
@@ -245,19 +212,16 @@ def get_disease_details(choice: str, history: list):
     response += "3. 如有疑问，建议咨询当地农技专家或拍照进一步确认\n\n"
     response += "💡 如果您想分析症状，可以在上方文本框中描述您观察到的具体症状。"
     
-    history.append({"role": "assistant", "content": response})
+    async for partial in stream_report(history, response):
+        yield partial, gr.update()
     
     # 查找对应图片 - 显示所有图像文件
-    image_files = []
-    if os.path.exists(IMAGE_PATH):
-        for f in os.listdir(IMAGE_PATH):
-            if f.lower().endswith(('.png', '.jpg', '.jpeg', '.webp', '.bmp')):
-                image_files.append(os.path.join(IMAGE_PATH, f))
+    image_files = await asyncio.to_thread(reference_gallery.images)
     
     if image_files:
-        return history, gr.update(visible=True, value=image_files)
+        yield history, gr.update(visible=True, value=image_files)
     else:
-        return history, gr.update()
+        yield history, gr.update()
 
 def reset_conversation():
     """重置对话"""
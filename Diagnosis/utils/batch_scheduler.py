@@ -0,0 +1,104 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import torch
+
+# 微批推理参数：并发请求在该时间窗口内合并为一个批次
+BATCH_MAX_SIZE = 16
+BATCH_MAX_WAIT_MS = 20
+
+
+class MicroBatchScheduler:
+    """
+    动态微批推理调度器。
+    多个请求并发提交的图像张量会先进入队列，在 max_wait_ms 时间窗口内（或凑满 max_batch_size 张）
+    合并为一个批次，只做一次前向推理，再把结果按请求拆分返回。
+    """
+
+    def __init__(self, infer_fn, max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS, name="model"):
+        """
+        :param infer_fn: 接收 (B, C, H, W) 张量并返回 (B, ...) 输出的可调用对象，通常就是模型本身。
+        :param max_batch_size: 单个批次最多包含的图像数量。
+        :param max_wait_ms: 第一张图像到达后，最多等待多少毫秒来凑批。
+        :param name: 调度器名称，用于线程命名和日志。
+        """
+        self.infer_fn = infer_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.name = name
+
+        self._queue = queue.Queue()
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, name=f"{name}-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, image_tensor) -> Future:
+        """提交一个 (N, C, H, W) 张量，返回一个 Future，其结果为对应的 (N, ...) 模型输出。"""
+        if self._closed:
+            raise RuntimeError(f"调度器 {self.name} 已关闭")
+        future = Future()
+        self._queue.put((image_tensor, future))
+        return future
+
+    def predict(self, image_tensor, timeout=None):
+        """同步接口：提交张量并等待结果，可直接替代 model(image_tensor)。"""
+        return self.submit(image_tensor).result(timeout=timeout)
+
+    def close(self):
+        """停止后台线程；已在队列中的请求仍会被处理完。"""
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+            self._worker.join()
+
+    def _collect_batch(self):
+        """阻塞等待第一个请求，然后在时间窗口内尽量凑满一个批次。"""
+        first = self._queue.get()
+        if first is None:
+            return None
+
+        batch = [first]
+        batch_size = first[0].shape[0]
+        deadline = time.perf_counter() + self.max_wait
+        while batch_size < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                # 收到关闭信号：先处理当前批次，再让下一轮退出
+                self._queue.put(None)
+                break
+            batch.append(item)
+            batch_size += item[0].shape[0]
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            if batch is None:
+                break
+
+            tensors = [tensor for tensor, _ in batch]
+            futures = [future for _, future in batch]
+            try:
+                inputs = tensors[0] if len(tensors) == 1 else torch.cat(tensors, dim=0)
+                # no_grad 是线程局部的，必须在工作线程内部开启
+                with torch.no_grad():
+                    outputs = self.infer_fn(inputs)
+            except Exception as e:
+                print(f"[{self.name}] 批量推理出错: {e}")
+                for future in futures:
+                    future.set_exception(e)
+                continue
+
+            offset = 0
+            for tensor, future in zip(tensors, futures):
+                n = tensor.shape[0]
+                future.set_result(outputs[offset:offset + n])
+                offset += n
@@ -0,0 +1,117 @@
+"""
+把叶片和害虫两个独立检查点合并为一个共享主干的多头模型检查点。
+
+两个模型是分别微调的，主干权重并不相同：合并时保留 --backbone 指定一方的主干，
+另一方只提取分类头。转换后会在测试图片上对比多头模型与原模型的预测是否一致，
+以及两种部署方式的参数内存，便于判断是否可以启用 DIAGNOSIS_MULTIHEAD=1。
+
+用法（在 Diagnosis 目录下）：
+    python -m utils.convert_multihead --backbone leaf
+"""
+import argparse
+import os
+from pathlib import Path
+
+import torch
+
+from utils.image_utils import preprocess_image
+from utils.model_definitions import MultiHeadModel, RTX3060OptimizedModel
+from utils.multihead import MULTIHEAD_MODEL_PATH
+
+LEAF_MODEL_PATH = 'leaf/models/best_model_rtx3060_stable.pth'
+PEST_MODEL_PATH = 'pests/models/best_pest_model.pth'
+MODEL_NAME = 'convnext_base_in22k'
+HEAD_CLASSES = {'leaf': 4, 'pest': 3}
+TEST_DIRS = {'leaf': 'test_photos_leaf', 'pest': 'test_photos_pests'}
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+
+
+def load_state_dict(path):
+    checkpoint = torch.load(path, map_location=torch.device('cpu'), weights_only=False)
+    return checkpoint.get('model_state_dict', checkpoint)
+
+
+def load_single_model(path, num_classes):
+    model = RTX3060OptimizedModel(MODEL_NAME, num_classes=num_classes, pretrained=False)
+    model.load_state_dict(load_state_dict(path))
+    model.eval()
+    return model
+
+
+def build_multihead(models, backbone_source):
+    """用 backbone_source 的主干和各模型的 classifier 组装多头模型。"""
+    multihead = MultiHeadModel(MODEL_NAME, HEAD_CLASSES, pretrained=False)
+    multihead.backbone.load_state_dict(models[backbone_source].backbone.state_dict())
+    for name, model in models.items():
+        multihead.heads[name].load_state_dict(model.classifier.state_dict())
+    multihead.eval()
+    return multihead
+
+
+def model_bytes(model):
+    """参数和缓冲区占用的字节数。"""
+    return sum(t.numel() * t.element_size() for t in list(model.parameters()) + list(model.buffers()))
+
+
+def compare_predictions(models, multihead):
+    """在测试图片上比较原模型与多头模型的判定结果，返回 {分类头名称: (一致数, 总数)}。"""
+    results = {}
+    for name, test_dir in TEST_DIRS.items():
+        if not os.path.isdir(test_dir):
+            continue
+        agree, total = 0, 0
+        for file_name in sorted(os.listdir(test_dir)):
+            if not file_name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            image_tensor = preprocess_image(os.path.join(test_dir, file_name))
+            with torch.no_grad():
+                original = models[name](image_tensor)
+                merged = multihead(image_tensor, heads=[name])[name]
+            if name == 'leaf':
+                # 多标签：逐类别比较 0.5 阈值判定
+                same = torch.equal(torch.sigmoid(original) > 0.5, torch.sigmoid(merged) > 0.5)
+            else:
+                same = original.argmax(dim=1).item() == merged.argmax(dim=1).item()
+            agree += int(same)
+            total += 1
+        results[name] = (agree, total)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成共享主干的叶片/害虫多头模型")
+    parser.add_argument("--leaf", default=LEAF_MODEL_PATH)
+    parser.add_argument("--pest", default=PEST_MODEL_PATH)
+    parser.add_argument("--backbone", choices=list(HEAD_CLASSES), default='leaf', help="保留哪一方的主干权重")
+    parser.add_argument("--output", default=MULTIHEAD_MODEL_PATH)
+    args = parser.parse_args()
+
+    models = {
+        'leaf': load_single_model(args.leaf, HEAD_CLASSES['leaf']),
+        'pest': load_single_model(args.pest, HEAD_CLASSES['pest']),
+    }
+    multihead = build_multihead(models, args.backbone)
+
+    Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+    torch.save({
+        'model_state_dict': multihead.state_dict(),
+        'model_name': MODEL_NAME,
+        'head_classes': HEAD_CLASSES,
+        'backbone_source': args.backbone,
+    }, args.output)
+    print(f"多头模型已保存到 {args.output}")
+
+    separate = sum(model_bytes(m) for m in models.values())
+    merged = model_bytes(multihead)
+    print(f"独立部署参数内存: {separate / 1024 ** 2:.1f} MB")
+    print(f"多头模型参数内存: {merged / 1024 ** 2:.1f} MB  (节省 {(separate - merged) / 1024 ** 2:.1f} MB, "
+          f"{1 - merged / separate:.1%})")
+
+    for name, (agree, total) in compare_predictions(models, multihead).items():
+        if total:
+            print(f"{name} 测试图片判定一致率: {agree}/{total} ({agree / total:.1%})")
+    print("提示：非主干来源一方的分类头是在另一套主干特征上训练的，一致率偏低时应先在共享主干上重新微调该分类头。")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+把叶片和害虫 RTX3060OptimizedModel 检查点导出为 TorchScript 和 ONNX，
+并在自带测试图片上校验导出模型与 eager 模型的输出是否数值一致。
+
+导出文件与检查点放在同一目录，服务端设置 DIAGNOSIS_BACKEND=onnx（或 torchscript）后即可使用。
+用法（在 Diagnosis 目录下）：
+    python -m utils.export_models --models leaf pest --formats torchscript onnx
+"""
+import argparse
+import os
+import sys
+
+import torch
+
+from utils.convert_multihead import IMAGE_EXTENSIONS, LEAF_MODEL_PATH, PEST_MODEL_PATH, load_single_model
+from utils.image_utils import preprocess_image
+from utils.inference_backends import EXPORT_SUFFIXES, exported_path, load_exported_model
+
+MODELS = {
+    # 名称: (检查点, 类别数, 测试图片目录)
+    'leaf': (LEAF_MODEL_PATH, 4, 'test_photos_leaf'),
+    'pest': (PEST_MODEL_PATH, 3, 'test_photos_pests'),
+}
+ONNX_OPSET = 17
+
+
+def export_torchscript(model, example, path):
+    with torch.no_grad():
+        traced = torch.jit.trace(model, example)
+    traced.save(path)
+
+
+def export_onnx(model, example, path):
+    torch.onnx.export(
+        model, example, path,
+        input_names=['input'], output_names=['logits'],
+        dynamic_axes={'input': {0: 'batch'}, 'logits': {0: 'batch'}},
+        opset_version=ONNX_OPSET,
+        dynamo=False,
+    )
+
+
+def load_test_batch(test_dir):
+    files = sorted(f for f in os.listdir(test_dir) if f.lower().endswith(IMAGE_EXTENSIONS))
+    return torch.cat([preprocess_image(os.path.join(test_dir, f)) for f in files], dim=0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="导出 TorchScript / ONNX 诊断模型")
+    parser.add_argument("--models", nargs='+', choices=list(MODELS), default=list(MODELS))
+    parser.add_argument("--formats", nargs='+', choices=list(EXPORT_SUFFIXES), default=list(EXPORT_SUFFIXES))
+    parser.add_argument("--atol", type=float, default=1e-3, help="与 eager 模型 logits 的最大允许绝对误差")
+    args = parser.parse_args()
+
+    exporters = {'torchscript': export_torchscript, 'onnx': export_onnx}
+    all_passed = True
+    for name in args.models:
+        checkpoint_path, num_classes, test_dir = MODELS[name]
+        model = load_single_model(checkpoint_path, num_classes)
+        example = torch.randn(1, 3, 224, 224)
+        images = load_test_batch(test_dir)
+        with torch.no_grad():
+            reference = model(images)
+
+        for backend in args.formats:
+            path = exported_path(checkpoint_path, backend)
+            exporters[backend](model, example, path)
+            exported = load_exported_model(checkpoint_path, backend)
+            with torch.no_grad():
+                outputs = exported(images)
+            max_diff = (outputs - reference).abs().max().item()
+            same_top1 = torch.equal(outputs.argmax(dim=1), reference.argmax(dim=1))
+            passed = max_diff <= args.atol and same_top1
+            all_passed = all_passed and passed
+            print(f"{name:<6}{backend:<13}-> {path}  最大误差 {max_diff:.2e}  "
+                  f"{'通过' if passed else '未通过'} ({len(images)} 张测试图片)")
+
+    if not all_passed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
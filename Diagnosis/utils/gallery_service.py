@@ -0,0 +1,155 @@
+"""
+文字专家（茎穗、根部、苗期）参考图片库的缓存索引。
+
+每个图片目录只在首次使用时扫描一次，并在 .thumbnails/ 子目录中生成缩小的 WebP 缩略图；
+之后的请求直接返回内存中的缩略图路径列表。目录内容通过 mtime 轮询检测：
+距上次检查超过 GALLERY_CHECK_INTERVAL 秒时才重新 stat 目录和图片，有变化才重新扫描并更新缩略图。
+扫描和生成缩略图都是阻塞操作，异步处理函数应通过 asyncio.to_thread 调用 images()，
+应用启动时由 warmup 在后台线程中预先建立索引。
+"""
+import os
+import threading
+import time
+
+from PIL import Image
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp', '.bmp')
+THUMBNAIL_DIR_NAME = ".thumbnails"
+# 缩略图最长边（像素）和 WebP 质量
+THUMBNAIL_SIZE = int(os.environ.get("DIAGNOSIS_THUMBNAIL_SIZE", "640"))
+THUMBNAIL_QUALITY = 85
+# 检查图片目录是否变化的最小间隔（秒）
+GALLERY_CHECK_INTERVAL = float(os.environ.get("DIAGNOSIS_GALLERY_CHECK_INTERVAL", "5"))
+# 茎穗、根部、苗期专家的参考图片目录
+REFERENCE_IMAGE_DIRS = ["stem/images", "root/images", "seedling/images"]
+
+
+def _directory_signature(image_dir):
+    """目录中所有图片的 (文件名, mtime, 大小)，任一图片新增、删除或被覆盖都会改变签名。"""
+    signature = []
+    with os.scandir(image_dir) as entries:
+        for entry in entries:
+            if entry.is_file() and entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                stat = entry.stat()
+                signature.append((entry.name, stat.st_mtime_ns, stat.st_size))
+    return tuple(sorted(signature))
+
+
+def make_thumbnail(source_path, thumbnail_path, size=THUMBNAIL_SIZE):
+    """生成最长边不超过 size 的 WebP 缩略图，若结果不比原图小则返回原图路径。"""
+    with Image.open(source_path) as image:
+        needs_resize = max(image.size) > size
+        image.thumbnail((size, size))
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+        tmp_path = thumbnail_path + ".tmp"
+        image.save(tmp_path, format="WEBP", quality=THUMBNAIL_QUALITY, method=4)
+
+    if not needs_resize and os.path.getsize(tmp_path) >= os.path.getsize(source_path):
+        os.remove(tmp_path)
+        return source_path
+    os.replace(tmp_path, thumbnail_path)
+    return thumbnail_path
+
+
+class ReferenceGallery:
+    """单个图片目录的缩略图索引。"""
+
+    def __init__(self, image_dir, thumbnail_size=THUMBNAIL_SIZE, check_interval=GALLERY_CHECK_INTERVAL):
+        self.image_dir = image_dir
+        self.thumbnail_dir = os.path.join(image_dir, THUMBNAIL_DIR_NAME)
+        self.thumbnail_size = thumbnail_size
+        self.check_interval = check_interval
+
+        self._lock = threading.Lock()
+        self._signature = None
+        self._images = []
+        self._last_check = None
+        self.scans = 0
+
+    def _thumbnail_for(self, file_name, mtime_ns):
+        source_path = os.path.join(self.image_dir, file_name)
+        # 保留原扩展名，避免 a.png 与 a.jpg 的缩略图互相覆盖
+        thumbnail_path = os.path.join(self.thumbnail_dir, file_name + ".webp")
+        if os.path.exists(thumbnail_path) and os.stat(thumbnail_path).st_mtime_ns >= mtime_ns:
+            return thumbnail_path
+        try:
+            os.makedirs(self.thumbnail_dir, exist_ok=True)
+            return make_thumbnail(source_path, thumbnail_path, self.thumbnail_size)
+        except Exception as e:
+            print(f"生成缩略图失败 {source_path}: {e}，使用原图")
+            return source_path
+
+    def _rescan(self, signature):
+        self.scans += 1
+        self._images = [self._thumbnail_for(name, mtime_ns) for name, mtime_ns, _ in signature]
+        self._signature = signature
+
+        # 清理原图已删除的缩略图
+        if os.path.isdir(self.thumbnail_dir):
+            expected = {name + ".webp" for name, _, _ in signature}
+            for file_name in os.listdir(self.thumbnail_dir):
+                if file_name not in expected:
+                    try:
+                        os.remove(os.path.join(self.thumbnail_dir, file_name))
+                    except OSError:
+                        pass
+
+    def images(self):
+        """返回用于 Gradio Gallery 的图片路径列表（缩略图优先），目录不存在时返回空列表。"""
+        with self._lock:
+            now = time.monotonic()
+            if self._last_check is not None and now - self._last_check < self.check_interval:
+                return list(self._images)
+            self._last_check = now
+
+            if not os.path.isdir(self.image_dir):
+                self._signature, self._images = None, []
+                return []
+            signature = _directory_signature(self.image_dir)
+            if signature != self._signature:
+                self._rescan(signature)
+            return list(self._images)
+
+
+_galleries = {}
+_galleries_lock = threading.Lock()
+
+
+def get_gallery(image_dir):
+    """获取（必要时创建）图片目录对应的全局 ReferenceGallery。"""
+    with _galleries_lock:
+        gallery = _galleries.get(image_dir)
+        if gallery is None:
+            gallery = _galleries[image_dir] = ReferenceGallery(image_dir)
+        return gallery
+
+
+def warmup(image_dirs=REFERENCE_IMAGE_DIRS, background=False):
+    """
+    预先扫描图片目录（默认全部参考图片目录）并生成缩略图。
+    background=True 时在守护线程中建立索引并立即返回该线程，不阻塞应用启动。
+    """
+    galleries = [get_gallery(image_dir) for image_dir in image_dirs]
+
+    def _scan_all():
+        for gallery in galleries:
+            gallery.images()
+
+    if background:
+        thread = threading.Thread(target=_scan_all, name="gallery-warmup", daemon=True)
+        thread.start()
+        return thread
+    _scan_all()
+    return None
+
+
+if __name__ == "__main__":
+    # 预先生成缩略图：python -m utils.gallery_service [图片目录...]
+    import sys
+
+    for directory in sys.argv[1:] or REFERENCE_IMAGE_DIRS:
+        paths = ReferenceGallery(directory).images()
+        print(f"{directory}: {len(paths)} 张参考图片")
+        for path in paths:
+            print(f"  {path} ({os.path.getsize(path) / 1024:.1f} KB)")
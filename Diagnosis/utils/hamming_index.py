@@ -0,0 +1,203 @@
+"""
+64 位感知哈希的汉明空间索引（multi-index hashing）。
+
+把 64 位哈希切成 max_distance + 1 段，每段各建一张精确匹配的哈希表。
+由鸽巢原理，汉明距离不超过 max_distance 的两个哈希至少有一段完全相同，
+因此只需在各段表中精确查找候选，再计算完整汉明距离确认，避免与全部条目逐一比较。
+
+MultiIndexHash 支持逐条插入/删除，用于在线缓存；radius_pairs 是同一思路的 numpy 批量版本，
+一次找出两组哈希之间所有距离不超过阈值的配对，用于数据集去重。
+"""
+import math
+from collections import defaultdict
+from itertools import combinations
+
+import numpy as np
+
+HASH_BITS = 64
+
+if hasattr(int, 'bit_count'):
+    def popcount(x):
+        return x.bit_count()
+else:  # Python < 3.10
+    def popcount(x):
+        return bin(x).count('1')
+
+
+def hash_to_int(image_hash):
+    """把 imagehash.ImageHash（或十六进制字符串）转换为整数。"""
+    return int(str(image_hash), 16)
+
+
+class MultiIndexHash:
+    """支持插入、删除和半径查询的 64 位哈希索引，查询半径不能超过 max_distance。"""
+
+    def __init__(self, max_distance=5, bits=HASH_BITS):
+        self.max_distance = max_distance
+        self.bits = bits
+        num_bands = min(max_distance + 1, bits)
+        # 把 bits 位尽量均匀地分给各段
+        widths = [bits // num_bands + (1 if i < bits % num_bands else 0) for i in range(num_bands)]
+        self._bands = []
+        offset = 0
+        for width in widths:
+            self._bands.append((offset, (1 << width) - 1))
+            offset += width
+        self._tables = [defaultdict(set) for _ in self._bands]
+        self._hashes = {}
+
+    def __len__(self):
+        return len(self._hashes)
+
+    def __contains__(self, key):
+        return key in self._hashes
+
+    def _band_values(self, value):
+        return [(value >> offset) & mask for offset, mask in self._bands]
+
+    def add(self, key, value):
+        """登记一个条目。key 为任意可哈希标识（如文件路径），value 为整数哈希。"""
+        if key in self._hashes:
+            self.remove(key)
+        self._hashes[key] = value
+        for table, band in zip(self._tables, self._band_values(value)):
+            table[band].add(key)
+
+    def remove(self, key):
+        value = self._hashes.pop(key, None)
+        if value is None:
+            return
+        for table, band in zip(self._tables, self._band_values(value)):
+            bucket = table[band]
+            bucket.discard(key)
+            if not bucket:
+                del table[band]
+
+    def get(self, key):
+        return self._hashes.get(key)
+
+    def query(self, value, max_distance=None):
+        """返回所有与 value 汉明距离不超过 max_distance 的 (key, 距离)，按距离升序。"""
+        radius = self.max_distance if max_distance is None else max_distance
+        if radius > self.max_distance:
+            raise ValueError(f"查询半径 {radius} 超过索引支持的最大距离 {self.max_distance}")
+
+        candidates = set()
+        for table, band in zip(self._tables, self._band_values(value)):
+            bucket = table.get(band)
+            if bucket:
+                candidates.update(bucket)
+
+        results = []
+        for key in candidates:
+            distance = popcount(self._hashes[key] ^ value)
+            if distance <= radius:
+                results.append((key, distance))
+        results.sort(key=lambda item: item[1])
+        return results
+
+    def nearest(self, value, max_distance=None):
+        """返回距离最近的 (key, 距离)，没有满足条件的条目时返回 None。"""
+        results = self.query(value, max_distance)
+        return results[0] if results else None
+
+
+# --- numpy 批量版本 ---
+
+if hasattr(np, 'bitwise_count'):
+    def bitwise_popcount(values):
+        """uint64 数组逐元素统计 1 的个数。"""
+        return np.bitwise_count(np.asarray(values, dtype=np.uint64))
+else:  # numpy < 2.0
+    _BYTE_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+    def bitwise_popcount(values):
+        """uint64 数组逐元素统计 1 的个数。"""
+        values = np.ascontiguousarray(values, dtype=np.uint64)
+        return _BYTE_POPCOUNT[values.view(np.uint8)].reshape(values.shape + (8,)).sum(axis=-1)
+
+
+def _band_layout(num_bands, bits=HASH_BITS):
+    widths = [bits // num_bands + (1 if i < bits % num_bands else 0) for i in range(num_bands)]
+    offsets = [sum(widths[:i]) for i in range(num_bands)]
+    return list(zip(offsets, widths))
+
+
+def _probe_masks(width, radius):
+    """段内所有汉明距离不超过 radius 的翻转掩码（含 0）。"""
+    masks = [0]
+    for k in range(1, radius + 1):
+        for positions in combinations(range(width), k):
+            masks.append(sum(1 << p for p in positions))
+    return np.array(masks, dtype=np.uint64)
+
+
+def _choose_num_bands(max_distance, num_values, bits=HASH_BITS):
+    """
+    选择分段数 m：距离不超过 r 的两个哈希至少有一段距离不超过 r // m（鸽巢原理）。
+    段越多探测掩码越少，但每段越短、候选越多；按均匀分布估算两者的开销取最小值。
+    """
+    best_m, best_cost = max_distance + 1, None
+    for m in range(1, min(max_distance + 1, bits) + 1):
+        radius = max_distance // m
+        width = bits // m
+        probes = sum(math.comb(width + 1, k) for k in range(radius + 1))
+        cost = m * probes * (math.log2(num_values + 2) + num_values / 2.0 ** width)
+        if best_cost is None or cost < best_cost:
+            best_m, best_cost = m, cost
+    return best_m
+
+
+def radius_pairs(queries, values, max_distance, num_bands=None, chunk_size=32768):
+    """
+    找出 queries 与 values 之间所有汉明距离不超过 max_distance 的配对。
+    :return: (query 下标, value 下标, 距离) 三个数组，按 (query 下标, value 下标) 升序，不含重复配对
+    """
+    queries = np.asarray(queries, dtype=np.uint64).ravel()
+    values = np.asarray(values, dtype=np.uint64).ravel()
+    empty = np.array([], dtype=np.int64)
+    if len(queries) == 0 or len(values) == 0:
+        return empty, empty, empty
+
+    num_bands = num_bands or _choose_num_bands(max_distance, len(values))
+    band_radius = max_distance // num_bands
+    bands = []
+    for offset, width in _band_layout(num_bands):
+        mask = np.uint64((1 << width) - 1)
+        band_values = (values >> np.uint64(offset)) & mask
+        order = np.argsort(band_values, kind='stable')
+        bands.append((np.uint64(offset), mask, order, band_values[order], _probe_masks(width, band_radius)))
+
+    query_parts, value_parts, distance_parts = [], [], []
+    for start in range(0, len(queries), chunk_size):
+        chunk = queries[start:start + chunk_size]
+        candidate_q, candidate_v = [], []
+        for offset, mask, order, sorted_band, probes in bands:
+            chunk_band = (chunk >> offset) & mask
+            for probe in probes:
+                target = chunk_band ^ probe
+                left = np.searchsorted(sorted_band, target, side='left')
+                counts = np.searchsorted(sorted_band, target, side='right') - left
+                total = int(counts.sum())
+                if total == 0:
+                    continue
+                q_idx = np.repeat(np.arange(len(chunk)), counts)
+                run_starts = np.cumsum(counts) - counts
+                positions = left[q_idx] + (np.arange(total) - run_starts[q_idx])
+                candidate_q.append(q_idx)
+                candidate_v.append(order[positions])
+        if not candidate_q:
+            continue
+
+        q_idx = np.concatenate(candidate_q)
+        v_idx = np.concatenate(candidate_v)
+        distances = bitwise_popcount(chunk[q_idx] ^ values[v_idx])
+        keep = distances <= max_distance
+        keys, first = np.unique((q_idx[keep] + start) * len(values) + v_idx[keep], return_index=True)
+        query_parts.append(keys // len(values))
+        value_parts.append(keys % len(values))
+        distance_parts.append(distances[keep][first].astype(np.int64))
+
+    if not query_parts:
+        return empty, empty, empty
+    return np.concatenate(query_parts), np.concatenate(value_parts), np.concatenate(distance_parts)
@@ -1,25 +1,49 @@
+import io
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
 import torch
 from torchvision import transforms
 from PIL import Image
 
+RESIZE_SIZE = 256
+CROP_SIZE = 224
+IMAGENET_MEAN = [0.485, 0.456, 0.406]
+IMAGENET_STD = [0.229, 0.224, 0.225]
+
+# 图像变换只构建一次，所有调用共享
+_PREPROCESS = transforms.Compose([
+    transforms.Resize(RESIZE_SIZE),         # 短边缩放到 256
+    transforms.CenterCrop(CROP_SIZE),       # 中心裁剪到 224x224
+    transforms.ToTensor(),                  # 转换为张量
+    transforms.Normalize(                   # 标准化
+        mean=IMAGENET_MEAN,
+        std=IMAGENET_STD
+    )
+])
+# 批量预处理只在 PIL 上做几何变换，转张量和标准化在整个批次上一次完成
+_RESIZE_CROP = transforms.Compose([
+    transforms.Resize(RESIZE_SIZE),
+    transforms.CenterCrop(CROP_SIZE),
+])
+# 把 ToTensor 的 /255 和 Normalize 合并为一次 (x - 255*mean) / (255*std)
+_MEAN_255 = torch.tensor(IMAGENET_MEAN).view(1, 3, 1, 1) * 255
+_STD_255 = torch.tensor(IMAGENET_STD).view(1, 3, 1, 1) * 255
+
+# 解码线程池按线程数缓存，避免每次调用重新创建；调度器线程和 Gradio 工作线程可能同时首次调用
+_DECODE_POOLS = {}
+_DECODE_POOLS_LOCK = threading.Lock()
+
+
 def preprocess_image(image_path):
     """
     对输入的单张图片进行预处理，使其符合PyTorch模型的输入要求。
     :param image_path: PIL Image an object or a path to an image file.
     :return: a tensor ready for the model.
     """
-    
-    # 定义图像变换
-    preprocess = transforms.Compose([
-        transforms.Resize(256),             # 调整图像大小到 256x256
-        transforms.CenterCrop(224),         # 中心裁剪到 224x224
-        transforms.ToTensor(),              # 转换为张量
-        transforms.Normalize(               # 标准化
-            mean=[0.485, 0.456, 0.406],
-            std=[0.229, 0.224, 0.225]
-        )
-    ])
-
     # 如果输入是路径，则打开图片
     if isinstance(image_path, str):
         try:
@@ -33,9 +57,63 @@ def preprocess_image(image_path):
 
 
     # 应用变换并增加一个batch维度
-    image_tensor = preprocess(image)
+    image_tensor = _PREPROCESS(image)
     return image_tensor.unsqueeze(0)  # 增加批次维度 (B, C, H, W)
 
+
+def load_image(source, draft=True):
+    """
+    把路径、原始字节或 PIL Image 解码为 RGB 图像。
+    draft=True 时对 JPEG 使用 PIL draft 模式，在解码阶段直接按 1/2、1/4、1/8 缩小，
+    只保证短边不小于 RESIZE_SIZE，后续 Resize 的结果与完整解码非常接近但不逐像素相同。
+    """
+    if isinstance(source, Image.Image):
+        return source.convert('RGB')
+    if isinstance(source, (bytes, bytearray)):
+        image = Image.open(io.BytesIO(source))
+    else:
+        image = Image.open(Path(source))
+
+    if draft and image.format == 'JPEG':
+        scale = RESIZE_SIZE / min(image.size)
+        if scale < 1:
+            image.draft('RGB', (math.ceil(image.width * scale), math.ceil(image.height * scale)))
+    return image.convert('RGB')
+
+
+def _decode_and_crop(source, draft):
+    return np.asarray(_RESIZE_CROP(load_image(source, draft)), dtype=np.uint8)
+
+
+def _get_decode_pool(num_workers):
+    with _DECODE_POOLS_LOCK:
+        if num_workers not in _DECODE_POOLS:
+            _DECODE_POOLS[num_workers] = ThreadPoolExecutor(max_workers=num_workers,
+                                                            thread_name_prefix="image-decode")
+        return _DECODE_POOLS[num_workers]
+
+
+def preprocess_batch(sources, num_workers=4, draft=True):
+    """
+    批量预处理：在线程池中并行解码（PIL 解码和缩放会释放GIL），
+    把所有图片叠成一个连续的 uint8 批次，再一次性完成转 float 和标准化。
+    :param sources: 路径、原始字节或 PIL Image 组成的列表
+    :return: (B, 3, 224, 224) 的 float32 张量
+    """
+    sources = list(sources)
+    if not sources:
+        return torch.empty((0, 3, CROP_SIZE, CROP_SIZE), dtype=torch.float32)
+    if len(sources) == 1 or num_workers <= 1:
+        arrays = [_decode_and_crop(source, draft) for source in sources]
+    else:
+        arrays = list(_get_decode_pool(num_workers).map(lambda s: _decode_and_crop(s, draft), sources))
+
+    batch = torch.from_numpy(np.stack(arrays))              # (B, H, W, C) uint8
+    # 一次拷贝完成 uint8 -> float32 和 NHWC -> NCHW 连续布局，之后原地标准化
+    batch = batch.permute(0, 3, 1, 2).to(torch.float32, memory_format=torch.contiguous_format)
+    return batch.sub_(_MEAN_255).div_(_STD_255)
+
+
 if __name__ == '__main__':
     # 一个简单的测试
     # 在models文件夹下放一张测试图片 test.jpg
@@ -0,0 +1,82 @@
+import os
+from pathlib import Path
+
+import torch
+
+# --- 推理后端 ---
+# torch: eager PyTorch（默认，需要 timm）
+# torchscript: 运行 utils/export_models.py 导出的 TorchScript 模型
+# onnx: 通过 ONNX Runtime CPU 执行导出的 ONNX 模型
+INFERENCE_BACKENDS = ('torch', 'torchscript', 'onnx')
+INFERENCE_BACKEND = os.environ.get("DIAGNOSIS_BACKEND", "torch")
+# ONNX Runtime 单个算子内部使用的线程数，0 表示由 ONNX Runtime 自动决定
+ONNX_INTRA_OP_THREADS = int(os.environ.get("DIAGNOSIS_ONNX_THREADS", "0"))
+
+EXPORT_SUFFIXES = {
+    'torchscript': '.torchscript.pt',
+    'onnx': '.onnx',
+}
+
+
+def exported_path(checkpoint_path, backend):
+    """导出文件与原检查点放在同一目录，例如 best_pest_model.pth -> best_pest_model.onnx"""
+    checkpoint_path = Path(checkpoint_path)
+    return str(checkpoint_path.with_name(checkpoint_path.stem + EXPORT_SUFFIXES[backend]))
+
+
+class OnnxRuntimeModel:
+    """
+    ONNX Runtime 推理封装，调用方式与 PyTorch 模型一致：输入 (B, C, H, W) 张量，返回 logits 张量。
+    """
+    def __init__(self, onnx_path, intra_op_threads=ONNX_INTRA_OP_THREADS):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads > 0:
+            options.intra_op_num_threads = intra_op_threads
+        self.session = ort.InferenceSession(onnx_path, sess_options=options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, image_tensor):
+        inputs = image_tensor.detach().cpu().numpy()
+        outputs = self.session.run(None, {self.input_name: inputs})[0]
+        return torch.from_numpy(outputs)
+
+
+def load_exported_model(checkpoint_path, backend=INFERENCE_BACKEND):
+    """加载 checkpoint_path 对应的导出模型（TorchScript 或 ONNX）。"""
+    if backend not in EXPORT_SUFFIXES:
+        raise ValueError(f"不支持的导出后端 {backend}，可选: {tuple(EXPORT_SUFFIXES)}")
+
+    path = exported_path(checkpoint_path, backend)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"导出模型 {path} 不存在，请先运行 python -m utils.export_models")
+
+    if backend == 'onnx':
+        return OnnxRuntimeModel(path)
+    model = torch.jit.load(path, map_location=torch.device('cpu'))
+    model.eval()
+    return model
+
+
+def served_model_path(checkpoint_path):
+    """当前配置下实际提供推理的模型文件（多头模型、导出模型或原检查点）。"""
+    from utils import multihead
+
+    if multihead.ENABLED:
+        return multihead.MULTIHEAD_MODEL_PATH
+    if INFERENCE_BACKEND in EXPORT_SUFFIXES:
+        return exported_path(checkpoint_path, INFERENCE_BACKEND)
+    return checkpoint_path
+
+
+def serving_variant():
+    """描述影响模型输出的推理配置，用于区分预测缓存。"""
+    from utils import multihead
+    from utils.model_definitions import CHANNELS_LAST, INFERENCE_PRECISION
+
+    if INFERENCE_BACKEND != 'torch':
+        return INFERENCE_BACKEND
+    variant = f"torch-{INFERENCE_PRECISION}" + ("-channels_last" if CHANNELS_LAST else "")
+    return variant + ("-multihead" if multihead.ENABLED else "")
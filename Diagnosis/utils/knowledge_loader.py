@@ -1,10 +1,18 @@
 from pathlib import Path
+import hashlib
+import json
+import os
 import re
 from typing import Dict, List, Optional
 
 # 全局变量，用于缓存加载的知识库
 _KNOWLEDGE_BASE: Dict[str, Dict] = {}
 
+# 预编译索引：保存每个 markdown 文件的解析结果及其 mtime、大小和内容哈希。
+# 解析逻辑变化时需要提升版本号，使旧索引整体失效。
+INDEX_VERSION = 1
+INDEX_FILE_NAME = ".kb_index.json"
+
 def _parse_markdown_file(file_path: Path) -> Dict:
     """解析单个markdown文件，提取结构化数据。"""
     with open(file_path, 'r', encoding='utf-8') as f:
@@ -97,8 +105,69 @@ def _parse_markdown_file(file_path: Path) -> Dict:
 
     return {disease_name: data}
 
+def _read_index(index_path: Path) -> Dict[str, Dict]:
+    """读取预编译索引，版本不符或文件损坏时返回空索引。"""
+    try:
+        with open(index_path, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if index.get('version') != INDEX_VERSION:
+        return {}
+    return index.get('files', {})
+
+
+def _write_index(index_path: Path, files: Dict[str, Dict]):
+    tmp_path = index_path.with_suffix('.tmp')
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': INDEX_VERSION, 'files': files}, f, ensure_ascii=False)
+        os.replace(tmp_path, index_path)
+    except OSError as e:
+        print(f"写入知识库索引失败（不影响使用）: {e}")
+
+
+def build_knowledge_index(path: str = "knowledge_base", force: bool = False) -> Dict[str, Dict]:
+    """
+    把知识库 markdown 编译为索引文件，返回 {文件名: 索引记录}。
+    只重新解析 mtime/大小变化且内容哈希也变化的文件，其余直接复用索引中的解析结果。
+    """
+    kb_path = Path(path)
+    index_path = kb_path / INDEX_FILE_NAME
+    old_files = {} if force else _read_index(index_path)
+
+    files = {}
+    reparsed = 0
+    for md_file in sorted(kb_path.glob("*.md")):
+        stat = md_file.stat()
+        record = old_files.get(md_file.name)
+        if record and record['mtime_ns'] == stat.st_mtime_ns and record['size'] == stat.st_size:
+            files[md_file.name] = record
+            continue
+
+        content_hash = hashlib.sha256(md_file.read_bytes()).hexdigest()
+        if record and record['sha256'] == content_hash:
+            # 内容未变（例如只是被 touch 或重新检出），只更新元数据
+            entry = record['entry']
+        else:
+            entry = _parse_markdown_file(md_file)
+            reparsed += 1
+        files[md_file.name] = {
+            'mtime_ns': stat.st_mtime_ns,
+            'size': stat.st_size,
+            'sha256': content_hash,
+            'entry': entry,
+        }
+
+    if files != old_files:
+        _write_index(index_path, files)
+    if reparsed:
+        print(f"知识库索引已更新，重新解析了 {reparsed} 个文件。")
+    return files
+
+
 def load_knowledge_base(path: str = "knowledge_base"):
-    """加载指定路径下的所有.md文件到知识库。"""
+    """加载指定路径下的所有.md文件到知识库（通过预编译索引，只解析有变化的文件）。"""
     global _KNOWLEDGE_BASE
     if _KNOWLEDGE_BASE:
         return
@@ -109,9 +178,8 @@ def load_knowledge_base(path: str = "knowledge_base"):
         return
 
     full_kb = {}
-    for md_file in kb_path.glob("*.md"):
-        parsed_data = _parse_markdown_file(md_file)
-        full_kb.update(parsed_data)
+    for record in build_knowledge_index(path).values():
+        full_kb.update(record['entry'])
     _KNOWLEDGE_BASE = full_kb
     print(f"知识库加载完成，共加载了 {len(_KNOWLEDGE_BASE)} 个条目。")
 
@@ -158,4 +226,14 @@ def debug_knowledge_base():
         for sub_type, sub_data in disease_data.get('sub_types', {}).items():
             print(f"    亚种: {sub_type}")
             for section, content in sub_data.items():
-                print(f"      {section}: {content[:30]}...") 
\ No newline at end of file
+                print(f"      {section}: {content[:30]}...")
+
+
+if __name__ == "__main__":
+    # 构建步骤：python -m utils.knowledge_loader [知识库路径] [--force]
+    import sys
+
+    args = [a for a in sys.argv[1:] if a != '--force']
+    kb_dir = args[0] if args else "knowledge_base"
+    index_files = build_knowledge_index(kb_dir, force='--force' in sys.argv)
+    print(f"已编译 {len(index_files)} 个知识库文件到 {Path(kb_dir) / INDEX_FILE_NAME}")
@@ -1,5 +1,52 @@
+import os
+
+import torch
 import torch.nn as nn
-import timm
+
+# --- CPU推理精度模式 ---
+# fp32: 默认的 fp32 eager 推理
+# bf16: 主干网络在 bfloat16 autocast 下运行（需要CPU支持 AVX512-BF16/AMX 才有明显收益）
+# int8: 对所有 Linear 层（分类头和 ConvNeXt block 中的 MLP）做 INT8 动态量化
+PRECISION_MODES = ('fp32', 'bf16', 'int8')
+INFERENCE_PRECISION = os.environ.get("DIAGNOSIS_PRECISION", "fp32")
+# 主干网络卷积使用 channels_last 内存布局
+CHANNELS_LAST = os.environ.get("DIAGNOSIS_CHANNELS_LAST", "0") == "1"
+
+
+def build_backbone(model_name, pretrained=False):
+    """创建去掉原始分类层的 timm 主干网络，返回 (backbone, 特征维度)。"""
+    # 延迟导入：使用 ONNX Runtime / TorchScript 后端推理时不需要加载 timm
+    import timm
+
+    backbone = timm.create_model(model_name, pretrained=pretrained)
+
+    # 获取特征维度
+    if hasattr(backbone, 'head'):
+        if hasattr(backbone.head, 'fc'):
+            in_features = backbone.head.fc.in_features
+            backbone.head.fc = nn.Identity()
+        else:
+            in_features = backbone.head.in_features
+            backbone.head = nn.Identity()
+    else:
+        in_features = backbone.classifier.in_features
+        backbone.classifier = nn.Identity()
+    return backbone, in_features
+
+
+def build_classifier(in_features, num_classes):
+    """多标签分类头（ConvNeXt Base版本优化）"""
+    return nn.Sequential(
+        nn.Dropout(0.5),
+        nn.Linear(in_features, in_features // 2),
+        nn.ReLU(),
+        nn.Dropout(0.3),
+        nn.Linear(in_features // 2, in_features // 4),
+        nn.ReLU(),
+        nn.Dropout(0.2),
+        nn.Linear(in_features // 4, num_classes)
+    )
+
 
 class RTX3060OptimizedModel(nn.Module):
     """针对RTX 3060优化的模型架构"""
@@ -9,32 +56,73 @@ class RTX3060OptimizedModel(nn.Module):
         注意：在推理时，pretrained应设为False，因为我们将加载已经训练好的权重。
         """
         super().__init__()
-        self.backbone = timm.create_model(model_name, pretrained=pretrained)
-        
-        # 获取特征维度
-        if hasattr(self.backbone, 'head'):
-            if hasattr(self.backbone.head, 'fc'):
-                in_features = self.backbone.head.fc.in_features
-                self.backbone.head.fc = nn.Identity()
-            else:
-                in_features = self.backbone.head.in_features
-                self.backbone.head = nn.Identity()
-        else:
-            in_features = self.backbone.classifier.in_features
-            self.backbone.classifier = nn.Identity()
-        
-        # 多标签分类头（ConvNeXt Base版本优化）
-        self.classifier = nn.Sequential(
-            nn.Dropout(0.5),
-            nn.Linear(in_features, in_features // 2),
-            nn.ReLU(),
-            nn.Dropout(0.3),
-            nn.Linear(in_features // 2, in_features // 4),
-            nn.ReLU(),
-            nn.Dropout(0.2),
-            nn.Linear(in_features // 4, num_classes)
-        )
-        
+        self.backbone, in_features = build_backbone(model_name, pretrained)
+        self.classifier = build_classifier(in_features, num_classes)
+
     def forward(self, x):
         features = self.backbone(x)
-        return self.classifier(features) 
\ No newline at end of file
+        return self.classifier(features)
+
+
+class MultiHeadModel(nn.Module):
+    """
+    共享主干的多头模型：一个 ConvNeXt 特征提取器 + 多个分类头（如叶片4类、害虫3类）。
+    每张图片只计算一次特征，再按需送入一个或多个分类头。
+    各分类头只输出 logits，sigmoid / softmax 仍由对应的专家模块负责。
+    """
+    def __init__(self, model_name='convnext_base_in22k', head_classes=None, pretrained=False):
+        """
+        :param head_classes: {分类头名称: 类别数}，例如 {'leaf': 4, 'pest': 3}
+        """
+        super().__init__()
+        self.backbone, in_features = build_backbone(model_name, pretrained)
+        self.heads = nn.ModuleDict({
+            name: build_classifier(in_features, num_classes)
+            for name, num_classes in (head_classes or {}).items()
+        })
+
+    def forward_features(self, x):
+        return self.backbone(x)
+
+    def forward_heads(self, features, heads=None):
+        """对已提取的特征运行指定的分类头，返回 {分类头名称: logits}。"""
+        names = list(self.heads.keys()) if heads is None else heads
+        return {name: self.heads[name](features) for name in names}
+
+    def forward(self, x, heads=None):
+        return self.forward_heads(self.forward_features(x), heads)
+
+
+class _BackboneRunner(nn.Module):
+    """包装主干网络：按需把输入转为 channels_last，并在 bf16 autocast 下运行，输出统一转回 fp32。"""
+    def __init__(self, backbone, bf16=False, channels_last=False):
+        super().__init__()
+        self.backbone = backbone
+        self.bf16 = bf16
+        self.channels_last = channels_last
+
+    def forward(self, x):
+        if self.channels_last:
+            x = x.contiguous(memory_format=torch.channels_last)
+        if self.bf16:
+            with torch.autocast('cpu', dtype=torch.bfloat16):
+                return self.backbone(x).float()
+        return self.backbone(x)
+
+
+def prepare_for_inference(model, precision=INFERENCE_PRECISION, channels_last=CHANNELS_LAST):
+    """
+    把已加载权重的模型转换为指定的CPU推理模式，适用于 RTX3060OptimizedModel 和 MultiHeadModel。
+    注意：必须在 load_state_dict 之后调用，转换后的模型不再用于保存检查点。
+    """
+    if precision not in PRECISION_MODES:
+        raise ValueError(f"不支持的推理精度 {precision}，可选: {PRECISION_MODES}")
+
+    model.eval()
+    if channels_last:
+        model = model.to(memory_format=torch.channels_last)
+    if precision == 'int8':
+        model = torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+    if precision == 'bf16' or channels_last:
+        model.backbone = _BackboneRunner(model.backbone, bf16=(precision == 'bf16'), channels_last=channels_last)
+    return model
@@ -0,0 +1,96 @@
+import threading
+import time
+
+# 模型状态
+NOT_LOADED = "not_loaded"
+LOADING = "loading"
+READY = "ready"
+ERROR = "error"
+
+
+class _ModelEntry:
+    def __init__(self, name, loader):
+        self.name = name
+        self.loader = loader
+        self.model = None
+        self.state = NOT_LOADED
+        self.error = None
+        self.load_seconds = None
+        self.lock = threading.Lock()
+
+
+class ModelRegistry:
+    """
+    模型注册表：各专家模块在导入时只登记加载函数，不立即加载权重。
+    模型在首次使用、后台预热线程或显式调用 warmup() 时才真正加载，并可随时查询就绪状态。
+    """
+
+    def __init__(self):
+        self._entries = {}
+
+    def register(self, name, loader):
+        """登记一个模型。loader 为无参函数，返回加载好的模型对象。"""
+        if name not in self._entries:
+            self._entries[name] = _ModelEntry(name, loader)
+
+    def get(self, name):
+        """获取模型，未加载时在当前线程同步加载（并发调用只会加载一次）。"""
+        entry = self._entries[name]
+        if entry.state == READY:
+            return entry.model
+
+        with entry.lock:
+            if entry.state == READY:
+                return entry.model
+            entry.state = LOADING
+            start = time.perf_counter()
+            try:
+                entry.model = entry.loader()
+            except Exception as e:
+                entry.state = ERROR
+                entry.error = e
+                print(f"加载模型 {name} 失败: {e}")
+                raise
+            entry.load_seconds = time.perf_counter() - start
+            entry.state = READY
+            print(f"模型 {name} 已就绪，加载耗时 {entry.load_seconds:.2f}s")
+            return entry.model
+
+    def warmup(self, names=None, background=False):
+        """
+        预先加载指定模型（默认全部）。
+        background=True 时在守护线程中加载并立即返回该线程，不阻塞应用启动。
+        """
+        names = list(self._entries) if names is None else list(names)
+
+        def _load_all():
+            for name in names:
+                try:
+                    self.get(name)
+                except Exception:
+                    pass  # 错误已记录在状态中，不影响其他模型
+
+        if background:
+            thread = threading.Thread(target=_load_all, name="model-warmup", daemon=True)
+            thread.start()
+            return thread
+        _load_all()
+        return None
+
+    def is_ready(self, name):
+        return self._entries[name].state == READY
+
+    def status(self):
+        """返回 {模型名: {'state': ..., 'load_seconds': ..., 'error': ...}}。"""
+        return {
+            name: {
+                "state": entry.state,
+                "load_seconds": entry.load_seconds,
+                "error": str(entry.error) if entry.error else None,
+            }
+            for name, entry in self._entries.items()
+        }
+
+
+# 全局注册表，所有专家模块共享
+registry = ModelRegistry()
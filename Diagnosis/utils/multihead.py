@@ -0,0 +1,42 @@
+import os
+
+import torch
+
+from utils.batch_scheduler import MicroBatchScheduler, BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS
+from utils.model_definitions import MultiHeadModel, prepare_for_inference, INFERENCE_PRECISION, CHANNELS_LAST
+from utils.model_registry import registry
+
+# --- 共享主干多头模型 ---
+# 由 utils/convert_multihead.py 从叶片/害虫两个检查点生成
+MULTIHEAD_MODEL_PATH = 'models/multihead_leaf_pest.pth'
+# 设置环境变量 DIAGNOSIS_MULTIHEAD=1 后，叶片和害虫专家共用一个主干网络，不再分别加载两个完整模型
+ENABLED = os.environ.get("DIAGNOSIS_MULTIHEAD", "0") == "1"
+
+
+def load_multihead_model(path=MULTIHEAD_MODEL_PATH, precision=INFERENCE_PRECISION, channels_last=CHANNELS_LAST):
+    """加载共享主干多头模型"""
+    checkpoint = torch.load(path, map_location=torch.device('cpu'), weights_only=False)
+    model = MultiHeadModel(checkpoint['model_name'], checkpoint['head_classes'], pretrained=False)
+    model.load_state_dict(checkpoint['model_state_dict'])
+    return prepare_for_inference(model, precision, channels_last)
+
+
+feature_scheduler = None
+if ENABLED:
+    registry.register("multihead", load_multihead_model)
+    # 叶片和害虫请求共用同一个特征提取批次，混合负载下每张图片只经过一次主干网络
+    feature_scheduler = MicroBatchScheduler(lambda inputs: registry.get("multihead").forward_features(inputs),
+                                            max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS,
+                                            name="multihead")
+
+
+def predict(image_tensor, heads):
+    """
+    提取一次特征，再运行指定的分类头。
+    :param heads: 分类头名称列表，如 ['leaf']、['pest'] 或 ['leaf', 'pest']
+    :return: {分类头名称: logits}
+    """
+    features = feature_scheduler.predict(image_tensor)
+    model = registry.get("multihead")
+    with torch.no_grad():
+        return model.forward_heads(features, heads)
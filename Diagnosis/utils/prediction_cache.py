@@ -0,0 +1,222 @@
+import hashlib
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+# 内存缓存条目数，0 表示关闭缓存
+CACHE_SIZE = int(os.environ.get("DIAGNOSIS_CACHE_SIZE", "1024"))
+# 可选的磁盘缓存目录，未设置时只使用内存缓存
+CACHE_DIR = os.environ.get("DIAGNOSIS_CACHE_DIR")
+DISK_CACHE_SIZE = int(os.environ.get("DIAGNOSIS_DISK_CACHE_SIZE", "100000"))
+# 尚未检查过模型文件
+_NOT_CHECKED = object()
+
+
+def image_key(image_bytes):
+    """图片内容哈希，作为缓存键。"""
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+class PredictionCache:
+    """
+    按图片内容寻址的预测结果缓存：键为图片字节的 SHA-256，值为模型输出的概率向量。
+    缓存按模型文件指纹（路径、大小、修改时间以及推理配置）分区，
+    模型文件被替换或重新导出后，旧的缓存结果会自动失效。
+
+    查找锁只保护内存 LRU、指纹和计数器；磁盘读写都在锁外进行，
+    慢速磁盘或淘汰旧文件不会阻塞其他请求的内存命中。
+    磁盘条目按写入顺序记录在内存中，超出上限时直接删除最旧的文件，不再遍历目录。
+    """
+
+    def __init__(self, name, model_path, variant="", max_entries=CACHE_SIZE,
+                 disk_dir=CACHE_DIR, max_disk_entries=DISK_CACHE_SIZE):
+        """
+        :param name: 缓存名称（如 'leaf'、'pest'），也用作磁盘缓存子目录名。
+        :param model_path: 实际提供推理的模型文件，其变化会使缓存失效。
+        :param variant: 影响输出的推理配置（后端、精度等），不同配置互不共享缓存。
+        """
+        self.name = name
+        self.model_path = model_path
+        self.variant = variant
+        self.max_entries = max_entries
+        self.disk_dir = Path(disk_dir) / name if disk_dir else None
+        self.max_disk_entries = max_disk_entries
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._model_stat = _NOT_CHECKED
+        self._fingerprint = None
+        # 磁盘分区的条目（按写入顺序），只由写入方在 _disk_lock 下维护，查找不需要这把锁
+        self._disk_lock = threading.Lock()
+        self._disk_partition = None
+        self._disk_entries = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def _stat_model(self):
+        try:
+            stat = os.stat(self.model_path)
+            return stat.st_size, stat.st_mtime_ns
+        except OSError:
+            # 模型文件缺失也是一种状态，同样得到一个指纹分区
+            return "missing"
+
+    def _current_fingerprint(self, model_stat):
+        """
+        模型文件状态变化时清空内存缓存并切换到新的指纹分区（需持有 _lock）。
+        :return: (当前指纹, 是否刚切换)
+        """
+        if model_stat == self._model_stat:
+            return self._fingerprint, False
+        if self._fingerprint is not None:
+            self.invalidations += 1
+            print(f"[{self.name}] 模型文件 {self.model_path} 已变化，预测缓存失效")
+        self._entries.clear()
+        self._model_stat = model_stat
+        source = f"{os.path.abspath(self.model_path)}|{model_stat}|{self.variant}"
+        self._fingerprint = hashlib.sha256(source.encode('utf-8')).hexdigest()[:16]
+        return self._fingerprint, True
+
+    def _check_fingerprint(self):
+        """在锁外检查模型文件，锁内只比较并切换指纹；旧的磁盘分区同样在锁外清理。"""
+        model_stat = self._stat_model()
+        with self._lock:
+            fingerprint, changed = self._current_fingerprint(model_stat)
+        if changed:
+            self._drop_stale_disk_partitions(fingerprint)
+        return fingerprint
+
+    def fingerprint(self):
+        """当前模型文件指纹，其他缓存（如相似图片缓存）据此判断是否需要失效。"""
+        return self._check_fingerprint()
+
+    def _drop_stale_disk_partitions(self, fingerprint):
+        if self.disk_dir is None or not self.disk_dir.exists():
+            return
+        for partition in self.disk_dir.iterdir():
+            if partition.is_dir() and partition.name != fingerprint:
+                shutil.rmtree(partition, ignore_errors=True)
+
+    def _disk_path(self, fingerprint, key):
+        return self.disk_dir / fingerprint / f"{key}.npy"
+
+    def get(self, image_bytes):
+        """返回缓存的概率向量（numpy 数组），未命中时返回 None。"""
+        if not self.enabled:
+            return None
+        key = image_key(image_bytes)
+        fingerprint = self._check_fingerprint()
+        with self._lock:
+            probabilities = self._entries.get(key)
+            if probabilities is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return probabilities
+            if self.disk_dir is None:
+                self.misses += 1
+                return None
+
+        try:
+            probabilities = np.load(self._disk_path(fingerprint, key))
+        except (OSError, ValueError):
+            probabilities = None
+
+        with self._lock:
+            if probabilities is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            # 读取期间模型文件可能已变化，旧分区的结果不再放入内存缓存
+            if fingerprint == self._fingerprint:
+                self._remember(key, probabilities)
+            return probabilities
+
+    def put(self, image_bytes, probabilities):
+        """写入一次预测结果。"""
+        if not self.enabled:
+            return
+        key = image_key(image_bytes)
+        probabilities = np.asarray(probabilities, dtype=np.float32)
+        fingerprint = self._check_fingerprint()
+        with self._lock:
+            self._remember(key, probabilities)
+        if self.disk_dir is not None:
+            self._write_disk(fingerprint, key, probabilities)
+
+    def _remember(self, key, probabilities):
+        self._entries[key] = probabilities
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _write_disk(self, fingerprint, key, probabilities):
+        path = self._disk_path(fingerprint, key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # 临时文件名带线程号，并发写入同一张图片时互不覆盖
+            tmp_path = path.with_name(f"{key}.{threading.get_ident()}.tmp")
+            with open(tmp_path, 'wb') as f:
+                np.save(f, probabilities)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"[{self.name}] 写入磁盘缓存失败: {e}")
+            return
+
+        with self._disk_lock:
+            if fingerprint != self._fingerprint:
+                return
+            if self._disk_partition != fingerprint:
+                self._index_disk_partition(fingerprint)
+            self._disk_entries[key] = None
+            self._disk_entries.move_to_end(key)
+            evicted = []
+            while len(self._disk_entries) > self.max_disk_entries:
+                evicted.append(self._disk_entries.popitem(last=False)[0])
+        for old_key in evicted:
+            try:
+                self._disk_path(fingerprint, old_key).unlink()
+            except OSError:
+                pass
+
+    def _index_disk_partition(self, fingerprint):
+        """首次写入某个分区时按修改时间登记已有文件（每个进程每个分区只扫描一次，需持有 _disk_lock）。"""
+        files = []
+        for path in (self.disk_dir / fingerprint).glob("*.npy"):
+            try:
+                files.append((path.stat().st_mtime, path.stem))
+            except OSError:
+                pass
+        files.sort()
+        self._disk_partition = fingerprint
+        self._disk_entries = OrderedDict((key, None) for _, key in files)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.disk_dir is not None:
+            with self._disk_lock:
+                shutil.rmtree(self.disk_dir, ignore_errors=True)
+                self._disk_partition = None
+                self._disk_entries = OrderedDict()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                "invalidations": self.invalidations,
+            }
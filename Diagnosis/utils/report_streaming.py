@@ -0,0 +1,23 @@
+import asyncio
+import re
+
+# 按段落（空行）切分报告，每段作为一次流式更新发送给前端
+_PARAGRAPH_END = re.compile(r'(?<=\n\n)')
+
+
+def iter_report_chunks(response: str):
+    """把 Markdown 报告切分为段落，保留段落间的空行，拼接后与原文完全相同。"""
+    return [chunk for chunk in _PARAGRAPH_END.split(response) if chunk]
+
+
+async def stream_report(history: list, response: str):
+    """
+    以助手消息的形式把报告逐段追加到对话历史，每追加一段产出一次 history，
+    配合 Gradio 的（异步）生成器处理函数，让报告渐进显示，而不是阻塞等待后一次性返回。
+    """
+    history.append({"role": "assistant", "content": ""})
+    for chunk in iter_report_chunks(response):
+        history[-1]["content"] += chunk
+        yield history
+        # 让出事件循环，使每段更新能及时发送，同时不占用 Gradio 工作线程
+        await asyncio.sleep(0)
@@ -0,0 +1,82 @@
+import os
+import threading
+from collections import OrderedDict
+
+import imagehash
+
+from utils.hamming_index import MultiIndexHash, hash_to_int
+from utils.image_utils import load_image
+
+# 设置 DIAGNOSIS_SIMILAR_CACHE=1 启用相似图片缓存（默认关闭）
+SIMILAR_CACHE_ENABLED = os.environ.get("DIAGNOSIS_SIMILAR_CACHE", "0") == "1"
+# 感知哈希允许的最大汉明距离（64 位 phash），与 data_clean 去重脚本的量级一致
+SIMILAR_MAX_DISTANCE = int(os.environ.get("DIAGNOSIS_SIMILAR_DISTANCE", "4"))
+SIMILAR_CACHE_SIZE = int(os.environ.get("DIAGNOSIS_SIMILAR_CACHE_SIZE", "100000"))
+HASH_SIZE = 8
+# 相似图片缓存命中时附加在诊断报告末尾的标记
+SIMILAR_CACHE_NOTE = "\n\n> ♻️ *cached-similar*：该图片与此前诊断过的一张图片高度相似，本次直接复用了其诊断结果。"
+
+
+def image_phash(source):
+    """计算图片的 64 位 phash 整数，与 leaf/data_clean 中 imagehash.phash(hash_size=8) 的做法一致。"""
+    image = load_image(source, draft=True).convert("L")
+    return hash_to_int(imagehash.phash(image, hash_size=HASH_SIZE))
+
+
+class SimilarImageCache:
+    """
+    近重复图片的二级缓存：同一片叶子重复拍摄、或被微信重新压缩后上传时，
+    图片字节不同但感知哈希非常接近，可直接复用之前的预测结果。
+    """
+
+    def __init__(self, name, fingerprint_fn, max_distance=SIMILAR_MAX_DISTANCE, max_entries=SIMILAR_CACHE_SIZE):
+        """
+        :param fingerprint_fn: 返回当前模型指纹的函数（通常是 PredictionCache.fingerprint），指纹变化时清空缓存。
+        """
+        self.name = name
+        self.fingerprint_fn = fingerprint_fn
+        self.max_distance = max_distance
+        self.max_entries = max_entries
+
+        self._index = MultiIndexHash(max_distance)
+        self._probabilities = OrderedDict()
+        self._lock = threading.Lock()
+        self._fingerprint = None
+        self._next_id = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _check_fingerprint(self):
+        fingerprint = self.fingerprint_fn()
+        if fingerprint != self._fingerprint:
+            self._index = MultiIndexHash(self.max_distance)
+            self._probabilities.clear()
+            self._fingerprint = fingerprint
+
+    def lookup(self, phash):
+        """查找相似图片，命中时返回 (概率向量, 汉明距离)，否则返回 None。"""
+        with self._lock:
+            self._check_fingerprint()
+            match = self._index.nearest(phash)
+            if match is None:
+                self.misses += 1
+                return None
+            entry_id, distance = match
+            self._probabilities.move_to_end(entry_id)
+            self.hits += 1
+            return self._probabilities[entry_id], distance
+
+    def add(self, phash, probabilities):
+        with self._lock:
+            self._check_fingerprint()
+            entry_id = self._next_id
+            self._next_id += 1
+            self._index.add(entry_id, phash)
+            self._probabilities[entry_id] = probabilities
+            while len(self._probabilities) > self.max_entries:
+                oldest_id, _ = self._probabilities.popitem(last=False)
+                self._index.remove(oldest_id)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._probabilities), "hits": self.hits, "misses": self.misses}
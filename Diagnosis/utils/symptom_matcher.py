@@ -0,0 +1,129 @@
+"""
+文字症状专家共用的关键词匹配引擎。
+
+各专家把关键词表登记到全局 symptom_matcher（表名、类别、关键词、权重），
+首次匹配时把所有表编译成一个 Aho-Corasick 自动机，之后每次分析只需扫描一遍输入文本，
+即可得到全部命中的关键词及其类别和权重，不再对每个关键词单独做子串查找。
+"""
+import threading
+from collections import deque, namedtuple
+
+KeywordMatch = namedtuple('KeywordMatch', ['table', 'category', 'keyword', 'weight'])
+
+
+class AhoCorasick:
+    """多模式串匹配自动机，每个模式串可以挂多个负载（payload）。"""
+
+    def __init__(self):
+        self._goto = [{}]
+        self._fail = [0]
+        self._outputs = [[]]
+        self._built = True
+
+    def add(self, pattern, payload):
+        node = 0
+        for ch in pattern:
+            next_node = self._goto[node].get(ch)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][ch] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._outputs.append([])
+            node = next_node
+        self._outputs[node].append(payload)
+        self._built = False
+
+    def build(self):
+        """按广度优先计算失配指针，并把失配链上的输出合并到每个节点。"""
+        queue = deque(self._goto[0].values())
+        for node in queue:
+            self._fail[node] = 0
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(ch, 0)
+                self._outputs[child] = self._outputs[child] + self._outputs[self._fail[child]]
+                queue.append(child)
+        self._built = True
+
+    def iter_matches(self, text):
+        """扫描一遍 text，依次产出 (结束位置, 负载)。"""
+        if not self._built:
+            self.build()
+        goto, fail, outputs = self._goto, self._fail, self._outputs
+        node = 0
+        for position, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for payload in outputs[node]:
+                yield position, payload
+
+
+class MatchResult:
+    """一次匹配的结果，命中项按关键词登记顺序排列（与原先逐个关键词判断的顺序一致）。"""
+
+    def __init__(self, matches):
+        self.matches = matches
+
+    def __bool__(self):
+        return bool(self.matches)
+
+    def has(self, category):
+        return any(m.category == category for m in self.matches)
+
+    def categories(self):
+        """按首次命中顺序返回去重后的类别列表。"""
+        return list(dict.fromkeys(m.category for m in self.matches))
+
+    def keywords(self, category=None):
+        return [m.keyword for m in self.matches if category is None or m.category == category]
+
+    def score(self, category=None):
+        return sum(m.weight for m in self.matches if category is None or m.category == category)
+
+
+class SymptomMatcher:
+    """登记多个关键词表并编译为同一个自动机。同一关键词可在多个类别或表中重复登记，各自计分。"""
+
+    def __init__(self):
+        self._entries = []
+        self._automaton = None
+        self._lock = threading.Lock()
+
+    def add_keywords(self, table, category, keywords, weight=1):
+        with self._lock:
+            for keyword in keywords:
+                self._entries.append(KeywordMatch(table, category, keyword.lower(), weight))
+            self._automaton = None
+
+    def compile(self):
+        """构建自动机；匹配时会自动调用，也可在启动阶段显式调用。"""
+        with self._lock:
+            if self._automaton is None:
+                automaton = AhoCorasick()
+                for entry_id, entry in enumerate(self._entries):
+                    automaton.add(entry.keyword, entry_id)
+                automaton.build()
+                self._automaton = automaton
+            return self._automaton
+
+    def match(self, text, tables=None):
+        """
+        在 text（会转为小写）中查找所有登记的关键词。
+        :param tables: 只返回这些表的命中项，None 表示全部。
+        """
+        automaton = self._automaton or self.compile()
+        entries = self._entries
+        hit_ids = {entry_id for _, entry_id in automaton.iter_matches(text.lower())}
+        matches = [entries[i] for i in sorted(hit_ids)
+                   if tables is None or entries[i].table in tables]
+        return MatchResult(matches)
+
+
+# 全局匹配引擎，茎穗、根部、苗期专家在导入时登记各自的关键词表
+symptom_matcher = SymptomMatcher()
@@ -11,6 +11,7 @@ import { Label } from "@/components/ui/label"
 import { Alert, AlertDescription } from "@/components/ui/alert"
 import { Loader2 } from "lucide-react"
 import Link from "next/link"
+import { saveSession } from "@/lib/auth"
 
 export default function LoginPage() {
   const [username, setUsername] = useState("")
@@ -47,8 +48,8 @@ export default function LoginPage() {
       const data = await response.json()
 
       if (response.ok) {
-        // 登录成功，保存用户名到localStorage
-        localStorage.setItem("username", username.trim())
+        // 登录成功，保存用户名和会话令牌到localStorage
+        saveSession(username.trim(), data.token)
         router.push("/")
       } else {
         setError(data.message || "登录失败")
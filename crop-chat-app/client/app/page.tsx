@@ -13,6 +13,8 @@ import { ImageUpload } from "@/components/image-upload"
 import { AuthGuard } from "@/components/auth-guard"
 import { UserMenu } from "@/components/user-menu"
 import { DragDropZone } from "@/components/drag-drop-zone"
+import { uploadImages } from "@/lib/upload"
+import { authFetch } from "@/lib/auth"
 
 interface Message {
   role: "user" | "assistant"
@@ -46,8 +48,12 @@ export default function ChatbotPage() {
   const [showSidebar, setShowSidebar] = useState(true)
   const [uploadedFiles, setUploadedFiles] = useState<UploadedFile[]>([])
   const [username, setUsername] = useState<string>("")
+  const [historyCursor, setHistoryCursor] = useState<string | null>(null)
+  const [isLoadingHistory, setIsLoadingHistory] = useState(false)
   const messagesEndRef = useRef<HTMLDivElement>(null)
   const abortControllerRef = useRef<AbortController | null>(null)
+  // 加载更早的历史消息时保持当前滚动位置，不跳到底部
+  const skipScrollRef = useRef(false)
 
   const API_BASE_URL = process.env.NEXT_PUBLIC_API_BASE_URL || "http://localhost:8080"
 
@@ -56,6 +62,10 @@ export default function ChatbotPage() {
   }
 
   useEffect(() => {
+    if (skipScrollRef.current) {
+      skipScrollRef.current = false
+      return
+    }
     scrollToBottom()
   }, [messages])
 
@@ -78,7 +88,7 @@ export default function ChatbotPage() {
 
   const loadConversations = async () => {
     try {
-      const response = await fetch(`${API_BASE_URL}/api/conversations/list/${username}`)
+      const response = await authFetch(`${API_BASE_URL}/api/conversations/list/${username}`)
       const data = await response.json()
       setConversations(data.conversations || [])
     } catch (error) {
@@ -86,49 +96,63 @@ export default function ChatbotPage() {
     }
   }
 
-  const loadConversation = async (conversationId: string) => {
-    try {
-      const response = await fetch(`${API_BASE_URL}/api/conversations/${conversationId}/history?username=${username}`)
-      const data = await response.json()
-
-      // 将后端返回的数据转换为前端的 Message 格式
-      const historyMessages: Message[] = []
-
-      if (Array.isArray(data)) {
-        data.forEach((item) => {
-          // 添加用户消息
-          if (item.query) {
-            // 提取用户消息中的图片URLs
-            const userImages: string[] = []
-            if (item.message_files && Array.isArray(item.message_files)) {
-              item.message_files.forEach((file: any) => {
-                if (file.type === "image" && file.url && file.belongs_to === "user") {
-                  userImages.push(file.url)
-                }
-              })
-            }
+  // 历史消息按页加载：每页 HISTORY_PAGE_SIZE 条，before 为上一页返回的 next_cursor
+  const HISTORY_PAGE_SIZE = 20
 
-            historyMessages.push({
-              role: "user",
-              content: item.query,
-              timestamp: item.created_at,
-              images: userImages.length > 0 ? userImages : undefined,
+  const fetchHistoryPage = async (conversationId: string, before?: string | null) => {
+    const params = new URLSearchParams({ username, limit: String(HISTORY_PAGE_SIZE) })
+    if (before) {
+      params.set("before", before)
+    }
+    const response = await authFetch(`${API_BASE_URL}/api/conversations/${conversationId}/history?${params}`)
+    const data = await response.json()
+
+    // 将后端返回的数据转换为前端的 Message 格式
+    const historyMessages: Message[] = []
+
+    if (Array.isArray(data.data)) {
+      data.data.forEach((item: any) => {
+        // 添加用户消息
+        if (item.query) {
+          // 提取用户消息中的图片URLs
+          const userImages: string[] = []
+          if (item.message_files && Array.isArray(item.message_files)) {
+            item.message_files.forEach((file: any) => {
+              if (file.type === "image" && file.url && file.belongs_to === "user") {
+                userImages.push(file.url)
+              }
             })
           }
 
-          // 添加AI回复
-          if (item.answer) {
-            historyMessages.push({
-              role: "assistant",
-              content: item.answer,
-              timestamp: item.created_at,
-              messageId: item.id, // 添加消息ID
-            })
-          }
-        })
-      }
+          historyMessages.push({
+            role: "user",
+            content: item.query,
+            timestamp: item.created_at,
+            images: userImages.length > 0 ? userImages : undefined,
+          })
+        }
+
+        // 添加AI回复
+        if (item.answer) {
+          historyMessages.push({
+            role: "assistant",
+            content: item.answer,
+            timestamp: item.created_at,
+            messageId: item.id, // 添加消息ID
+          })
+        }
+      })
+    }
+
+    return { historyMessages, nextCursor: (data.next_cursor as string | null) || null }
+  }
+
+  const loadConversation = async (conversationId: string) => {
+    try {
+      const { historyMessages, nextCursor } = await fetchHistoryPage(conversationId)
 
       setMessages(historyMessages)
+      setHistoryCursor(nextCursor)
       setCurrentConversationId(conversationId)
 
       // 从对话列表中找到对话名称
@@ -139,14 +163,31 @@ export default function ChatbotPage() {
     }
   }
 
+  const loadOlderMessages = async () => {
+    if (!currentConversationId || !historyCursor || isLoadingHistory) return
+
+    setIsLoadingHistory(true)
+    try {
+      const { historyMessages, nextCursor } = await fetchHistoryPage(currentConversationId, historyCursor)
+      skipScrollRef.current = true
+      setMessages((prev) => [...historyMessages, ...prev])
+      setHistoryCursor(nextCursor)
+    } catch (error) {
+      console.error("Failed to load older messages:", error)
+    } finally {
+      setIsLoadingHistory(false)
+    }
+  }
+
   const deleteConversation = async (conversationId: string) => {
     try {
-      await fetch(`${API_BASE_URL}/api/conversations/${conversationId}/delete?username=${username}`, {
+      await authFetch(`${API_BASE_URL}/api/conversations/${conversationId}/delete?username=${username}`, {
         method: "DELETE",
       })
       setConversations((prev) => prev.filter((conv) => conv.id !== conversationId))
       if (currentConversationId === conversationId) {
         setMessages([])
+        setHistoryCursor(null)
         setCurrentConversationId(null)
         setCurrentConversationName("")
       }
@@ -157,6 +198,7 @@ export default function ChatbotPage() {
 
   const startNewConversation = () => {
     setMessages([])
+    setHistoryCursor(null)
     setCurrentConversationId(null)
     setCurrentConversationName("")
     setUploadedFiles([])
@@ -177,26 +219,9 @@ export default function ChatbotPage() {
     if (files.length === 0) return
 
     try {
-      // 创建FormData并上传文件
-      const formData = new FormData()
-      files.forEach((file) => {
-        formData.append("files", file)
-      })
-      formData.append("username", username)
-      const response = await fetch(`${API_BASE_URL}/api/file/upload`, {
-        method: "POST",
-        body: formData,
-      })
-
-      if (!response.ok) {
-        throw new Error(`Upload failed: ${response.status}`)
-      }
-
-      const result = await response.json()
-      const fileIds = result.file_ids || []
-
-      // 调用现有的文件上传处理函数
-      handleFileUpload(files, fileIds)
+      // 压缩后上传，大文件分块续传
+      const { files: uploadedFiles, fileIds } = await uploadImages(files, username)
+      handleFileUpload(uploadedFiles, fileIds)
     } catch (error) {
       console.error("Drag drop upload error:", error)
       // 上传失败时传递空的fileIds数组
@@ -258,7 +283,7 @@ export default function ChatbotPage() {
         username: username, // 添加用户名字段
       }
 
-      const response = await fetch(`${API_BASE_URL}/api/chat`, {
+      const response = await authFetch(`${API_BASE_URL}/api/chat`, {
         method: "POST",
         headers: {
           "Content-Type": "application/json",
@@ -353,7 +378,7 @@ export default function ChatbotPage() {
         // 如果是新对话，可能需要更新当前对话信息
         if (!currentConversationId) {
           // 重新获取对话列表，找到新创建的对话
-          const updatedResponse = await fetch(`${API_BASE_URL}/api/conversations/list/${username}`)
+          const updatedResponse = await authFetch(`${API_BASE_URL}/api/conversations/list/${username}`)
           const updatedData = await updatedResponse.json()
           const updatedConversations = updatedData.conversations || []
 
@@ -490,6 +515,19 @@ export default function ChatbotPage() {
             {/* 消息区域 */}
             <ScrollArea className="flex-1 p-4">
               <div className="max-w-4xl mx-auto space-y-4">
+                {historyCursor && messages.length > 0 && (
+                  <div className="text-center">
+                    <Button
+                      variant="ghost"
+                      size="sm"
+                      onClick={loadOlderMessages}
+                      disabled={isLoadingHistory}
+                      className="text-gray-500 hover:bg-gray-100 active:scale-95 transition-all duration-150"
+                    >
+                      {isLoadingHistory ? "加载中..." : "加载更早的消息"}
+                    </Button>
+                  </div>
+                )}
                 {messages.length === 0 ? (
                   <div className="text-center text-gray-500 mt-20">
                     <div className="w-16 h-16 mx-auto mb-4 rounded-full overflow-hidden bg-gradient-to-br from-yellow-100 to-green-100 p-2">
@@ -4,6 +4,7 @@ import type React from "react"
 import { useRef, useState } from "react"
 import { Button } from "@/components/ui/button"
 import { ImageIcon, Loader2 } from "lucide-react"
+import { uploadImages } from "@/lib/upload"
 
 interface ImageUploadProps {
   onUpload: (files: File[], fileIds: string[]) => void
@@ -14,8 +15,6 @@ export function ImageUpload({ onUpload, disabled = false }: ImageUploadProps) {
   const fileInputRef = useRef<HTMLInputElement>(null)
   const [isUploading, setIsUploading] = useState(false)
 
-  const API_BASE_URL = process.env.NEXT_PUBLIC_API_BASE_URL || "http://localhost:8080"
-
   const handleFileChange = async (event: React.ChangeEvent<HTMLInputElement>) => {
     const files = Array.from(event.target.files || [])
     const imageFiles = files.filter((file) => file.type.startsWith("image/"))
@@ -25,26 +24,9 @@ export function ImageUpload({ onUpload, disabled = false }: ImageUploadProps) {
     setIsUploading(true)
 
     try {
-      // 创建FormData并上传文件
-      const formData = new FormData()
-      imageFiles.forEach((file) => {
-        formData.append("files", file)
-      })
-      formData.append("username", username)
-      const response = await fetch(`${API_BASE_URL}/api/file/upload`, {
-        method: "POST",
-        body: formData,
-      })
-
-      if (!response.ok) {
-        throw new Error(`Upload failed: ${response.status}`)
-      }
-
-      const result = await response.json()
-      const fileIds = result.file_ids || []
-
-      // 调用onUpload回调，传递files和fileIds
-      onUpload(imageFiles, fileIds)
+      // 压缩后上传，大文件分块续传；回调中传递压缩后的文件用于预览
+      const { files: uploadedFiles, fileIds } = await uploadImages(imageFiles, username)
+      onUpload(uploadedFiles, fileIds)
     } catch (error) {
       console.error("File upload error:", error)
       // 上传失败时传递空的fileIds数组
@@ -4,6 +4,7 @@ import { useState, useEffect } from "react"
 import { Button } from "@/components/ui/button"
 import { Card } from "@/components/ui/card"
 import { Lightbulb, Loader2 } from "lucide-react"
+import { authFetch } from "@/lib/auth"
 
 interface SuggestedQuestionsProps {
     messageId: string
@@ -38,7 +39,7 @@ export function SuggestedQuestions({
         setHasData(false)
 
         try {
-            const response = await fetch(`${API_BASE_URL}/api/chat/next_suggest/${messageId}?username=${username}`)
+            const response = await authFetch(`${API_BASE_URL}/api/chat/next_suggest/${messageId}?username=${username}`)
 
             if (!response.ok) {
                 throw new Error(`HTTP error! status: ${response.status}`)
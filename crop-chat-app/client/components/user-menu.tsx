@@ -13,6 +13,7 @@ import {
 } from "@/components/ui/dropdown-menu"
 import { Avatar, AvatarFallback } from "@/components/ui/avatar"
 import { LogOut } from "lucide-react"
+import { clearSession } from "@/lib/auth"
 
 export function UserMenu() {
   const [username, setUsername] = useState<string | null>(null)
@@ -24,7 +25,7 @@ export function UserMenu() {
   }, [])
 
   const handleLogout = () => {
-    localStorage.removeItem("username")
+    clearSession()
     router.push("/auth/login")
   }
 
@@ -0,0 +1,30 @@
+// 登录后服务端返回的会话令牌保存在 localStorage 中，调用接口时通过 Authorization 头携带
+
+const TOKEN_KEY = "sessionToken"
+
+export function saveSession(username: string, token?: string) {
+  localStorage.setItem("username", username)
+  if (token) {
+    localStorage.setItem(TOKEN_KEY, token)
+  }
+}
+
+export function clearSession() {
+  localStorage.removeItem("username")
+  localStorage.removeItem(TOKEN_KEY)
+}
+
+// 与 fetch 相同，自动带上会话令牌；令牌无效或过期（401）时清除登录状态并跳转到登录页
+export async function authFetch(input: string, init: RequestInit = {}): Promise<Response> {
+  const token = localStorage.getItem(TOKEN_KEY)
+  const headers = new Headers(init.headers)
+  if (token) {
+    headers.set("Authorization", `Bearer ${token}`)
+  }
+  const response = await fetch(input, { ...init, headers })
+  if (response.status === 401) {
+    clearSession()
+    window.location.href = "/auth/login"
+  }
+  return response
+}
@@ -0,0 +1,37 @@
+// 在 Web Worker 中缩小并重新编码照片，解码和压缩大图时不阻塞页面主线程
+
+interface CompressRequest {
+  id: number
+  file: File
+  maxEdge: number
+  quality: number
+}
+
+self.onmessage = async (event: MessageEvent<CompressRequest>) => {
+  const { id, file, maxEdge, quality } = event.data
+  try {
+    // 按 EXIF 方向解码，压缩后的 JPEG 不再带方向信息
+    const bitmap = await createImageBitmap(file, { imageOrientation: "from-image" })
+    const scale = Math.min(1, maxEdge / Math.max(bitmap.width, bitmap.height))
+    const width = Math.round(bitmap.width * scale)
+    const height = Math.round(bitmap.height * scale)
+
+    const canvas = new OffscreenCanvas(width, height)
+    const context = canvas.getContext("2d")
+    if (!context) throw new Error("OffscreenCanvas 2d context unavailable")
+    // PNG 等透明背景转 JPEG 时填白色，否则透明处会变黑
+    context.fillStyle = "#fff"
+    context.fillRect(0, 0, width, height)
+    context.imageSmoothingQuality = "high"
+    context.drawImage(bitmap, 0, 0, width, height)
+    bitmap.close()
+
+    const blob = await canvas.convertToBlob({ type: "image/jpeg", quality })
+    postMessage({ id, blob })
+  } catch (error) {
+    // 无法解码的格式（如部分浏览器的 HEIC）原样上传
+    postMessage({ id, blob: null })
+  }
+}
+
+export {}
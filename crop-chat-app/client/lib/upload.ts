@@ -0,0 +1,186 @@
+// 图片上传：先在 Web Worker 中把照片缩小到最长边 UPLOAD_MAX_EDGE，
+// 小文件一次性上传，大文件分块上传，弱网下连接中断后从断点继续，不从头重传
+
+import { authFetch } from "@/lib/auth"
+
+const API_BASE_URL = process.env.NEXT_PUBLIC_API_BASE_URL || "http://localhost:8080"
+// 最长边像素，0 表示不压缩
+const UPLOAD_MAX_EDGE = Number(process.env.NEXT_PUBLIC_UPLOAD_MAX_EDGE || 1600)
+const UPLOAD_JPEG_QUALITY = Number(process.env.NEXT_PUBLIC_UPLOAD_JPEG_QUALITY || 0.85)
+// 压缩后超过这个大小的文件走分块上传
+const UPLOAD_CHUNKED_MIN_BYTES = Number(process.env.NEXT_PUBLIC_UPLOAD_CHUNKED_MIN_BYTES || 512 * 1024)
+// 单个分块连续失败的最大重试次数
+const UPLOAD_MAX_RETRIES = 8
+
+interface ChunkedUploadStatus {
+  upload_id: string
+  size: number
+  received: number
+  chunk_size: number
+  file_id: string | null
+}
+
+class UploadRequestError extends Error {
+  constructor(
+    message: string,
+    public retryable: boolean,
+  ) {
+    super(message)
+  }
+}
+
+let worker: Worker | null = null
+let nextRequestId = 0
+const pendingCompressions = new Map<number, (blob: Blob | null) => void>()
+
+function getWorker(): Worker | null {
+  if (typeof Worker === "undefined" || typeof OffscreenCanvas === "undefined") return null
+  if (!worker) {
+    worker = new Worker(new URL("./image-compress.worker.ts", import.meta.url))
+    worker.onmessage = (event: MessageEvent<{ id: number; blob: Blob | null }>) => {
+      pendingCompressions.get(event.data.id)?.(event.data.blob)
+      pendingCompressions.delete(event.data.id)
+    }
+    worker.onerror = () => {
+      // Worker 本身出错时所有待压缩的文件都原样上传
+      pendingCompressions.forEach((resolve) => resolve(null))
+      pendingCompressions.clear()
+      worker?.terminate()
+      worker = null
+    }
+  }
+  return worker
+}
+
+// 缩小照片并编码为 JPEG；不支持的浏览器、无法解码或压缩后反而更大时返回原文件
+export async function compressImage(file: File): Promise<File> {
+  if (UPLOAD_MAX_EDGE <= 0 || !file.type.startsWith("image/") || file.type === "image/gif") return file
+  const compressWorker = getWorker()
+  if (!compressWorker) return file
+
+  const blob = await new Promise<Blob | null>((resolve) => {
+    const id = nextRequestId++
+    pendingCompressions.set(id, resolve)
+    compressWorker.postMessage({ id, file, maxEdge: UPLOAD_MAX_EDGE, quality: UPLOAD_JPEG_QUALITY })
+  })
+  if (!blob || blob.size >= file.size) return file
+  return new File([blob], file.name.replace(/\.[^.]*$/, "") + ".jpg", {
+    type: "image/jpeg",
+    lastModified: file.lastModified,
+  })
+}
+
+const sleep = (ms: number) => new Promise((resolve) => setTimeout(resolve, ms))
+
+async function requestJson(url: string, init?: RequestInit): Promise<any> {
+  let response: Response
+  try {
+    response = await authFetch(url, init)
+  } catch (error) {
+    // 网络中断、超时
+    throw new UploadRequestError(String(error), true)
+  }
+  const result = await response.json().catch(() => ({}))
+  if (!response.ok) {
+    const error = new UploadRequestError(result.error || `Upload failed: ${response.status}`, response.status >= 500)
+    Object.assign(error, { status: response.status, received: result.received })
+    throw error
+  }
+  return result
+}
+
+// 一次性上传多个小文件，返回与 files 顺序一致的文件 ID
+async function uploadDirect(files: File[], username: string): Promise<string[]> {
+  const formData = new FormData()
+  files.forEach((file) => {
+    formData.append("files", file)
+  })
+  formData.append("username", username)
+  const result = await requestJson(`${API_BASE_URL}/api/file/upload`, { method: "POST", body: formData })
+  return result.file_ids || []
+}
+
+async function createChunkedUpload(file: File, username: string): Promise<ChunkedUploadStatus> {
+  const formData = new FormData()
+  formData.append("username", username)
+  formData.append("filename", file.name)
+  formData.append("size", String(file.size))
+  formData.append("content_type", file.type)
+  return requestJson(`${API_BASE_URL}/api/file/upload/chunked`, { method: "POST", body: formData })
+}
+
+// 分块上传一个文件，返回文件 ID。upload_id 记在 localStorage 中，页面刷新后重新选择同一文件也能续传
+async function uploadChunked(file: File, username: string): Promise<string> {
+  const resumeKey = `upload:${username}:${file.name}:${file.size}:${file.lastModified}`
+  const chunkedUrl = (uploadId: string) => `${API_BASE_URL}/api/file/upload/chunked/${uploadId}`
+
+  let status: ChunkedUploadStatus | null = null
+  const savedUploadId = localStorage.getItem(resumeKey)
+  if (savedUploadId) {
+    status = await requestJson(`${chunkedUrl(savedUploadId)}?username=${encodeURIComponent(username)}`).catch(
+      () => null,
+    )
+  }
+  if (!status || status.size !== file.size) {
+    status = await createChunkedUpload(file, username)
+    localStorage.setItem(resumeKey, status.upload_id)
+  }
+
+  let failures = 0
+  while (!status.file_id) {
+    const offset: number = status.received
+    try {
+      status = (await requestJson(
+        `${chunkedUrl(status.upload_id)}?username=${encodeURIComponent(username)}&offset=${offset}`,
+        { method: "PUT", body: file.slice(offset, offset + status.chunk_size) },
+      )) as ChunkedUploadStatus
+      failures = 0
+    } catch (error: any) {
+      if (error.status === 409 && typeof error.received === "number") {
+        // 上一次请求其实已写入（响应丢失），从服务端记录的位置继续
+        status = { ...status, received: error.received }
+        continue
+      }
+      if (!(error instanceof UploadRequestError) || !error.retryable || ++failures > UPLOAD_MAX_RETRIES) {
+        throw error
+      }
+      await sleep(Math.min(1000 * 2 ** failures, 15000))
+    }
+  }
+  localStorage.removeItem(resumeKey)
+  return status.file_id as string
+}
+
+// 压缩并上传图片，返回压缩后的文件（用于预览）和与之顺序一致的文件 ID，上传失败的文件 ID 为空字符串
+export async function uploadImages(files: File[], username: string): Promise<{ files: File[]; fileIds: string[] }> {
+  const compressed = await Promise.all(files.map(compressImage))
+  const fileIds: string[] = compressed.map(() => "")
+
+  const indexed = compressed.map((file, index) => ({ file, index }))
+  const small = indexed.filter(({ file }) => file.size < UPLOAD_CHUNKED_MIN_BYTES)
+  const large = indexed.filter(({ file }) => file.size >= UPLOAD_CHUNKED_MIN_BYTES)
+
+  const uploadSmall = async () => {
+    if (small.length === 0) return
+    try {
+      const ids = await uploadDirect(small.map(({ file }) => file), username)
+      small.forEach(({ index }, position) => {
+        fileIds[index] = ids[position] || ""
+      })
+    } catch (error) {
+      console.error("File upload error:", error)
+    }
+  }
+  // 弱网下带宽有限，大文件逐个上传，不互相争抢
+  const uploadLarge = async () => {
+    for (const { file, index } of large) {
+      try {
+        fileIds[index] = await uploadChunked(file, username)
+      } catch (error) {
+        console.error("Chunked upload error:", error)
+      }
+    }
+  }
+  await Promise.all([uploadSmall(), uploadLarge()])
+  return { files: compressed, fileIds }
+}
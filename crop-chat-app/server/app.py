@@ -4,6 +4,9 @@ from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from user_control_interface import user_control_router
 from chat_interface import chat_interface_router
+from dify_client import dify
+from db_config import engine, create_tables
+from contextlib import asynccontextmanager
 from datetime import datetime
 import os, uvicorn, logging
 
@@ -12,7 +15,15 @@ logger = logging.getLogger(__name__)
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 static_dir = os.path.join(BASE_DIR, "static", "out")
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await create_tables()
+    yield
+    # 关闭与 Dify 的 keep-alive 连接池和数据库连接池
+    await dify.aclose()
+    await engine.dispose()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
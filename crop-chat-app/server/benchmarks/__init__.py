@@ -0,0 +1 @@
+# 性能基准测试脚本，在 server 目录下通过 python -m benchmarks.<脚本名> 运行，上游 Dify 由 benchmarks.mock_dify 模拟。
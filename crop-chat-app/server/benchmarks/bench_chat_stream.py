@@ -0,0 +1,167 @@
+"""
+流式聊天代理基准测试：对比原先的同步 Dify 调用（requests + 同步生成器，阻塞请求放在 async def 中）
+与 AsyncDifyClient 的并发流容量，并在压测期间持续探测 /health 的延迟，观察事件循环是否被阻塞。
+
+用法（在 server 目录下）：
+    python -m benchmarks.bench_chat_stream --streams 50 200 --suggests 100
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+import numpy as np
+import requests
+import uvicorn
+
+from benchmarks.mock_dify import free_port, run_mock_dify, start_process
+
+
+def run_chat_server(port, dify_url, max_connections=200):
+    """只挂载聊天路由的服务，另加原先同步实现的 /legacy 路由作为对照。"""
+    os.environ["DIFY_BASE_URL"] = dify_url
+    os.environ["DIFY_MAX_CONNECTIONS"] = str(max_connections)
+    os.environ.setdefault("DIFY_API_KEY", "app-benchmark")
+    from fastapi import FastAPI, Query, Request
+    from fastapi.responses import JSONResponse, StreamingResponse
+    from chat_interface import chat_interface_router
+
+    app = FastAPI()
+    app.include_router(chat_interface_router)
+    headers = {"Authorization": f"Bearer {os.environ['DIFY_API_KEY']}"}
+
+    @app.get("/health")
+    async def health():
+        return {"status": "healthy"}
+
+    @app.post("/legacy/api/chat")
+    async def legacy_chat(request: Request):
+        data = await request.json()
+
+        def generate():
+            resp = requests.post(f"{dify_url}/chat-messages", headers=headers, stream=True, json={
+                "query": data["message"], "user": data["username"], "inputs": {}, "files": [],
+                "conversation_id": "", "response_mode": "streaming"})
+            message_id = ""
+            for line in resp.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                event = json.loads(line[5:])
+                if event.get("event") == "message":
+                    message_id = event.get("message_id")
+                    yield event.get("answer")
+                elif event.get("event") == "message_end":
+                    yield f"[MESSAGE_ID:{message_id}]"
+
+        return StreamingResponse(generate(), media_type="text/plain; charset=utf-8")
+
+    @app.get("/legacy/api/chat/next_suggest/{message_id}")
+    async def legacy_suggest(message_id: str, username: str = Query(...)):
+        response = requests.get(f"{dify_url}/messages/{message_id}/suggested", headers=headers,
+                                params={"user": username})
+        return JSONResponse(content=response.json().get("data", []))
+
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
+
+
+async def http_request(port, method, path, payload=None):
+    """
+    用原始 socket 发送一个 HTTP/1.1 请求（Connection: close），返回 (首个响应体字节的耗时, 总耗时, 响应体原文)。
+    压测端不使用 httpx 等完整客户端，避免单核机器上压测端自身的 CPU 开销掩盖服务端的差异。
+    """
+    start = time.perf_counter()
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    body = json.dumps(payload).encode() if payload is not None else b""
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n"
+                 f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+    await writer.drain()
+    response, first_chunk = b"", None
+    while data := await reader.read(65536):
+        response += data
+        if first_chunk is None and b"\r\n\r\n" in response and not response.endswith(b"\r\n\r\n"):
+            first_chunk = time.perf_counter() - start
+    writer.close()
+    status = response[:response.find(b"\r\n")].decode()
+    if " 200 " not in status:
+        raise RuntimeError(f"{path}: {status}")
+    return first_chunk, time.perf_counter() - start, response.partition(b"\r\n\r\n")[2].decode(errors="replace")
+
+
+async def probe_health(port, stop, latencies, interval=0.05):
+    while not stop.is_set():
+        _, elapsed, _ = await http_request(port, "GET", "/health")
+        latencies.append(elapsed * 1000)
+        await asyncio.sleep(interval)
+
+
+async def one_stream(port, path, index):
+    first_chunk, elapsed, body = await http_request(port, "POST", path,
+                                                    {"message": "玉米叶片有黄色斑点", "username": f"user{index}"})
+    if "[MESSAGE_ID:" not in body:
+        raise RuntimeError(f"流式回答不完整: {body[-80:]}")
+    return first_chunk, elapsed
+
+
+async def one_suggest(port, path, index):
+    _, elapsed, _ = await http_request(port, "GET", f"{path}/msg-{index}?username=user{index}")
+    return 0.0, elapsed
+
+
+async def run_load(port, path, count, request):
+    # 预热：加载路由、建立上游连接池，不计入结果
+    await asyncio.gather(*(request(port, path, index) for index in range(min(count, 20))))
+    stop, health_ms = asyncio.Event(), []
+    prober = asyncio.create_task(probe_health(port, stop, health_ms))
+    start = time.perf_counter()
+    results = await asyncio.gather(*(request(port, path, index) for index in range(count)))
+    wall = time.perf_counter() - start
+    stop.set()
+    await prober
+    first_chunks = np.array([first for first, _ in results]) * 1000
+    return wall, first_chunks, np.array(health_ms)
+
+
+def report(name, count, wall, first_chunks, health_ms, streaming=True):
+    line = f"  {name:8s} {count:4d} 个并发: 总耗时 {wall:6.2f} s"
+    if streaming:
+        line += f"，首字 p50 {np.percentile(first_chunks, 50):7.1f} ms / p99 {np.percentile(first_chunks, 99):7.1f} ms"
+    line += f"，/health p99 {np.percentile(health_ms, 99):7.1f} ms（最大 {health_ms.max():7.1f} ms）"
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="流式聊天代理基准测试")
+    parser.add_argument("--streams", type=int, nargs="+", default=[50, 200], help="并发流数量")
+    parser.add_argument("--suggests", type=int, default=100, help="并发问题建议请求数量")
+    parser.add_argument("--chunk-count", type=int, default=20)
+    parser.add_argument("--chunk-delay", type=float, default=0.05)
+    parser.add_argument("--request-delay", type=float, default=0.1)
+    parser.add_argument("--max-connections", type=int, default=200, help="聊天服务到 Dify 的连接池上限")
+    args = parser.parse_args()
+
+    dify_port, chat_port = free_port(), free_port()
+    dify_url = f"http://127.0.0.1:{dify_port}/v1"
+    processes = [
+        start_process(run_mock_dify, dify_port, chunk_count=args.chunk_count, chunk_delay=args.chunk_delay,
+                      request_delay=args.request_delay),
+        start_process(run_chat_server, chat_port, dify_url, args.max_connections),
+    ]
+    ideal = args.chunk_count * args.chunk_delay
+    try:
+        print(f"每个回答 {args.chunk_count} 个片段，间隔 {args.chunk_delay * 1000:.0f} ms（单个流理想耗时 {ideal:.2f} s）")
+        for count in args.streams:
+            for name, path in [("同步", "/legacy/api/chat"), ("异步", "/api/chat")]:
+                report(name, count, *asyncio.run(run_load(chat_port, path, count, one_stream)))
+
+        print(f"\n问题建议接口（上游延迟 {args.request_delay * 1000:.0f} ms）")
+        for name, path in [("同步", "/legacy/api/chat/next_suggest"), ("异步", "/api/chat/next_suggest")]:
+            report(name, args.suggests, *asyncio.run(run_load(chat_port, path, args.suggests, one_suggest)),
+                   streaming=False)
+    finally:
+        for process in processes:
+            process.terminate()
+
+
+if __name__ == "__main__":
+    main()
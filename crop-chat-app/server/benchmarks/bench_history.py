@@ -0,0 +1,135 @@
+"""
+会话历史加载基准测试：对比原先逐页同步拉取整个会话（每页 20 条、列表前插）与 HistoryService
+（每次上游取 100 条、deque 缓存、按游标分页返回）打开会话、向上翻页和并发打开同一会话的耗时与上游请求数。
+
+用法（在 server 目录下）：
+    python -m benchmarks.bench_history --history-size 400 --request-delay 0.05
+"""
+import argparse
+import asyncio
+import os
+import time
+from collections import deque
+
+import requests
+
+from benchmarks.mock_dify import free_port, run_mock_dify, start_process
+
+
+def legacy_load_all_history(dify_url, conversation_id, username, page_limit=20):
+    """原先 get_chat_history 中的实现"""
+    all_msgs = []
+    first_id = None
+    while True:
+        params = {"conversation_id": conversation_id, "user": username, "limit": page_limit}
+        if first_id:
+            params["first_id"] = first_id
+        resp = requests.get(f"{dify_url}/messages", headers={"Authorization": "Bearer app-benchmark"}, params=params)
+        resp.raise_for_status()
+        data = resp.json()
+        messages_data, has_more = data["data"], data.get("has_more", False)
+        if not messages_data:
+            break
+        all_msgs = messages_data + all_msgs
+        if not has_more:
+            break
+        first_id = messages_data[0]["id"]
+    return all_msgs
+
+
+def upstream_pages(dify_url):
+    return requests.get(f"{dify_url}/_stats").json()["messages_pages"]
+
+
+def measure(dify_url, name, func):
+    pages = upstream_pages(dify_url)
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    print(f"  {name:28s} {elapsed * 1000:8.1f} ms，上游请求 {upstream_pages(dify_url) - pages:3d} 次")
+    return result
+
+
+def bench_prepend(total, page_size=20):
+    """只比较合并分页结果的开销：列表前插 O(n²) 与 deque.extendleft O(n)"""
+    pages = [[{"id": index} for index in range(start, min(start + page_size, total))]
+             for start in range(0, total, page_size)][::-1]
+    start = time.perf_counter()
+    all_msgs = []
+    for page in pages:
+        all_msgs = page + all_msgs
+    list_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    messages = deque()
+    for page in pages:
+        messages.extendleft(reversed(page))
+    deque_ms = (time.perf_counter() - start) * 1000
+    assert list(messages) == all_msgs
+    print(f"  合并 {total:6d} 条: 列表前插 {list_ms:8.2f} ms，deque {deque_ms:6.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="会话历史加载基准测试")
+    parser.add_argument("--history-size", type=int, default=400, help="会话消息条数")
+    parser.add_argument("--request-delay", type=float, default=0.05, help="模拟 Dify 每次请求的延迟（秒）")
+    parser.add_argument("--concurrency", type=int, default=20, help="并发打开同一会话的请求数")
+    args = parser.parse_args()
+
+    dify_port = free_port()
+    dify_url = f"http://127.0.0.1:{dify_port}/v1"
+    process = start_process(run_mock_dify, dify_port, request_delay=args.request_delay,
+                            history_size=args.history_size)
+    os.environ["DIFY_BASE_URL"] = dify_url
+    from dify_client import AsyncDifyClient
+    from history_service import HistoryService
+
+    async def run(expected_ids):
+        client = AsyncDifyClient(api_key="app-benchmark", base_url=dify_url)
+        service = HistoryService(client)
+        user, conversation = "user", "conv-bench"
+        await client.get_conversations(user)  # 预热：建立连接
+
+        async def timed(name, coroutine):
+            pages = upstream_pages(dify_url)
+            start = time.perf_counter()
+            result = await coroutine
+            elapsed = time.perf_counter() - start
+            print(f"  {name:28s} {elapsed * 1000:8.1f} ms，上游请求 {upstream_pages(dify_url) - pages:3d} 次")
+            return result
+
+        first = await timed("打开会话（首页，冷缓存）", service.page(conversation, user))
+        await timed("打开会话（首页，命中缓存）", service.page(conversation, user))
+
+        async def scroll_to_first(cursor):
+            loaded = [message["id"] for message in first["data"]]
+            while cursor:
+                page = await service.page(conversation, user, before=cursor)
+                loaded = [message["id"] for message in page["data"]] + loaded
+                cursor = page["next_cursor"]
+            return loaded
+
+        loaded = await timed("向上翻到第一条（每页 20 条）", scroll_to_first(first["next_cursor"]))
+        if loaded != expected_ids:
+            raise SystemExit("分页结果与原实现不一致")
+
+        service.invalidate(conversation, user)
+        await timed(f"{args.concurrency} 个并发打开（冷缓存）",
+                    asyncio.gather(*(service.page(conversation, user) for _ in range(args.concurrency))))
+        await client.aclose()
+
+    try:
+        print(f"会话共 {args.history_size} 条消息，模拟 Dify 延迟 {args.request_delay * 1000:.0f} ms")
+        print("原实现（每次拉取整个会话）:")
+        legacy = measure(dify_url, "打开会话", lambda: legacy_load_all_history(dify_url, "conv-bench", "user"))
+        assert len(legacy) == args.history_size
+        print("HistoryService:")
+        asyncio.run(run([message["id"] for message in legacy]))
+        print("合并分页结果:")
+        for total in (400, 4000, 40000):
+            bench_prepend(total)
+    finally:
+        process.terminate()
+
+
+if __name__ == "__main__":
+    main()
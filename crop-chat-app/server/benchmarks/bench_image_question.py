@@ -0,0 +1,158 @@
+"""
+图片提问基准测试：模拟农村弱网（上行带宽受限、上传中途断线一次），对比带一张手机照片提问时
+原样上传、浏览器压缩后上传、分块续传的请求体字节数和从选图到收到第一个回答片段的时间（首字时间）。
+
+浏览器端压缩在 Web Worker 中用 OffscreenCanvas 完成，这里用 Pillow 按相同参数（最长边、JPEG 质量）模拟。
+
+用法（在 server 目录下）：
+    python -m benchmarks.bench_image_question --bandwidth-kbps 4000 --drop-at 0.5
+"""
+import argparse
+import io
+import os
+import tempfile
+import time
+
+import requests
+from PIL import Image
+from urllib3 import encode_multipart_formdata
+
+from benchmarks.bench_upload import make_photos, run_upload_server
+from benchmarks.mock_dify import free_port, run_mock_dify, start_process
+
+
+class LinkDropped(Exception):
+    pass
+
+
+class Link:
+    """限速的上行链路：统计发出的请求体字节数，累计发送到 drop_at 字节时断开一次连接"""
+
+    def __init__(self, bandwidth_kbps, drop_at=None, piece=16 * 1024):
+        self.rate = bandwidth_kbps * 1000 / 8
+        self.drop_at = drop_at
+        self.piece = piece
+        self.sent = 0
+        self.drops = 0
+
+    def body(self, data):
+        start = time.perf_counter()
+        for offset in range(0, len(data), self.piece):
+            piece = data[offset:offset + self.piece]
+            if self.drop_at is not None and self.sent + len(piece) > self.drop_at:
+                self.drop_at = None
+                self.drops += 1
+                raise LinkDropped()
+            self.sent += len(piece)
+            delay = (offset + len(piece)) / self.rate - (time.perf_counter() - start)
+            if delay > 0:
+                time.sleep(delay)
+            yield piece
+
+    def post(self, url, data, content_type, method="POST"):
+        return requests.request(method, url, data=self.body(data), headers={"Content-Type": content_type})
+
+
+def compress(data, max_edge, quality):
+    """与前端 Web Worker 相同：缩小到最长边 max_edge，编码为 JPEG"""
+    with Image.open(io.BytesIO(data)) as img:
+        scale = max_edge / max(img.size)
+        img.draft("RGB", (int(img.width * scale), int(img.height * scale)))
+        img.thumbnail((max_edge, max_edge), Image.LANCZOS)
+        output = io.BytesIO()
+        img.convert("RGB").save(output, "JPEG", quality=int(quality * 100))
+    return output.getvalue()
+
+
+def upload_direct(link, base_url, path, name, data):
+    """一次性 multipart 上传，断线后整个文件重传"""
+    while True:
+        body, content_type = encode_multipart_formdata([("files", (name, data, "image/jpeg")), ("username", "bench")])
+        try:
+            response = link.post(f"{base_url}{path}", body, content_type)
+        except (LinkDropped, requests.ConnectionError):
+            continue
+        response.raise_for_status()
+        return response.json()["file_ids"][0]
+
+
+def upload_chunked(link, base_url, name, data):
+    """分块续传：断线后查询已收到的字节数，从断点继续"""
+    fields = {"username": "bench", "filename": name, "size": str(len(data)), "content_type": "image/jpeg"}
+    body, content_type = encode_multipart_formdata(fields)
+    status = link.post(f"{base_url}/api/file/upload/chunked", body, content_type).json()
+    url = f"{base_url}/api/file/upload/chunked/{status['upload_id']}"
+    while not status["file_id"]:
+        offset = status["received"]
+        try:
+            response = link.post(f"{url}?username=bench&offset={offset}", data[offset:offset + status["chunk_size"]],
+                                 "application/octet-stream", method="PUT")
+        except (LinkDropped, requests.ConnectionError):
+            status = requests.get(url, params={"username": "bench"}).json()
+            continue
+        response.raise_for_status()
+        status = response.json()
+    return status["file_id"]
+
+
+def first_token_seconds(base_url, file_id):
+    """发送图片提问，返回收到第一个回答片段的耗时"""
+    start = time.perf_counter()
+    payload = {"message": "这片叶子得了什么病？", "username": "bench", "file_ids": [file_id]}
+    with requests.post(f"{base_url}/api/chat", json=payload, stream=True) as response:
+        response.raise_for_status()
+        for chunk in response.iter_content(chunk_size=None):
+            if chunk:
+                elapsed = time.perf_counter() - start
+                break
+        for _ in response.iter_content(chunk_size=None):
+            pass
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="弱网下图片提问的上传字节数和首字时间")
+    parser.add_argument("--bandwidth-kbps", type=float, default=4000, help="上行带宽（kbit/s）")
+    parser.add_argument("--drop-at", type=float, default=0.5, help="文件上传到这个比例时断线一次，负数表示不断线")
+    parser.add_argument("--size", type=int, nargs=2, default=[4000, 3000], metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--max-edge", type=int, default=1600, help="前端压缩的最长边（NEXT_PUBLIC_UPLOAD_MAX_EDGE）")
+    parser.add_argument("--quality", type=float, default=0.85, help="前端压缩的 JPEG 质量")
+    args = parser.parse_args()
+
+    dify_port, port = free_port(), free_port()
+    dify_url = f"http://127.0.0.1:{dify_port}/v1"
+    base_url = f"http://127.0.0.1:{port}"
+    mock = start_process(run_mock_dify, dify_port, request_delay=0.3, chunk_delay=0.05)
+    # 服务端不再缩小，只比较前端的处理
+    server = start_process(run_upload_server, port, dify_url, {"UPLOAD_MAX_EDGE": "0"})
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            path = make_photos(directory, 1, args.size)[0]
+            with open(path, "rb") as f:
+                original = f.read()
+        name = os.path.basename(path)
+        print(f"照片 {args.size[0]}x{args.size[1]} {len(original) / 1e6:.1f} MB，上行 {args.bandwidth_kbps:.0f} kbit/s，"
+              + (f"上传到 {args.drop_at:.0%} 时断线一次" if args.drop_at >= 0 else "不断线"))
+
+        modes = [
+            ("原样上传（原实现）", False, lambda link, data: upload_direct(link, base_url, "/legacy/api/file/upload", name, data)),
+            ("原图分块续传", False, lambda link, data: upload_chunked(link, base_url, name, data)),
+            ("浏览器压缩 + 一次性上传", True, lambda link, data: upload_direct(link, base_url, "/api/file/upload", name, data)),
+            ("浏览器压缩 + 分块续传", True, lambda link, data: upload_chunked(link, base_url, name, data)),
+        ]
+        for label, compressed, upload in modes:
+            start = time.perf_counter()
+            data = compress(original, args.max_edge, args.quality) if compressed else original
+            link = Link(args.bandwidth_kbps, int(len(data) * args.drop_at) if args.drop_at >= 0 else None)
+            file_id = upload(link, data)
+            upload_seconds = time.perf_counter() - start
+            ttft = first_token_seconds(base_url, file_id)
+            print(f"  {label:16s} 文件 {len(data) / 1e6:5.2f} MB，发送 {link.sent / 1e6:5.2f} MB（断线 {link.drops} 次），"
+                  f"上传 {upload_seconds:6.2f} s，首字时间 {upload_seconds + ttft:6.2f} s")
+    finally:
+        server.terminate()
+        mock.terminate()
+
+
+if __name__ == "__main__":
+    main()
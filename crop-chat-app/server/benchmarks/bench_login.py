@@ -0,0 +1,193 @@
+"""
+登录压测：在一批流式聊天进行中的同时发起一波并发登录，对比原先在 async def 中直接同步校验密码
+与在有界线程池中校验的登录延迟、聊天流的最大卡顿（相邻两个片段的间隔）和 /health 延迟；
+另外比较会话令牌校验与按用户名查询数据库的耗时。
+
+用户表使用 SQLite（DATABASE_URL），密码哈希与线上相同（werkzeug 默认的 scrypt）。
+并发登录超过 15 个（SQLAlchemy 默认连接池 5 + 溢出 10）时，原实现在事件循环中等待连接、连接又要等事件循环归还，
+会卡住直到连接池超时（30 秒）。
+
+用法（在 server 目录下）：
+    python -m benchmarks.bench_login --streams 50 --logins 12
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import numpy as np
+import uvicorn
+
+from benchmarks.bench_chat_stream import http_request, probe_health
+from benchmarks.mock_dify import free_port, run_mock_dify, start_process
+
+
+def create_users(database_url, count, password):
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session
+    from werkzeug.security import generate_password_hash
+    from models import Base, Users
+
+    engine = create_engine(database_url)
+    Base.metadata.create_all(bind=engine)
+    hashed = generate_password_hash(password)
+    with Session(engine) as db:
+        db.add_all(Users(username=f"user{index}", password=hashed) for index in range(count))
+        db.commit()
+    engine.dispose()
+
+
+def legacy_get_db(database_url):
+    """原先 db_config 中的同步会话依赖"""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=create_engine(database_url, pool_pre_ping=True))
+
+    def get_db():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+    return get_db
+
+
+def run_login_server(port, dify_url, database_url):
+    os.environ["DIFY_BASE_URL"] = dify_url
+    os.environ["DATABASE_URL"] = database_url
+    os.environ.setdefault("DIFY_API_KEY", "app-benchmark")
+    from fastapi import Depends, FastAPI, HTTPException, Request
+    from fastapi.responses import JSONResponse
+    from sqlalchemy.orm import Session
+    from werkzeug.security import check_password_hash
+    from chat_interface import chat_interface_router
+    from models import Users
+    from user_control_interface import user_control_router
+
+    get_db = legacy_get_db(database_url)
+    app = FastAPI()
+    app.include_router(user_control_router)
+    app.include_router(chat_interface_router)
+
+    @app.get("/health")
+    async def health():
+        return {"status": "healthy"}
+
+    @app.post("/legacy/api/user/login")
+    async def legacy_login(request: Request, db: Session = Depends(get_db)):
+        """原先的实现"""
+        data = await request.json()
+        user = db.query(Users).filter_by(username=data.get("username")).first()
+        if user and check_password_hash(user.password, data.get("password")):
+            return JSONResponse(content={"message": "登录成功"}, status_code=200)
+        raise HTTPException(status_code=401, detail="密码错误")
+
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
+
+
+async def stream_gaps(port, index, started):
+    """发起一个流式回答，收到第一段数据时设置 started，返回相邻两次收到数据的最大间隔（毫秒）"""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    body = f'{{"message": "玉米叶片有黄色斑点", "username": "user{index}"}}'.encode()
+    writer.write(f"POST /api/chat HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n"
+                 f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+    await writer.drain()
+    arrivals, response = [], b""
+    while data := await reader.read(65536):
+        arrivals.append(time.perf_counter())
+        response += data
+        started.set()
+    writer.close()
+    if b"[MESSAGE_ID:" not in response:
+        raise RuntimeError("流式回答不完整")
+    return max(np.diff(arrivals[1:]), default=0.0) * 1000
+
+
+async def run_mixed(port, login_path, streams, logins, password):
+    # 所有聊天流都开始输出后再发起登录
+    started = [asyncio.Event() for _ in range(streams)]
+    streaming = [asyncio.create_task(stream_gaps(port, index, started[index])) for index in range(streams)]
+    await asyncio.gather(*(event.wait() for event in started))
+    await asyncio.sleep(0.2)
+    stop, health_ms = asyncio.Event(), []
+    prober = asyncio.create_task(probe_health(port, stop, health_ms))
+
+    async def login(index):
+        try:
+            _, elapsed, _ = await http_request(port, "POST", login_path,
+                                               {"username": f"user{index}", "password": password})
+        except RuntimeError:
+            return np.nan
+        return elapsed * 1000
+
+    start = time.perf_counter()
+    login_ms = np.array(await asyncio.gather(*(login(index) for index in range(logins))))
+    wall = time.perf_counter() - start
+    stop.set()
+    await prober
+    gaps = np.array(await asyncio.gather(*streaming))
+    return wall, login_ms, gaps, np.array(health_ms)
+
+
+def bench_verify(database_url, iterations=5000):
+    """令牌校验（缓存命中 / 未命中）与按用户名查询用户表的单次耗时"""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session
+    from models import Users
+    from session_service import SessionTokens
+
+    tokens = SessionTokens(secret="benchmark", cache_size=iterations)
+    issued = [tokens.issue(f"user{index}") for index in range(iterations)]
+    start = time.perf_counter()
+    for token in issued:
+        tokens.verify(token)
+    miss_us = (time.perf_counter() - start) / iterations * 1e6
+    start = time.perf_counter()
+    for token in issued:
+        tokens.verify(token)
+    hit_us = (time.perf_counter() - start) / iterations * 1e6
+    with Session(create_engine(database_url)) as db:
+        start = time.perf_counter()
+        for index in range(1000):
+            db.query(Users).filter_by(username=f"user{index % 20}").first()
+        query_us = (time.perf_counter() - start) / 1000 * 1e6
+    print(f"  令牌校验 {miss_us:6.1f} µs（首次） / {hit_us:5.1f} µs（缓存命中），查询用户表 {query_us:7.1f} µs（本地 SQLite）")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="登录与流式聊天混合压测")
+    parser.add_argument("--streams", type=int, default=50, help="登录期间进行中的聊天流数量")
+    parser.add_argument("--logins", type=int, default=12, help="并发登录数量")
+    parser.add_argument("--chunk-count", type=int, default=100)
+    parser.add_argument("--chunk-delay", type=float, default=0.05)
+    args = parser.parse_args()
+
+    password = "corn-rust-2024"
+    with tempfile.TemporaryDirectory() as directory:
+        database_url = f"sqlite:///{os.path.join(directory, 'users.db')}"
+        create_users(database_url, max(args.logins, 20), password)
+        dify_port, port = free_port(), free_port()
+        dify_url = f"http://127.0.0.1:{dify_port}/v1"
+        processes = [
+            start_process(run_mock_dify, dify_port, chunk_count=args.chunk_count, chunk_delay=args.chunk_delay),
+            start_process(run_login_server, port, dify_url, database_url),
+        ]
+        try:
+            print(f"{args.streams} 个进行中的聊天流（片段间隔 {args.chunk_delay * 1000:.0f} ms），同时发起 {args.logins} 个登录")
+            for name, path in [("原实现", "/legacy/api/user/login"), ("线程池", "/api/user/login")]:
+                wall, login_ms, gaps, health_ms = asyncio.run(run_mixed(port, path, args.streams, args.logins, password))
+                failed = int(np.isnan(login_ms).sum())
+                print(f"  {name:6s} 登录总耗时 {wall:5.2f} s，登录 p50 {np.nanpercentile(login_ms, 50):6.0f} ms / "
+                      f"p99 {np.nanpercentile(login_ms, 99):6.0f} ms（失败 {failed} 个）；"
+                      f"聊天流最大卡顿 p50 {np.percentile(gaps, 50):6.0f} ms / 最大 {gaps.max():6.0f} ms；"
+                      f"/health p99 {np.percentile(health_ms, 99):6.0f} ms")
+        finally:
+            for process in processes:
+                process.terminate()
+        bench_verify(database_url)
+
+
+if __name__ == "__main__":
+    main()
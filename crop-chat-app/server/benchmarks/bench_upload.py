@@ -0,0 +1,121 @@
+"""
+多文件上传基准测试：一次上传 N 张约 8MB 的手机照片，对比原先逐个读入内存、同步 requests 顺序上传，
+与并发流式上传（可选缩小照片）的总耗时、聊天服务进程的峰值内存（RSS 增量）和发往 Dify 的字节数。
+
+用法（在 server 目录下）：
+    python -m benchmarks.bench_upload --files 10 --request-delay 0.3
+"""
+import argparse
+import io
+import os
+import tempfile
+import time
+
+import numpy as np
+import requests
+import uvicorn
+from PIL import Image
+
+from benchmarks.mock_dify import free_port, run_mock_dify, start_process
+
+
+def run_upload_server(port, dify_url, env):
+    os.environ["DIFY_BASE_URL"] = dify_url
+    os.environ.setdefault("DIFY_API_KEY", "app-benchmark")
+    os.environ.update(env)
+    from typing import List
+    from fastapi import FastAPI, File, Form, UploadFile
+    from fastapi.responses import JSONResponse
+    from chat_interface import chat_interface_router
+
+    app = FastAPI()
+    app.include_router(chat_interface_router)
+
+    @app.post("/legacy/api/file/upload")
+    async def legacy_upload(files: List[UploadFile] = File(...), username: str = Form(...)):
+        """原先的实现"""
+        headers = {"Authorization": f"Bearer {os.environ['DIFY_API_KEY']}"}
+        file_ids = []
+        for file in files:
+            content = await file.read()
+            bio = io.BytesIO(content)
+            bio.name = file.filename
+            response = requests.post(f"{dify_url}/files/upload", files={"file": (bio.name, bio, file.content_type)},
+                                     data={"user": username}, headers=headers)
+            response.raise_for_status()
+            file_ids.append(response.json().get("id"))
+        return JSONResponse(content={"file_ids": file_ids})
+
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
+
+
+def memory_kb(pid, field):
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    return 0
+
+
+def make_photos(directory, count, size):
+    """生成接近手机照片大小（约 8MB）的 JPEG：渐变背景加噪声，压缩率与真实照片相近"""
+    rng = np.random.default_rng(0)
+    width, height = size
+    base = np.linspace(0, 255, width * height * 3).reshape(height, width, 3) * 0.5
+    paths = []
+    for index in range(count):
+        pixels = (base + rng.normal(0, 40, (height, width, 3))).clip(0, 255).astype(np.uint8)
+        path = os.path.join(directory, f"photo_{index}.jpg")
+        Image.fromarray(pixels).save(path, "JPEG", quality=92)
+        paths.append(path)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多文件上传基准测试")
+    parser.add_argument("--files", type=int, default=10)
+    parser.add_argument("--size", type=int, nargs=2, default=[4000, 3000], metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--request-delay", type=float, default=0.3, help="模拟 Dify 保存每个文件的耗时（秒）")
+    args = parser.parse_args()
+
+    dify_port = free_port()
+    dify_url = f"http://127.0.0.1:{dify_port}/v1"
+    mock = start_process(run_mock_dify, dify_port, request_delay=args.request_delay)
+    modes = [
+        ("原实现（顺序、整读入内存）", "/legacy/api/file/upload", {}),
+        ("并发流式上传", "/api/file/upload", {"UPLOAD_MAX_EDGE": "0"}),
+        ("并发流式上传 + 缩小照片", "/api/file/upload", {"UPLOAD_MAX_EDGE": "1600"}),
+    ]
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            paths = make_photos(directory, args.files, args.size)
+            total_mb = sum(os.path.getsize(path) for path in paths) / 1e6
+            print(f"{args.files} 张 {args.size[0]}x{args.size[1]} 照片，共 {total_mb:.1f} MB，"
+                  f"模拟 Dify 每个文件 {args.request_delay * 1000:.0f} ms")
+            for name, path, env in modes:
+                port = free_port()
+                server = start_process(run_upload_server, port, dify_url, env)
+                try:
+                    baseline_kb = memory_kb(server.pid, "VmRSS")
+                    uploaded_before = requests.get(f"{dify_url}/_stats").json()["uploaded_bytes"]
+                    handles = [open(p, "rb") for p in paths]
+                    start = time.perf_counter()
+                    response = requests.post(f"http://127.0.0.1:{port}{path}", data={"username": "bench"},
+                                             files=[("files", (os.path.basename(p), h, "image/jpeg"))
+                                                    for p, h in zip(paths, handles)])
+                    elapsed = time.perf_counter() - start
+                    for handle in handles:
+                        handle.close()
+                    response.raise_for_status()
+                    assert len(response.json()["file_ids"]) == args.files
+                    peak_mb = (memory_kb(server.pid, "VmHWM") - baseline_kb) / 1024
+                    sent_mb = (requests.get(f"{dify_url}/_stats").json()["uploaded_bytes"] - uploaded_before) / 1e6
+                    print(f"  {name:22s} 耗时 {elapsed:6.2f} s，峰值内存增量 {peak_mb:6.1f} MB，发往 Dify {sent_mb:6.1f} MB")
+                finally:
+                    server.terminate()
+    finally:
+        mock.terminate()
+
+
+if __name__ == "__main__":
+    main()
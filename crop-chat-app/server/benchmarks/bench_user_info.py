@@ -0,0 +1,104 @@
+"""
+用户信息接口吞吐量测试：对比原先的同步会话 + ORM 查询（def 接口，在线程池中执行）、
+异步引擎按主键查询、异步查询加存在性缓存三种实现下 /api/user/user_info/{username} 的每秒请求数和延迟。
+
+用户表使用 SQLite 文件（DATABASE_URL），与 CI 相同；MySQL 上每次查询还有一次网络往返，缓存的收益更大。
+
+用法（在 server 目录下）：
+    python -m benchmarks.bench_user_info --connections 32 --duration 5
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import numpy as np
+import uvicorn
+
+from benchmarks.bench_login import create_users, legacy_get_db
+from benchmarks.mock_dify import free_port, start_process
+
+
+def run_user_server(port, database_url):
+    os.environ["DATABASE_URL"] = database_url
+    from fastapi import Depends, FastAPI, HTTPException
+    from sqlalchemy.orm import Session
+    from models import Users
+    from user_control_interface import user_control_router
+    from user_service import UserService
+
+    get_db = legacy_get_db(database_url)
+    uncached = UserService(ttl=0, miss_ttl=0)
+    app = FastAPI()
+    app.include_router(user_control_router)
+
+    @app.get("/legacy/api/user/user_info/{username}")
+    def legacy_user_info(username: str, db: Session = Depends(get_db)):
+        """原先的实现"""
+        user = db.query(Users).filter_by(username=username).first()
+        if not user:
+            raise HTTPException(status_code=404, detail="用户不存在")
+        return {"code": 200, "message": "获取用户信息成功", "data": {"username": user.username}}
+
+    @app.get("/uncached/api/user/user_info/{username}")
+    async def uncached_user_info(username: str):
+        if not await uncached.exists(username):
+            raise HTTPException(status_code=404, detail="用户不存在")
+        return {"code": 200, "message": "获取用户信息成功", "data": {"username": username}}
+
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
+
+
+async def keep_alive_client(port, prefix, users, deadline, latencies, offset):
+    """在一个 keep-alive 连接上连续请求，直到 deadline"""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    index = offset
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        writer.write(f"GET {prefix}/api/user/user_info/user{index % users} HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n".encode())
+        head = await reader.readuntil(b"\r\n\r\n")
+        if b" 200 " not in head[:16]:
+            raise RuntimeError(head[:head.find(b"\r\n")].decode())
+        length = int(head.lower().split(b"content-length:")[1].split(b"\r\n")[0])
+        await reader.readexactly(length)
+        latencies.append(time.perf_counter() - start)
+        index += 1
+    writer.close()
+
+
+async def run_load(port, prefix, users, connections, duration):
+    # 预热：加载路由、填充连接池和缓存
+    await asyncio.gather(*(keep_alive_client(port, prefix, users, time.perf_counter() + 1.0, [], offset)
+                           for offset in range(0, users, max(1, users // connections))))
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*(keep_alive_client(port, prefix, users, start + duration, latencies, offset * 97)
+                           for offset in range(connections)))
+    return len(latencies) / (time.perf_counter() - start), np.array(latencies) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="用户信息接口吞吐量测试")
+    parser.add_argument("--users", type=int, default=1000, help="用户表中的用户数，请求轮流查询这些用户")
+    parser.add_argument("--connections", type=int, default=32, help="并发 keep-alive 连接数")
+    parser.add_argument("--duration", type=float, default=5.0, help="每种实现的压测时长（秒）")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        database_url = f"sqlite:///{os.path.join(directory, 'users.db')}"
+        create_users(database_url, args.users, "corn-rust-2024")
+        port = free_port()
+        server = start_process(run_user_server, port, database_url)
+        try:
+            print(f"{args.users} 个用户，{args.connections} 个并发连接，每种实现 {args.duration:.0f} s")
+            for name, prefix in [("原实现（同步 ORM）", "/legacy"), ("异步主键查询", "/uncached"), ("异步 + 存在性缓存", "")]:
+                rps, latencies = asyncio.run(run_load(port, prefix, args.users, args.connections, args.duration))
+                print(f"  {name:14s} {rps:7.0f} 请求/秒，延迟 p50 {np.percentile(latencies, 50):6.1f} ms / "
+                      f"p99 {np.percentile(latencies, 99):6.1f} ms")
+        finally:
+            server.terminate()
+
+
+if __name__ == "__main__":
+    main()
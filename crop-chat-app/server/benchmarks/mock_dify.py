@@ -0,0 +1,153 @@
+"""
+本地模拟的 Dify API，用于基准测试和离线调试：实现聊天服务用到的接口，按给定延迟返回假数据。
+
+    python -m benchmarks.mock_dify --port 5001
+    DIFY_BASE_URL=http://127.0.0.1:5001/v1 python app.py
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import socket
+import time
+import uuid
+
+import uvicorn
+from fastapi import FastAPI, Query, Request, UploadFile, File, Form
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+
+def create_mock_dify(chunk_count=20, chunk_delay=0.05, request_delay=0.1, history_size=400):
+    """
+    chunk_count/chunk_delay: 每个流式回答的片段数和片段间隔（秒）
+    request_delay: 普通接口（建议、会话、历史、上传）的响应延迟（秒）
+    history_size: 每个会话的历史消息条数
+    """
+    app = FastAPI()
+    stats = {"requests": 0, "messages_pages": 0, "uploaded_bytes": 0}
+    app.state.stats = stats
+
+    def history(conversation_id):
+        return [{
+            "id": f"{conversation_id}-{index:05d}",
+            "conversation_id": conversation_id,
+            "query": f"问题 {index}",
+            "answer": f"回答 {index}",
+            "message_files": [],
+            "created_at": 1700000000 + index,
+        } for index in range(history_size)]
+
+    @app.middleware("http")
+    async def count_requests(request: Request, call_next):
+        stats["requests"] += 1
+        return await call_next(request)
+
+    @app.post("/v1/chat-messages")
+    async def chat_messages(request: Request):
+        payload = await request.json()
+        conversation_id = payload.get("conversation_id") or str(uuid.uuid4())
+        message_id = str(uuid.uuid4())
+
+        async def events():
+            for index in range(chunk_count):
+                await asyncio.sleep(chunk_delay)
+                data = {"event": "message", "message_id": message_id, "conversation_id": conversation_id,
+                        "answer": f"片段{index} "}
+                yield f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+            data = {"event": "message_end", "message_id": message_id, "conversation_id": conversation_id}
+            yield f"data: {json.dumps(data)}\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.get("/v1/messages/{message_id}/suggested")
+    async def suggested(message_id: str, user: str = Query(...)):
+        await asyncio.sleep(request_delay)
+        return {"result": "success", "data": ["玉米锈病怎么防治？", "需要喷什么药？", "多久能见效？"]}
+
+    @app.get("/v1/conversations")
+    async def conversations(user: str = Query(...), limit: int = 20):
+        await asyncio.sleep(request_delay)
+        data = [{"id": f"conv-{index}", "name": f"会话 {index}", "created_at": 1700000000 + index,
+                 "updated_at": 1700000000 + index} for index in range(limit)]
+        return {"data": data, "has_more": False, "limit": limit}
+
+    @app.get("/v1/messages")
+    async def messages(conversation_id: str, user: str = Query(...), first_id: str = None, limit: int = 20):
+        # 与 Dify 相同：返回 first_id 之前（更早）的 limit 条消息，页内按时间正序
+        await asyncio.sleep(request_delay)
+        stats["messages_pages"] += 1
+        all_messages = history(conversation_id)
+        end = len(all_messages)
+        if first_id:
+            end = next((index for index, message in enumerate(all_messages) if message["id"] == first_id), 0)
+        start = max(0, end - limit)
+        return {"data": all_messages[start:end], "has_more": start > 0, "limit": limit}
+
+    @app.delete("/v1/conversations/{conversation_id}")
+    async def delete_conversation(conversation_id: str):
+        await asyncio.sleep(request_delay)
+        return Response(status_code=204)
+
+    @app.post("/v1/files/upload")
+    async def upload(file: UploadFile = File(...), user: str = Form(...)):
+        size = 0
+        while chunk := await file.read(1 << 16):
+            size += len(chunk)
+        await asyncio.sleep(request_delay)
+        stats["uploaded_bytes"] += size
+        return JSONResponse(status_code=201, content={
+            "id": str(uuid.uuid4()), "name": file.filename, "size": size,
+            "mime_type": file.content_type, "created_by": user, "created_at": int(time.time()),
+        })
+
+    @app.get("/v1/_stats")
+    async def get_stats():
+        return stats
+
+    return app
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout=30.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"端口 {port} 上的服务未能启动")
+
+
+def run_mock_dify(port, **options):
+    uvicorn.run(create_mock_dify(**options), host="127.0.0.1", port=port, log_level="warning")
+
+
+def start_process(target, port, *args, **kwargs):
+    """在子进程中启动 target(port, ...) 服务并等待端口可用，返回进程对象（用完后 terminate）。"""
+    process = multiprocessing.Process(target=target, args=(port, *args), kwargs=kwargs, daemon=True)
+    process.start()
+    wait_for_port(port)
+    return process
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟的 Dify API")
+    parser.add_argument("--port", type=int, default=5001)
+    parser.add_argument("--chunk-count", type=int, default=20)
+    parser.add_argument("--chunk-delay", type=float, default=0.05)
+    parser.add_argument("--request-delay", type=float, default=0.1)
+    parser.add_argument("--history-size", type=int, default=400)
+    args = parser.parse_args()
+    print(f"模拟 Dify API: http://127.0.0.1:{args.port}/v1")
+    run_mock_dify(args.port, chunk_count=args.chunk_count, chunk_delay=args.chunk_delay,
+                  request_delay=args.request_delay, history_size=args.history_size)
+
+
+if __name__ == "__main__":
+    main()
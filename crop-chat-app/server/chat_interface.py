@@ -1,23 +1,26 @@
-from fastapi import FastAPI, Request, UploadFile, File, Form, Query, Response as FastAPIResponse, APIRouter
+from fastapi import FastAPI, Request, UploadFile, File, Form, Query, Depends, Response as FastAPIResponse, APIRouter
 from fastapi.responses import StreamingResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from dify_api_python import DifyClient
-from typing import List, Optional, Tuple, Dict
+from starlette.requests import ClientDisconnect
+from dify_client import dify
+from history_service import history_service
+from upload_service import upload_files as upload_to_dify, chunked_uploads, UploadError
+from session_service import session_user, ensure_user
+from typing import List, Optional
 from datetime import datetime
-import os, uuid, io, json, requests
+import uuid
 
 chat_interface_router = APIRouter()
 
-DIFY_API_KEY = os.getenv('DIFY_API_KEY')
-DIFY_BASE_URL = os.getenv('DIFY_BASE_URL', 'https://api.dify.ai/v1')
 PAGE_LIMIT = 20
-dify_client = DifyClient(api_key=DIFY_API_KEY, base_url=DIFY_BASE_URL)
+MAX_PAGE_LIMIT = 100
 
 @chat_interface_router.post("/api/chat")
-async def chat(request: Request):
+async def chat(request: Request, session: Optional[str] = Depends(session_user)):
     data = await request.json()
     message = data.get("message", "").strip()
     username = data.get("username")
+    ensure_user(session, username)
     conversation_id = data.get("conversation_id")
     file_ids = data.get("file_ids", [])
 
@@ -33,27 +36,24 @@ async def chat(request: Request):
         for file_id in file_ids
     ]
 
-    def generate():
+    async def generate():
         try:
-            resp = dify_client.chat_message(
+            message_id = ""
+            async for data in dify.chat_stream(
                 query=message,
                 user=username,
                 inputs={},
                 files=files,
-                conversation_id=conversation_id or "",
-                stream=True
-            )
-            buffer = ""
-            message_id = ""
-            for chunk in resp:
-                data = json.loads(chunk.data)
+                conversation_id=conversation_id or ""
+            ):
                 if data.get('event') == 'message':
                     delta = data.get("answer")
                     message_id = data.get("message_id")
                     if delta:
-                        buffer += delta
                         yield delta
                 elif data.get('event') == 'message_end':
+                    # 会话有了新消息，缓存的历史需要重新获取
+                    history_service.invalidate(data.get("conversation_id") or conversation_id, username)
                     yield f"[MESSAGE_ID:{message_id}]"
         except Exception as error:
             yield f"[ERROR] AI服务异常: {error}"
@@ -61,25 +61,20 @@ async def chat(request: Request):
     return StreamingResponse(generate(), media_type="text/plain; charset=utf-8")
 
 @chat_interface_router.get("/api/chat/next_suggest/{message_id}")
-async def get_next_problem_suggestion(message_id: str, username: str = Query(...)):
-    url = f"{DIFY_BASE_URL}/messages/{message_id}/suggested"
+async def get_next_problem_suggestion(message_id: str, username: str = Query(...),
+                                      session: Optional[str] = Depends(session_user)):
+    ensure_user(session, username)
     try:
-        response = requests.get(
-            url, 
-            headers={
-                "Authorization": f"Bearer {DIFY_API_KEY}",
-                "Content-Type": "application/json"},
-            params={"user": username}
-        )
-        response.raise_for_status()
+        suggestions = await dify.suggested(message_id, user=username)
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": str(e)})
 
-    return JSONResponse(content=response.json().get("data", []))
+    return JSONResponse(content=suggestions)
 
 @chat_interface_router.get("/api/conversations/list/{username}")
-async def list_conversations(username: str):
-    data = dify_client.get_conversations(user=username, last_id=None, limit=20, pinned=None)["data"]
+async def list_conversations(username: str, session: Optional[str] = Depends(session_user)):
+    ensure_user(session, username)
+    data = (await dify.get_conversations(user=username, last_id=None, limit=20))["data"]
     conversations = [
         {
             "id": conversation["id"],
@@ -92,74 +87,88 @@ async def list_conversations(username: str):
     return JSONResponse(content={"conversations": conversations})
 
 @chat_interface_router.get("/api/conversations/{conversation_id}/history")
-async def get_chat_history(conversation_id: str, username: str = Query(...)):
-    def fetch_messages(first_id=None) -> Tuple[List[Dict], bool]:
-        params = {
-            "conversation_id": conversation_id,
-            "user": username,
-            "limit": PAGE_LIMIT
-        }
-        if first_id:
-            params["first_id"] = first_id
-        resp = requests.get(f"{DIFY_BASE_URL}/messages",
-                            headers={"Authorization": f"Bearer {DIFY_API_KEY}"},
-                            params=params)
-        resp.raise_for_status()
-        data = resp.json()
-        return data["data"], data.get("has_more", False)
-
-    def load_all_history():
-        all_msgs = []
-        first_id = None
-        while True:
-            messages_data, has_more = fetch_messages(first_id)
-            if not messages_data:
-                break
-            all_msgs = messages_data + all_msgs
-            if not has_more:
-                break
-            first_id = messages_data[0]["id"]
-        return all_msgs
-
-    all_message_history = load_all_history()
-    all_message_history = [
+async def get_chat_history(conversation_id: str, username: str = Query(...),
+                           limit: int = Query(PAGE_LIMIT, ge=1, le=MAX_PAGE_LIMIT), before: Optional[str] = None,
+                           session: Optional[str] = Depends(session_user)):
+    ensure_user(session, username)
+    try:
+        page = await history_service.page(conversation_id, user=username, limit=limit, before=before)
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"error": str(e)})
+
+    page["data"] = [
         {
+            "id": message.get("id"),
             "query": message.get("query"),
             "answer": message.get("answer"),
             "message_files": message.get("message_files"),
             "created_at": message.get("created_at")
-        } for message in all_message_history
+        } for message in page["data"]
     ]
-    return JSONResponse(content=all_message_history)
+    return JSONResponse(content=page)
 
 @chat_interface_router.delete("/api/conversations/{conversation_id}/delete")
-async def delete_conversation(conversation_id: str, username: str = Query(...)):
-    resp = requests.delete(
-        url=f"{DIFY_BASE_URL}/conversations/{conversation_id}",
-        headers={"Authorization": f"Bearer {DIFY_API_KEY}"},
-        json={"user": username}
-    )
+async def delete_conversation(conversation_id: str, username: str = Query(...),
+                              session: Optional[str] = Depends(session_user)):
+    ensure_user(session, username)
+    resp = await dify.delete_conversation(conversation_id, user=username)
+    history_service.invalidate(conversation_id, username)
     if resp.status_code == 204:
         return JSONResponse(content={"message": "对话已删除", "conversation_id": conversation_id})
     else:
         return JSONResponse(status_code=404, content={"error": "对话不存在"})
 
 @chat_interface_router.post("/api/file/upload")
-async def upload_files(files: List[UploadFile] = File(...), username: str = Form(...)):
-    headers = {"Authorization": f"Bearer {DIFY_API_KEY}"}
-    url = f"{DIFY_BASE_URL}/files/upload"
-    file_ids = []
+async def upload_files(files: List[UploadFile] = File(...), username: str = Form(...),
+                       session: Optional[str] = Depends(session_user)):
+    ensure_user(session, username)
     try:
-        for file in files:
-            content = await file.read()
-            bio = io.BytesIO(content)
-            bio.name = file.filename
-            mime = file.content_type
-            response = requests.post(url, files={"file": (bio.name, bio, mime)}, # type: ignore
-                                     data={"user": username}, headers=headers)
-            response.raise_for_status()
-            file_ids.append(response.json().get("id"))
+        file_ids = await upload_to_dify(files, username)
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": str(e)})
 
     return JSONResponse(content={"file_ids": file_ids})
+
+@chat_interface_router.post("/api/file/upload/chunked")
+async def create_chunked_upload(username: str = Form(...), filename: str = Form(...), size: int = Form(...),
+                                content_type: Optional[str] = Form(None), session: Optional[str] = Depends(session_user)):
+    ensure_user(session, username)
+    try:
+        status = await chunked_uploads.create(username, filename, size, content_type)
+    except UploadError as e:
+        return JSONResponse(status_code=e.status_code, content={"error": str(e), **e.extra})
+
+    return JSONResponse(content=status)
+
+@chat_interface_router.get("/api/file/upload/chunked/{upload_id}")
+async def get_chunked_upload(upload_id: str, username: str = Query(...), session: Optional[str] = Depends(session_user)):
+    ensure_user(session, username)
+    try:
+        status = await chunked_uploads.status(upload_id, username)
+    except UploadError as e:
+        return JSONResponse(status_code=e.status_code, content={"error": str(e), **e.extra})
+
+    return JSONResponse(content=status)
+
+@chat_interface_router.put("/api/file/upload/chunked/{upload_id}")
+async def upload_chunk(upload_id: str, request: Request, username: str = Query(...), offset: int = Query(..., ge=0),
+                       session: Optional[str] = Depends(session_user)):
+    ensure_user(session, username)
+    # 分块大小有上限，边读边检查，不接收超大的请求体
+    data = bytearray()
+    try:
+        async for part in request.stream():
+            data += part
+            if len(data) > chunked_uploads.chunk_size:
+                return JSONResponse(status_code=413, content={"error": "分块超过允许的大小"})
+    except ClientDisconnect:
+        # 连接在分块中途断开，丢弃这一块，前端重连后从 received 处续传
+        return FastAPIResponse(status_code=400)
+    try:
+        status = await chunked_uploads.append(upload_id, username, offset, bytes(data))
+    except UploadError as e:
+        return JSONResponse(status_code=e.status_code, content={"error": str(e), **e.extra})
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"error": str(e)})
+
+    return JSONResponse(content=status)
@@ -1,5 +1,5 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from models import Base
 from os import getenv
 from urllib.parse import quote_plus
@@ -8,16 +8,40 @@ DB_NAME = 'crop_chat_db'
 DB_ADDR = 'localhost:3306'
 DB_USERNAME = 'lindenbaum'
 DB_PASSWORD = quote_plus(getenv('MySQLPassword', ""))
-assert DB_NAME and DB_ADDR and DB_USERNAME and DB_PASSWORD, \
+# 设置 DATABASE_URL 时使用指定的数据库（如基准测试、CI 用的 sqlite:///bench.db），否则连接 MySQL
+DATABASE_URL = getenv('DATABASE_URL')
+assert DATABASE_URL or (DB_NAME and DB_ADDR and DB_USERNAME and DB_PASSWORD), \
        "DB_NAME, DB_ADDR, DB_USERNAME, DB_PASSWORD 必须不为空"
 
-SQLALCHEMY_DATABASE_URI = f'mysql+pymysql://{DB_USERNAME}:{DB_PASSWORD}@{DB_ADDR}/{DB_NAME}'
-engine = create_engine(SQLALCHEMY_DATABASE_URI, pool_pre_ping=True)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# 连接池：常驻 DB_POOL_SIZE 个连接，高峰时最多再临时打开 DB_MAX_OVERFLOW 个；
+# MySQL 默认 8 小时（wait_timeout）断开空闲连接，连接使用超过 DB_POOL_RECYCLE 秒后重建
+DB_POOL_SIZE = int(getenv('DB_POOL_SIZE', '10'))
+DB_MAX_OVERFLOW = int(getenv('DB_MAX_OVERFLOW', '20'))
+DB_POOL_RECYCLE = int(getenv('DB_POOL_RECYCLE', '1800'))
+DB_POOL_TIMEOUT = float(getenv('DB_POOL_TIMEOUT', '10'))
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# 同步驱动的地址换成对应的异步驱动
+_ASYNC_DRIVERS = {'mysql': 'mysql+aiomysql', 'mysql+pymysql': 'mysql+aiomysql', 'sqlite': 'sqlite+aiosqlite'}
+
+def async_database_url(url: str) -> str:
+    url = make_url(url)
+    return url.set(drivername=_ASYNC_DRIVERS.get(url.drivername, url.drivername)).render_as_string(hide_password=False)
+
+SQLALCHEMY_DATABASE_URI = async_database_url(
+    DATABASE_URL or f'mysql+pymysql://{DB_USERNAME}:{DB_PASSWORD}@{DB_ADDR}/{DB_NAME}')
+
+def _pool_options(url: str) -> dict:
+    # SQLite 是本地文件，使用 SQLAlchemy 为它选择的默认连接池
+    if make_url(url).get_backend_name() == 'sqlite':
+        return {}
+    return {"pool_size": DB_POOL_SIZE, "max_overflow": DB_MAX_OVERFLOW, "pool_recycle": DB_POOL_RECYCLE,
+            "pool_timeout": DB_POOL_TIMEOUT, "pool_pre_ping": True}
+
+engine = create_async_engine(SQLALCHEMY_DATABASE_URI, **_pool_options(SQLALCHEMY_DATABASE_URI))
+# commit 后不让对象过期，返回响应时读取属性不再触发查询
+AsyncSessionLocal = async_sessionmaker(engine, expire_on_commit=False, autoflush=False)
+
+async def create_tables():
+    """创建缺少的表（已存在的表不做修改），SQLite / CI 环境启动后即可使用"""
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
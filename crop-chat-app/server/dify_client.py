@@ -0,0 +1,109 @@
+from typing import AsyncIterator, Dict, List, Optional
+import os, json, itertools, httpx
+
+DIFY_API_KEY = os.getenv('DIFY_API_KEY')
+DIFY_BASE_URL = os.getenv('DIFY_BASE_URL', 'https://api.dify.ai/v1')
+# 连接池上限：每个进行中的流式回答占用一个连接，空闲连接保持 keep-alive 供后续请求复用
+DIFY_MAX_CONNECTIONS = int(os.getenv('DIFY_MAX_CONNECTIONS', '200'))
+DIFY_MAX_KEEPALIVE = int(os.getenv('DIFY_MAX_KEEPALIVE', '50'))
+# httpcore 每次分配请求都会扫描池中所有连接，并发流很多时开销按平方增长；
+# 拆成多个较小的连接池轮流使用（每个池的上限为总上限 / 分片数）
+DIFY_POOL_SHARDS = int(os.getenv('DIFY_POOL_SHARDS', '8'))
+DIFY_TIMEOUT = float(os.getenv('DIFY_TIMEOUT', '30'))
+# 流式回答中检索、推理时两段输出可能间隔较久，读超时单独放宽
+DIFY_STREAM_READ_TIMEOUT = float(os.getenv('DIFY_STREAM_READ_TIMEOUT', '300'))
+
+
+class AsyncDifyClient:
+    """
+    基于 httpx.AsyncClient 的 Dify API 客户端，所有请求都不阻塞事件循环。
+    连接池在所有请求间共享（keep-alive），首次使用时在当前事件循环中创建，应用关闭时调用 aclose。
+    """
+
+    def __init__(self, api_key: Optional[str] = DIFY_API_KEY, base_url: str = DIFY_BASE_URL,
+                 max_connections: int = DIFY_MAX_CONNECTIONS, max_keepalive: int = DIFY_MAX_KEEPALIVE,
+                 timeout: float = DIFY_TIMEOUT, shards: int = DIFY_POOL_SHARDS):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip('/')
+        shards = max(1, shards)
+        self.limits = httpx.Limits(max_connections=max(1, max_connections // shards),
+                                   max_keepalive_connections=max(1, max_keepalive // shards), keepalive_expiry=30)
+        self.timeout = httpx.Timeout(timeout)
+        self.stream_timeout = httpx.Timeout(timeout, read=DIFY_STREAM_READ_TIMEOUT)
+        self._clients: List[Optional[httpx.AsyncClient]] = [None] * shards
+        self._next_shard = itertools.count()
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """按轮询取一个连接池分片"""
+        index = next(self._next_shard) % len(self._clients)
+        client = self._clients[index]
+        if client is None or client.is_closed:
+            client = self._clients[index] = httpx.AsyncClient(
+                base_url=self.base_url, headers={"Authorization": f"Bearer {self.api_key}"},
+                limits=self.limits, timeout=self.timeout)
+        return client
+
+    async def aclose(self):
+        for index, client in enumerate(self._clients):
+            if client is not None:
+                await client.aclose()
+                self._clients[index] = None
+
+    async def chat_stream(self, query: str, user: str, conversation_id: str = "",
+                          files: Optional[List[Dict]] = None, inputs: Optional[Dict] = None) -> AsyncIterator[Dict]:
+        """
+        发送流式对话请求，逐个产出 Dify SSE 事件（已解析的 JSON）。
+        只有调用方取走上一个事件后才读取下一行，下游（浏览器）读得慢时上游连接也随之暂停，不会在内存中堆积；
+        调用方提前关闭生成器（如浏览器断开）时上游连接立即释放。
+        """
+        payload = {
+            "query": query,
+            "user": user,
+            "inputs": inputs or {},
+            "files": files or [],
+            "conversation_id": conversation_id or "",
+            "response_mode": "streaming",
+        }
+        async with self.client.stream("POST", "/chat-messages", json=payload, timeout=self.stream_timeout) as resp:
+            resp.raise_for_status()
+            async for line in resp.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data:
+                    yield json.loads(data)
+
+    async def suggested(self, message_id: str, user: str) -> List[str]:
+        resp = await self.client.get(f"/messages/{message_id}/suggested", params={"user": user})
+        resp.raise_for_status()
+        return resp.json().get("data", [])
+
+    async def get_conversations(self, user: str, last_id: Optional[str] = None, limit: int = 20) -> Dict:
+        params = {"user": user, "limit": limit}
+        if last_id:
+            params["last_id"] = last_id
+        resp = await self.client.get("/conversations", params=params)
+        resp.raise_for_status()
+        return resp.json()
+
+    async def get_messages(self, conversation_id: str, user: str, first_id: Optional[str] = None,
+                           limit: int = 20) -> Dict:
+        params = {"conversation_id": conversation_id, "user": user, "limit": limit}
+        if first_id:
+            params["first_id"] = first_id
+        resp = await self.client.get("/messages", params=params)
+        resp.raise_for_status()
+        return resp.json()
+
+    async def delete_conversation(self, conversation_id: str, user: str) -> httpx.Response:
+        return await self.client.request("DELETE", f"/conversations/{conversation_id}", json={"user": user})
+
+    async def upload_file(self, user: str, filename: str, content, mime: Optional[str]) -> Dict:
+        resp = await self.client.post("/files/upload", files={"file": (filename, content, mime)},
+                                      data={"user": user})
+        resp.raise_for_status()
+        return resp.json()
+
+
+dify = AsyncDifyClient()
@@ -0,0 +1,109 @@
+from collections import OrderedDict, deque
+from itertools import islice
+from typing import Dict, List, Optional, Tuple
+import os, time, asyncio
+from dify_client import dify, AsyncDifyClient
+
+# Dify /messages 单页上限为 100，一次多取一些以减少往返
+HISTORY_UPSTREAM_PAGE = int(os.getenv('HISTORY_UPSTREAM_PAGE', '100'))
+HISTORY_CACHE_SIZE = int(os.getenv('HISTORY_CACHE_SIZE', '256'))
+# 其他设备上的新消息不会经过本进程，缓存过期后重新获取
+HISTORY_CACHE_TTL = float(os.getenv('HISTORY_CACHE_TTL', '300'))
+
+
+class ConversationHistory:
+    """
+    一个会话已从 Dify 取回的消息，按时间正序存放在 deque 中。
+    Dify 只能从新到旧翻页，每取回一页更早的消息就 extendleft 到左端（O(页大小)，不复制已有消息）。
+    """
+
+    def __init__(self):
+        self.messages = deque()
+        self.positions: Dict[str, int] = {}   # 消息 id -> 序号（最左端消息的序号为 self.first_seq）
+        self.first_seq = 0
+        self.complete = False                 # 是否已取到会话的第一条消息
+        self.created = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def prepend(self, page: List[Dict], has_more: bool):
+        for message in reversed(page):
+            self.first_seq -= 1
+            self.messages.appendleft(message)
+            self.positions[message["id"]] = self.first_seq
+        self.complete = not has_more or not page
+
+    def index_of(self, message_id: Optional[str]) -> Optional[int]:
+        """message_id 在 deque 中的下标，None 表示最新消息之后；未缓存的 id 返回 None"""
+        if message_id is None:
+            return len(self.messages)
+        seq = self.positions.get(message_id)
+        return None if seq is None else seq - self.first_seq
+
+
+class HistoryService:
+    """
+    会话历史缓存：按 (用户, 会话) 缓存已取回的消息，只在需要更早的消息时才向 Dify 翻页，
+    同一会话的并发请求共用一次翻页。会话有新回答（message_end）或被删除时调用 invalidate。
+    """
+
+    def __init__(self, client: AsyncDifyClient = dify, upstream_page: int = HISTORY_UPSTREAM_PAGE,
+                 cache_size: int = HISTORY_CACHE_SIZE, ttl: float = HISTORY_CACHE_TTL):
+        self.client = client
+        self.upstream_page = upstream_page
+        self.cache_size = cache_size
+        self.ttl = ttl
+        self._cache: "OrderedDict[Tuple[str, str], ConversationHistory]" = OrderedDict()
+
+    def _get(self, conversation_id: str, user: str) -> ConversationHistory:
+        key = (user, conversation_id)
+        history = self._cache.get(key)
+        if history is None or time.monotonic() - history.created > self.ttl:
+            history = self._cache[key] = ConversationHistory()
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return history
+
+    def invalidate(self, conversation_id: str, user: str):
+        self._cache.pop((user, conversation_id), None)
+
+    async def _fetch_older(self, history: ConversationHistory, conversation_id: str, user: str):
+        first_id = history.messages[0]["id"] if history.messages else None
+        data = await self.client.get_messages(conversation_id, user=user, first_id=first_id,
+                                              limit=self.upstream_page)
+        history.prepend(data["data"], data.get("has_more", False))
+
+    async def page(self, conversation_id: str, user: str, limit: int = 20,
+                   before: Optional[str] = None) -> Dict:
+        """
+        返回 before（消息 id，游标）之前最近的 limit 条消息（按时间正序），before 为空时返回最新的 limit 条。
+        next_cursor 为本页最早一条消息的 id，作为下一次请求的 before；没有更早的消息时为 None。
+        """
+        history = self._get(conversation_id, user)
+        async with history.lock:
+            end = history.index_of(before)
+            while end is None or (end < limit and not history.complete):
+                if history.complete:
+                    # 整个会话都已取回仍找不到游标（消息不属于该会话）
+                    return {"data": [], "has_more": False, "next_cursor": None}
+                await self._fetch_older(history, conversation_id, user)
+                end = history.index_of(before)
+            start = max(0, end - limit)
+            messages = list(islice(history.messages, start, end))
+            has_more = start > 0 or not history.complete
+        return {
+            "data": messages,
+            "has_more": has_more,
+            "next_cursor": messages[0]["id"] if messages and has_more else None,
+        }
+
+    async def all(self, conversation_id: str, user: str) -> List[Dict]:
+        """整个会话的历史消息（按时间正序）"""
+        history = self._get(conversation_id, user)
+        async with history.lock:
+            while not history.complete:
+                await self._fetch_older(history, conversation_id, user)
+            return list(history.messages)
+
+
+history_service = HistoryService()
@@ -0,0 +1,109 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import Header, HTTPException
+from typing import Optional, Tuple
+from werkzeug.security import generate_password_hash, check_password_hash
+import os, hmac, json, time, base64, hashlib, secrets, asyncio, logging
+
+logger = logging.getLogger(__name__)
+
+# 密码哈希（werkzeug 默认 scrypt）每次要几十毫秒 CPU，放到固定大小的线程池中执行，
+# 登录高峰时多出的请求排队等待，不阻塞事件循环，也不占满 Starlette 的默认线程池
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', str(min(4, os.cpu_count() or 1))))
+# 会话令牌的签名密钥；未设置时每次启动随机生成（重启后需重新登录，多进程部署时必须设置）
+SESSION_SECRET = os.getenv('SESSION_SECRET', '')
+SESSION_TTL = int(os.getenv('SESSION_TTL', str(7 * 24 * 3600)))
+SESSION_CACHE_SIZE = int(os.getenv('SESSION_CACHE_SIZE', '10000'))
+# 为 1 时接口必须携带有效令牌；为 0 时兼容尚未登录获取令牌的旧页面，只校验携带了的令牌
+SESSION_REQUIRED = os.getenv('SESSION_REQUIRED', '0') == '1'
+
+_hash_executor = ThreadPoolExecutor(max_workers=max(1, PASSWORD_HASH_WORKERS), thread_name_prefix="password-hash")
+
+
+async def hash_password(password: str) -> str:
+    return await asyncio.get_running_loop().run_in_executor(_hash_executor, generate_password_hash, password)
+
+
+async def verify_password(password_hash: str, password: str) -> bool:
+    return await asyncio.get_running_loop().run_in_executor(_hash_executor, check_password_hash, password_hash, password)
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+class SessionTokens:
+    """
+    无状态的会话令牌：base64(JSON {用户名, 过期时间}) + "." + HMAC-SHA256 签名，校验时不查数据库。
+    校验通过的令牌缓存在 LRU 中，同一令牌再次校验只需一次字典查找。
+    """
+
+    def __init__(self, secret: str = SESSION_SECRET, ttl: int = SESSION_TTL, cache_size: int = SESSION_CACHE_SIZE):
+        if not secret:
+            logger.warning("未设置 SESSION_SECRET，使用随机密钥，服务重启后会话令牌全部失效")
+            secret = secrets.token_hex(32)
+        self._key = secret.encode()
+        self.ttl = ttl
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+
+    def _sign(self, payload: str) -> str:
+        return _b64encode(hmac.new(self._key, payload.encode(), hashlib.sha256).digest())
+
+    def issue(self, username: str) -> str:
+        payload = _b64encode(json.dumps({"u": username, "exp": int(time.time()) + self.ttl},
+                                        ensure_ascii=False, separators=(",", ":")).encode())
+        return f"{payload}.{self._sign(payload)}"
+
+    def verify(self, token: str) -> Optional[str]:
+        """返回令牌对应的用户名；签名不对、格式错误或已过期时返回 None"""
+        cached = self._cache.get(token)
+        if cached is not None:
+            username, expires = cached
+            if expires > time.time():
+                self._cache.move_to_end(token)
+                return username
+            del self._cache[token]
+            return None
+
+        payload, _, signature = token.partition(".")
+        # 按字节比较：compare_digest 不接受含非 ASCII 字符的 str，伪造的令牌应得到 401 而不是 500
+        if not signature or not hmac.compare_digest(signature.encode(), self._sign(payload).encode()):
+            return None
+        try:
+            claims = json.loads(_b64decode(payload))
+            username, expires = claims["u"], float(claims["exp"])
+        except (ValueError, KeyError, TypeError):
+            return None
+        if expires <= time.time():
+            return None
+        self._cache[token] = (username, expires)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return username
+
+
+session_tokens = SessionTokens()
+
+
+async def session_user(authorization: Optional[str] = Header(None)) -> Optional[str]:
+    """FastAPI 依赖：从 Authorization: Bearer <token> 中取出已验证的用户名，未携带令牌时为 None"""
+    if not authorization:
+        if SESSION_REQUIRED:
+            raise HTTPException(status_code=401, detail="请先登录")
+        return None
+    scheme, _, token = authorization.partition(" ")
+    username = session_tokens.verify(token.strip()) if scheme.lower() == "bearer" else None
+    if username is None:
+        raise HTTPException(status_code=401, detail="登录已过期，请重新登录")
+    return username
+
+
+def ensure_user(session: Optional[str], username: Optional[str]):
+    """令牌中的用户必须与请求操作的用户一致"""
+    if session is not None and session != username:
+        raise HTTPException(status_code=403, detail="无权访问其他用户的数据")
@@ -0,0 +1,220 @@
+from fastapi import UploadFile
+from typing import BinaryIO, Dict, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+import os, io, re, json, time, uuid, asyncio, tempfile
+from dify_client import dify, AsyncDifyClient
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # 未安装 Pillow 时不缩小图片，原样上传
+    Image = None
+
+# 同时向 Dify 上传的文件数
+UPLOAD_CONCURRENCY = int(os.getenv('UPLOAD_CONCURRENCY', '4'))
+# 超过 UPLOAD_RESIZE_MIN_BYTES 的照片缩小到最长边 UPLOAD_MAX_EDGE 像素后重新编码为 JPEG，UPLOAD_MAX_EDGE=0 关闭。
+# 1600 时 4000x3000 的手机照片可以按 1/2 解码（见 shrink_image），视觉模型的输入分辨率也不超过这个尺寸
+UPLOAD_MAX_EDGE = int(os.getenv('UPLOAD_MAX_EDGE', '1600'))
+UPLOAD_RESIZE_MIN_BYTES = int(os.getenv('UPLOAD_RESIZE_MIN_BYTES', str(2 * 1024 * 1024)))
+UPLOAD_JPEG_QUALITY = int(os.getenv('UPLOAD_JPEG_QUALITY', '85'))
+# 缩小照片是 CPU 密集的，单独的小线程池限制同时解码的图片数（每张解码后约占几十 MB）
+UPLOAD_RESIZE_WORKERS = int(os.getenv('UPLOAD_RESIZE_WORKERS', str(min(2, os.cpu_count() or 1))))
+_resize_executor = ThreadPoolExecutor(max_workers=max(1, UPLOAD_RESIZE_WORKERS), thread_name_prefix="upload-resize")
+# 分块（可续传）上传：未完成的文件暂存在 UPLOAD_CHUNK_DIR，超过 UPLOAD_CHUNK_TTL 秒未完成的上传会被清理
+UPLOAD_CHUNK_DIR = os.getenv('UPLOAD_CHUNK_DIR', os.path.join(tempfile.gettempdir(), 'crop-chat-uploads'))
+# 弱网下一个分块失败只需重传这一块，块越小重传越少，但请求次数越多
+UPLOAD_CHUNK_SIZE = int(os.getenv('UPLOAD_CHUNK_SIZE', str(256 * 1024)))
+UPLOAD_MAX_BYTES = int(os.getenv('UPLOAD_MAX_BYTES', str(20 * 1024 * 1024)))
+UPLOAD_CHUNK_TTL = float(os.getenv('UPLOAD_CHUNK_TTL', str(24 * 3600)))
+_RESIZABLE_TYPES = {"image/jpeg", "image/png", "image/webp", "image/bmp", "image/heic", "image/heif"}
+
+
+def _file_size(file: BinaryIO) -> int:
+    file.seek(0, io.SEEK_END)
+    size = file.tell()
+    file.seek(0)
+    return size
+
+
+def shrink_image(file: BinaryIO, max_edge: int = UPLOAD_MAX_EDGE,
+                 quality: int = UPLOAD_JPEG_QUALITY) -> Optional[io.BytesIO]:
+    """把照片缩小到最长边 max_edge 并编码为 JPEG；不需要缩小、无法识别或结果反而更大时返回 None"""
+    try:
+        with Image.open(file) as img:
+            width, height = img.size
+            scale = max_edge / max(width, height)
+            if scale >= 1:
+                return None
+            # JPEG 解码时直接按 1/2、1/4、1/8 缩小（不小于目标尺寸），避免解码整张大图
+            img.draft("RGB", (int(width * scale), int(height * scale)))
+            img.thumbnail((max_edge, max_edge), Image.LANCZOS)
+            img = ImageOps.exif_transpose(img)
+            if img.mode != "RGB":
+                img = img.convert("RGB")
+            output = io.BytesIO()
+            img.save(output, "JPEG", quality=quality)
+    except Exception:
+        return None
+    finally:
+        file.seek(0)
+    if output.tell() >= _file_size(file):
+        return None
+    output.seek(0)
+    return output
+
+
+async def prepare_upload(filename: str, source: BinaryIO, mime: Optional[str]) -> Tuple[str, BinaryIO, Optional[str]]:
+    """
+    返回要上传给 Dify 的 (文件名, 文件对象, MIME)。
+    文件对象直接使用磁盘上的临时文件，由 httpx 分块读取发送，不整体读入内存；
+    过大的照片在线程池中缩小后替换为内存中的 JPEG。
+    """
+    if (Image is not None and UPLOAD_MAX_EDGE > 0 and mime in _RESIZABLE_TYPES
+            and _file_size(source) > UPLOAD_RESIZE_MIN_BYTES):
+        shrunk = await asyncio.get_running_loop().run_in_executor(_resize_executor, shrink_image, source)
+        if shrunk is not None:
+            return os.path.splitext(filename)[0] + ".jpg", shrunk, "image/jpeg"
+    return filename, source, mime
+
+
+async def upload_files(files: List[UploadFile], username: str, client: AsyncDifyClient = dify,
+                       concurrency: int = UPLOAD_CONCURRENCY) -> List[str]:
+    """并发上传（最多 concurrency 个同时进行），返回与 files 顺序一致的文件 id；任一文件失败时抛出其异常"""
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def upload(file: UploadFile) -> str:
+        async with semaphore:
+            filename, content, mime = await prepare_upload(file.filename or "upload", file.file, file.content_type)
+            uploaded = await client.upload_file(username, filename, content, mime)
+            return uploaded.get("id")
+
+    results = await asyncio.gather(*(upload(file) for file in files), return_exceptions=True)
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+    return list(results)
+
+
+class UploadError(Exception):
+    """分块上传请求无效，status_code 为返回给前端的 HTTP 状态码，extra 附加在响应中"""
+
+    def __init__(self, status_code: int, message: str, **extra):
+        super().__init__(message)
+        self.status_code = status_code
+        self.extra = extra
+
+
+class ChunkedUploadStore:
+    """
+    可续传的分块上传：前端先创建上传得到 upload_id，再按顺序 PUT 各分块（offset 为该块在文件中的起始位置），
+    最后一块写入后把整个文件转发给 Dify。已收到的字节数就是磁盘上 .part 文件的大小，
+    连接中断后前端查询 received 从断点继续，服务重启也不丢失进度。
+    """
+
+    _ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+    def __init__(self, directory: str = UPLOAD_CHUNK_DIR, client: AsyncDifyClient = dify,
+                 chunk_size: int = UPLOAD_CHUNK_SIZE, max_bytes: int = UPLOAD_MAX_BYTES, ttl: float = UPLOAD_CHUNK_TTL):
+        self.directory = directory
+        self.client = client
+        self.chunk_size = chunk_size
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        # 同一上传的分块请求（如超时后重发）串行处理，避免重复追加
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    def _path(self, upload_id: str, suffix: str) -> str:
+        return os.path.join(self.directory, upload_id + suffix)
+
+    def _load(self, upload_id: str, username: str) -> Dict:
+        if not self._ID_PATTERN.match(upload_id):
+            raise UploadError(404, "上传不存在或已过期")
+        try:
+            with open(self._path(upload_id, ".json"), encoding="utf-8") as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            raise UploadError(404, "上传不存在或已过期")
+        if meta["username"] != username:
+            raise UploadError(404, "上传不存在或已过期")
+        return meta
+
+    def _save(self, meta: Dict):
+        path = self._path(meta["upload_id"], ".json")
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(path + ".tmp", path)
+
+    def _received(self, meta: Dict) -> int:
+        if meta.get("file_id"):
+            return meta["size"]
+        try:
+            return os.path.getsize(self._path(meta["upload_id"], ".part"))
+        except FileNotFoundError:
+            return 0
+
+    def _status(self, meta: Dict) -> Dict:
+        return {"upload_id": meta["upload_id"], "size": meta["size"], "received": self._received(meta),
+                "chunk_size": self.chunk_size, "file_id": meta.get("file_id")}
+
+    def _cleanup(self):
+        """删除超过 ttl 未完成（或完成后未使用）的上传"""
+        deadline = time.time() - self.ttl
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith((".json", ".part")) and entry.stat().st_mtime < deadline:
+                os.remove(entry.path)
+                self._locks.pop(entry.name.rsplit(".", 1)[0], None)
+
+    def _create(self, username: str, filename: str, size: int, mime: Optional[str]) -> Dict:
+        os.makedirs(self.directory, exist_ok=True)
+        self._cleanup()
+        meta = {"upload_id": uuid.uuid4().hex, "username": username, "filename": filename, "size": size,
+                "mime": mime, "created_at": time.time(), "file_id": None}
+        self._save(meta)
+        open(self._path(meta["upload_id"], ".part"), "wb").close()
+        return meta
+
+    async def create(self, username: str, filename: str, size: int, mime: Optional[str]) -> Dict:
+        if not 0 < size <= self.max_bytes:
+            raise UploadError(413, f"文件大小必须在 1 到 {self.max_bytes} 字节之间")
+        meta = await asyncio.to_thread(self._create, username, os.path.basename(filename) or "upload", size, mime)
+        return self._status(meta)
+
+    async def status(self, upload_id: str, username: str) -> Dict:
+        return self._status(await asyncio.to_thread(self._load, upload_id, username))
+
+    def _append(self, upload_id: str, data: bytes):
+        with open(self._path(upload_id, ".part"), "ab") as f:
+            f.write(data)
+
+    async def append(self, upload_id: str, username: str, offset: int, data: bytes) -> Dict:
+        """
+        写入从 offset 开始的一块数据。offset 与已收到的字节数不一致时返回 409 和 received，前端据此续传；
+        文件收齐后转发给 Dify，返回的状态中带有 file_id（转发失败时可以再发一个 offset=size 的空块重试）。
+        """
+        lock = self._locks.setdefault(upload_id, asyncio.Lock())
+        async with lock:
+            meta = await asyncio.to_thread(self._load, upload_id, username)
+            received = self._received(meta)
+            if meta.get("file_id"):
+                return self._status(meta)
+            if offset != received:
+                raise UploadError(409, "分块位置与已上传的数据不一致", received=received)
+            if len(data) > self.chunk_size or received + len(data) > meta["size"]:
+                raise UploadError(413, "分块超过允许的大小", received=received)
+            if data:
+                await asyncio.to_thread(self._append, upload_id, data)
+                received += len(data)
+            if received == meta["size"]:
+                meta["file_id"] = await self._forward(meta)
+                await asyncio.to_thread(self._save, meta)
+                os.remove(self._path(upload_id, ".part"))
+                self._locks.pop(upload_id, None)
+            return self._status(meta)
+
+    async def _forward(self, meta: Dict) -> str:
+        with open(self._path(meta["upload_id"], ".part"), "rb") as source:
+            filename, content, mime = await prepare_upload(meta["filename"], source, meta["mime"])
+            uploaded = await self.client.upload_file(meta["username"], filename, content, mime)
+        return uploaded.get("id")
+
+
+chunked_uploads = ChunkedUploadStore()
@@ -1,40 +1,35 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Request, Form
 from fastapi.responses import JSONResponse, FileResponse
-from sqlalchemy.orm import Session
-from models import Users
-from db_config import get_db
-from werkzeug.security import generate_password_hash, check_password_hash
+from typing import Optional
+from user_service import user_service
+from session_service import hash_password, verify_password, session_tokens, session_user, ensure_user
 import os
 
 user_control_router = APIRouter()
 
 # 注册接口
 @user_control_router.post("/api/user/register")
-def register(
+async def register(
     username: str = Form(...),
-    password: str = Form(...),
-    db: Session = Depends(get_db)
+    password: str = Form(...)
 ):
     if not username or not password:
         raise HTTPException(status_code=400, detail="用户名和密码为必填项")
 
-    existing_user = db.query(Users).filter_by(username=username).first()
-    if existing_user:
+    # 数据库查询是异步的，密码哈希放到专用的有界线程池，都不阻塞事件循环；哈希期间不占用数据库连接
+    if await user_service.exists(username):
         raise HTTPException(status_code=400, detail="用户已存在")
 
-    hashed_password = generate_password_hash(password)
-    new_user = Users(username=username, password=hashed_password)  # type: ignore
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    hashed_password = await hash_password(password)
+    if not await user_service.create(username, hashed_password):
+        raise HTTPException(status_code=400, detail="用户已存在")
 
     return JSONResponse(content={"message": "用户注册成功！"}, status_code=200)
 
 # 登录接口
 @user_control_router.post("/api/user/login")
 async def login(
-    request: Request,
-    db: Session = Depends(get_db)
+    request: Request
 ):
     data = await request.json()
     username = data.get('username')
@@ -43,24 +38,27 @@ async def login(
     if not username or not password:
         raise HTTPException(status_code=400, detail="未提供用户名和密码")
 
-    user = db.query(Users).filter_by(username=username).first()
-    if user and check_password_hash(user.password, password): # type: ignore
-        return JSONResponse(content={"message": "登录成功"}, status_code=200)
+    password_hash = await user_service.password_of(username)
+    if password_hash and await verify_password(password_hash, password):
+        # 之后的请求携带令牌，服务端只校验签名，不再查询数据库
+        token = session_tokens.issue(username)
+        return JSONResponse(content={"message": "登录成功", "token": token, "expires_in": session_tokens.ttl},
+                            status_code=200)
     else:
         raise HTTPException(status_code=401, detail="密码错误")
 
 # 查询用户信息接口
 @user_control_router.get("/api/user/user_info/{username}")
-def get_user_info(username: str, db: Session = Depends(get_db)):
-    user = db.query(Users).filter_by(username=username).first()
-    if not user:
+async def get_user_info(username: str, session: Optional[str] = Depends(session_user)):
+    ensure_user(session, username)
+    if not await user_service.exists(username):
         raise HTTPException(status_code=404, detail="用户不存在")
 
     return {
         "code": 200,
         "message": "获取用户信息成功",
         "data": {
-            "username": user.username,
+            "username": username,
         }
     }
 
@@ -0,0 +1,70 @@
+from collections import OrderedDict
+from sqlalchemy import select, bindparam
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from typing import Optional, Tuple
+from models import Users
+from db_config import AsyncSessionLocal
+import os, time
+
+# 用户是否存在的缓存：存在的用户缓存 USER_CACHE_TTL 秒，不存在的只缓存 USER_MISS_TTL 秒（注册后立即生效）
+USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', '10000'))
+USER_CACHE_TTL = float(os.getenv('USER_CACHE_TTL', '300'))
+USER_MISS_TTL = float(os.getenv('USER_MISS_TTL', '5'))
+
+# 按主键查询的语句只构造一次，SQLAlchemy 按语句缓存编译结果，每次只绑定用户名
+_USER_EXISTS = select(Users.username).where(Users.username == bindparam("username"))
+_USER_PASSWORD = select(Users.password).where(Users.username == bindparam("username"))
+
+
+class UserService:
+    """
+    用户表的访问：按主键（username）查询，每次只打开一个短会话，用完立即归还连接。
+    exists 的结果缓存在 LRU 中，获取用户信息等频繁的存在性检查大多不查数据库。
+    """
+
+    def __init__(self, session_factory: async_sessionmaker = AsyncSessionLocal, cache_size: int = USER_CACHE_SIZE,
+                 ttl: float = USER_CACHE_TTL, miss_ttl: float = USER_MISS_TTL):
+        self.session_factory = session_factory
+        self.cache_size = cache_size
+        self.ttl = ttl
+        self.miss_ttl = miss_ttl
+        self._cache: "OrderedDict[str, Tuple[bool, float]]" = OrderedDict()
+
+    def _remember(self, username: str, exists: bool):
+        self._cache[username] = (exists, time.monotonic() + (self.ttl if exists else self.miss_ttl))
+        self._cache.move_to_end(username)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def exists(self, username: str) -> bool:
+        cached = self._cache.get(username)
+        if cached is not None and cached[1] > time.monotonic():
+            return cached[0]
+        async with self.session_factory() as db:
+            exists = (await db.execute(_USER_EXISTS, {"username": username})).scalar() is not None
+        self._remember(username, exists)
+        return exists
+
+    async def password_of(self, username: str) -> Optional[str]:
+        """用户的密码哈希，用户不存在时为 None（不缓存）"""
+        async with self.session_factory() as db:
+            password = (await db.execute(_USER_PASSWORD, {"username": username})).scalar()
+        self._remember(username, password is not None)
+        return password
+
+    async def create(self, username: str, password_hash: str) -> bool:
+        """新建用户，用户名已存在（包括并发注册同一用户名）时返回 False"""
+        async with self.session_factory() as db:
+            db.add(Users(username=username, password=password_hash))
+            try:
+                await db.commit()
+            except IntegrityError:
+                await db.rollback()
+                self._remember(username, True)
+                return False
+        self._remember(username, True)
+        return True
+
+
+user_service = UserService()